@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Checkpoint storage benchmark
+Writes the same simulated ReAct thread through SqliteSaver with the stock
+serializer and with DeltaCheckpointSerializer, then compares database size,
+bytes written per step and put/get latency. No model calls are made.
+
+Usage: poetry run python benchmarks/bench_checkpoint_storage.py [steps]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from tinker.checkpoint_serializer import BLOB_TABLE, DeltaCheckpointSerializer
+from tinker.checkpoint_store import configure_connection, database_size
+
+WORDS = "build test error warning file module import passed failed docker git commit src lib".split()
+
+
+def tool_output(rng: random.Random, lines: int) -> str:
+    # Log-like output: repetitive and highly compressible, like real tool results
+    return "\n".join(
+        f"[{i:05d}] {' '.join(rng.choice(WORDS) for _ in range(8))}" for i in range(lines)
+    )
+
+
+def simulated_messages(steps: int):
+    """Yield the message list after each ReAct step (one tool call per step)"""
+    rng = random.Random(7)
+    messages = [HumanMessage(content="Fix the failing tests in the repository", id=str(uuid6()))]
+    for step in range(steps):
+        call_id = f"toolu_{step:04d}"
+        messages.append(AIMessage(
+            content=f"Step {step}: running the next command",
+            tool_calls=[{"name": "execute_shell_command", "args": {"command": f"make test-{step}"}, "id": call_id}],
+            id=str(uuid6()),
+        ))
+        messages.append(ToolMessage(
+            content=tool_output(rng, rng.randint(20, 200)), tool_call_id=call_id, id=str(uuid6())
+        ))
+        yield step, list(messages)
+
+
+def payload_bytes(conn: sqlite3.Connection) -> int:
+    total = conn.execute("SELECT SUM(LENGTH(checkpoint) + LENGTH(metadata)) FROM checkpoints").fetchone()[0] or 0
+    has_blobs = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (BLOB_TABLE,)
+    ).fetchone()
+    if has_blobs:
+        total += conn.execute(f"SELECT SUM(LENGTH(data)) FROM {BLOB_TABLE}").fetchone()[0] or 0
+    return total
+
+
+def run(label: str, steps: int, use_delta: bool) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix="tinker-bench-"), "conversations.db")
+    conn = configure_connection(sqlite3.connect(path, check_same_thread=False))
+    serde = DeltaCheckpointSerializer(path) if use_delta else None
+    saver = SqliteSaver(conn, serde=serde) if serde else SqliteSaver(conn)
+    config = {"configurable": {"thread_id": "bench", "checkpoint_ns": ""}}
+
+    put_seconds = 0.0
+    for step, messages in simulated_messages(steps):
+        checkpoint = empty_checkpoint()
+        checkpoint["id"] = str(uuid6())
+        checkpoint["channel_values"] = {"messages": messages}
+        checkpoint["channel_versions"] = {"messages": step + 1}
+        started = time.perf_counter()
+        config = saver.put(config, checkpoint, {"source": "loop", "step": step}, {"messages": step + 1})
+        put_seconds += time.perf_counter() - started
+
+    started = time.perf_counter()
+    loaded = saver.get_tuple({"configurable": {"thread_id": "bench", "checkpoint_ns": ""}})
+    get_seconds = time.perf_counter() - started
+    assert [m.content for m in loaded.checkpoint["channel_values"]["messages"]] == [m.content for m in messages]
+
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    result = {
+        "label": label,
+        "database_bytes": database_size(conn),
+        "payload_bytes": payload_bytes(conn),
+        "put_ms": put_seconds / steps * 1000,
+        "get_ms": get_seconds * 1000,
+    }
+    conn.close()
+    if serde:
+        serde.close()
+    return result
+
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    stock = run("stock SqliteSaver", steps, use_delta=False)
+    delta = run("delta + zlib", steps, use_delta=True)
+
+    print(f"steps: {steps} ({2 * steps + 1} messages in the final checkpoint)")
+    for result in (stock, delta):
+        print(
+            f"{result['label']:<18} db {result['database_bytes'] / 1024:>9.0f} KB  "
+            f"written {result['payload_bytes'] / 1024:>9.0f} KB ({result['payload_bytes'] / steps / 1024:.1f} KB/step)  "
+            f"put {result['put_ms']:.2f} ms  get {result['get_ms']:.2f} ms"
+        )
+    print(f"disk footprint: {stock['database_bytes'] / delta['database_bytes']:.1f}x smaller, "
+          f"bytes written: {stock['payload_bytes'] / delta['payload_bytes']:.1f}x fewer")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Long-term memory retrieval benchmark
+Fills a temporary LongTermMemory with synthetic facts and measures top-k
+search latency (vectorize query + matrix-vector product + top-k). No model
+calls are made.
+
+Usage: poetry run python benchmarks/bench_long_term_memory.py [memories]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from tinker.long_term_memory import MEMORY_TABLE, LongTermMemory
+
+WORDS = ("build test error warning file module import passed failed docker git commit src lib pixel "
+         "poetry pytest numpy compose image user prefers answer repo branch merge deploy server log "
+         "config env token cache sqlite migration schema api endpoint timeout retry").split()
+
+
+def fill(memory: LongTermMemory, count: int, rng: random.Random) -> None:
+    # Bulk insert, bypassing the duplicate check (an O(n) scan per add)
+    rows = []
+    for row in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20)))
+        memory.vectors.set(row, memory.vectorizer.transform(text))
+        rows.append((row, "fact", text, None, time.time()))
+    with memory.conn:
+        memory.conn.executemany(f"INSERT INTO {MEMORY_TABLE} VALUES (?, ?, ?, ?, ?)", rows)
+    memory.vectors.flush()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    directory = tempfile.mkdtemp(prefix="tinker-bench-")
+    memory = LongTermMemory(os.path.join(directory, "conversations.db"), directory=directory)
+    rng = random.Random(7)
+
+    started = time.perf_counter()
+    fill(memory, count, rng)
+    print(f"memories: {count:,} ({memory.vectors.dim} dims, "
+          f"{os.path.getsize(memory.vectors.path) / 1024 / 1024:.0f} MB vector file), "
+          f"filled in {time.perf_counter() - started:.1f}s")
+
+    memory.search("warm up the mapping and document frequencies")
+    timings = []
+    for _ in range(200):
+        query = " ".join(rng.choice(WORDS) for _ in range(6))
+        started = time.perf_counter()
+        memory.search(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(f"search: p50 {timings[len(timings) // 2]:.2f} ms  p95 {timings[int(len(timings) * 0.95)]:.2f} ms  "
+          f"max {timings[-1]:.2f} ms")
+    memory.close()
+
+
+if __name__ == "__main__":
+    main()
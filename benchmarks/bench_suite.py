@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Hot-path benchmark suite
+Runs the agent loop offline: ScriptedChatModel stands in for every model
+and FakeDockerClient for the Docker Engine, so nothing leaves the process.
+Measures per-turn framework overhead (sync and async graphs), checkpoint
+put/get through the workflow's SqliteSaver, pre-model hook cost as the
+history grows, and tool dispatch through AnthropicToolsManager.
+
+Shell sessions are disabled here (they drive a `docker exec -i` process);
+commands take the one-shot exec path instead.
+
+Usage: poetry run python benchmarks/bench_suite.py [--quick] [--only NAME ...]
+                                                   [--save FILE] [--compare FILE [--threshold 0.25]]
+
+--save writes the results as a JSON baseline; --compare checks them against
+one and exits with status 1 if any metric got slower by more than threshold.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+# Keep every database and blob store away from ~/.tinker
+os.environ["HOME"] = tempfile.mkdtemp(prefix="tinker-bench-")
+os.environ.setdefault("ANTHROPIC_API_KEY", "sk-ant-benchmark")
+os.environ["TINKER_SHELL_SESSIONS"] = "0"
+os.environ["TINKER_LONG_TERM_MEMORY"] = "0"
+os.environ["TINKER_DOCKER_BACKEND"] = "auto"
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+from langgraph.checkpoint.base import empty_checkpoint  # noqa: E402
+from langgraph.checkpoint.base.id import uuid6  # noqa: E402
+
+from tinker import docker_manager  # noqa: E402
+from tinker.anthropic_tools_manager import AnthropicToolsManager  # noqa: E402
+from tinker.continuous_agent_workflow import ContinuousAgentWorkflow  # noqa: E402
+from tinker.model_router import ROLE_REASONING  # noqa: E402
+
+from fakes import ScriptedChatModel, install_fake_docker, tool_exchange  # noqa: E402
+
+GOAL = "Run the test suite in ~/pixel and fix the failing build step {turn}"
+SUMMARY = "Summary: the agent inspected the workspace, ran the tests and fixed the build."
+
+# Per-mode sizes: (full, --quick)
+SIZES = {
+    "turns": (20, 5),
+    "checkpoint_steps": (400, 100),
+    "hook_exchanges": ((50, 200, 800), (25, 100)),
+    "hook_calls": (20, 5),
+    "dispatch_calls": (200, 50),
+    "dispatch_mutating_calls": (10, 3),
+}
+
+
+def size(name: str, quick: bool):
+    return SIZES[name][1 if quick else 0]
+
+
+@contextlib.contextmanager
+def quiet():
+    """Drop the per-command status lines printed by the tools"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def ms(seconds: float) -> float:
+    return seconds * 1000
+
+
+def offline_workflow(tool_steps: int = 3, calls_per_step: int = 2) -> ContinuousAgentWorkflow:
+    """A real ContinuousAgentWorkflow whose agents run on ScriptedChatModel"""
+    workflow = ContinuousAgentWorkflow()
+    checkpointer = workflow.agent.checkpointer
+    workflow.models = {
+        role: ScriptedChatModel(tool_steps=tool_steps, calls_per_step=calls_per_step)
+        for role in workflow.models
+    }
+    workflow.memory_hook.model = ScriptedChatModel(tool_steps=0, reply=SUMMARY)
+    workflow.agents = {role: workflow._build_agent(checkpointer, role) for role in workflow.models}
+    workflow.agent = workflow.agents[ROLE_REASONING]
+    return workflow
+
+
+def bench_turns(quick: bool) -> dict:
+    """Wall time of whole turns (3 model calls with 2 tool calls each, then a reply)"""
+    turns = size("turns", quick)
+    workflow = offline_workflow()
+    model_calls = workflow.models[ROLE_REASONING].tool_steps + 1
+    results = {}
+    with quiet():
+        workflow.run_continuous_task(GOAL.format(turn="warm-up"), thread_id="bench-warm-up")
+        timings = []
+        for turn in range(turns):
+            started = time.perf_counter()
+            workflow.run_continuous_task(GOAL.format(turn=turn), thread_id="bench-sync")
+            timings.append(ms(time.perf_counter() - started))
+        results["turn_ms"] = statistics.median(timings)
+        results["model_call_overhead_ms"] = results["turn_ms"] / model_calls
+
+        async def run_async():
+            await workflow.arun_continuous_task(GOAL.format(turn="warm-up"), thread_id="bench-async-warm-up")
+            async_timings = []
+            for turn in range(turns):
+                started = time.perf_counter()
+                await workflow.arun_continuous_task(GOAL.format(turn=turn), thread_id="bench-async")
+                async_timings.append(ms(time.perf_counter() - started))
+            await workflow.aclose()
+            return async_timings
+
+        # run_async ends with aclose(), which also closes the sync side
+        results["async_turn_ms"] = statistics.median(asyncio.run(run_async()))
+    return results
+
+
+def bench_checkpoints(quick: bool) -> dict:
+    """put/get_tuple through the workflow's SqliteSaver and delta serializer as a thread grows"""
+    steps = size("checkpoint_steps", quick)
+    workflow = offline_workflow()
+    saver = workflow.agent.checkpointer
+    config = {"configurable": {"thread_id": "bench-checkpoints", "checkpoint_ns": ""}}
+    messages = [HumanMessage(content=GOAL.format(turn=0), id=str(uuid6()))]
+    put_timings = []
+    for step in range(steps):
+        messages.extend(tool_exchange(step))
+        checkpoint = empty_checkpoint()
+        checkpoint["id"] = str(uuid6())
+        checkpoint["channel_values"] = {"messages": list(messages)}
+        checkpoint["channel_versions"] = {"messages": step + 1}
+        started = time.perf_counter()
+        config = saver.put(config, checkpoint, {"source": "loop", "step": step}, {"messages": step + 1})
+        put_timings.append(ms(time.perf_counter() - started))
+
+    get_timings = []
+    for _ in range(20):
+        started = time.perf_counter()
+        saver.get_tuple({"configurable": {"thread_id": "bench-checkpoints", "checkpoint_ns": ""}})
+        get_timings.append(ms(time.perf_counter() - started))
+    workflow.close()
+    tail = put_timings[-max(1, steps // 10):]
+    return {
+        "checkpoint_put_ms": statistics.median(put_timings),
+        f"checkpoint_put_ms_{len(messages)}_messages": statistics.median(tail),
+        f"checkpoint_get_ms_{len(messages)}_messages": statistics.median(get_timings),
+    }
+
+
+def _apply(messages: list, update: dict) -> list:
+    """Fold a hook update back into the history, as add_messages does for matching IDs"""
+    replaced = {message.id: message for message in update.get("messages", [])}
+    return [replaced.get(message.id, message) for message in messages]
+
+
+def bench_hook(quick: bool) -> dict:
+    """Pre-model hook per call: first call on a loaded thread, then steady state with one new exchange"""
+    workflow = offline_workflow()
+    hook = workflow.memory_hook
+    calls = size("hook_calls", quick)
+    results = {}
+    for exchanges in size("hook_exchanges", quick):
+        config = {"configurable": {"thread_id": f"bench-hook-{exchanges}"}}
+        messages = [HumanMessage(content=GOAL.format(turn=0), id=f"human-{exchanges}")]
+        for index in range(exchanges):
+            messages.extend(tool_exchange(index))
+        count = len(messages)
+
+        started = time.perf_counter()
+        update = hook({"messages": messages, "context": {}}, config)
+        results[f"hook_first_call_ms_{count}_messages"] = ms(time.perf_counter() - started)
+
+        timings = []
+        for index in range(exchanges, exchanges + calls):
+            messages = _apply(messages, update) + tool_exchange(index)
+            state = {"messages": messages, "context": update["context"]}
+            started = time.perf_counter()
+            update = hook(state, config)
+            timings.append(ms(time.perf_counter() - started))
+        results[f"hook_ms_{count}_messages"] = statistics.median(timings)
+    workflow.close()
+    return results
+
+
+def bench_dispatch(quick: bool) -> dict:
+    """Tool dispatch overhead: AnthropicToolsManager around the (fake) exec"""
+    calls = size("dispatch_calls", quick)
+    manager = AnthropicToolsManager(thread_id="bench-dispatch")
+    read_only = {"command": "cat src/main.py", "reason": "benchmark"}
+    mutating = {"command": "touch src/main.py", "reason": "benchmark"}
+
+    def timed(fn, repeat: int) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(ms(time.perf_counter() - started))
+        return statistics.median(timings)
+
+    results = {}
+    with quiet():
+        results["exec_backend_ms"] = timed(
+            lambda: docker_manager.run_in_container(["bash", "-c", read_only["command"]], timeout=60), calls
+        )
+        results["dispatch_read_only_ms"] = timed(
+            lambda: manager.execute_tool("execute_shell_command", read_only), calls
+        )
+        results["dispatch_mutating_ms"] = timed(
+            lambda: manager.execute_tool("execute_shell_command", mutating), size("dispatch_mutating_calls", quick)
+        )
+
+        async def run_async():
+            timings = []
+            for _ in range(calls):
+                started = time.perf_counter()
+                await manager.aexecute_tool("execute_shell_command", read_only)
+                timings.append(ms(time.perf_counter() - started))
+            return statistics.median(timings)
+
+        results["async_dispatch_read_only_ms"] = asyncio.run(run_async())
+    results["dispatch_overhead_ms"] = results["dispatch_read_only_ms"] - results["exec_backend_ms"]
+    return results
+
+
+BENCHMARKS = {
+    "turns": bench_turns,
+    "checkpoints": bench_checkpoints,
+    "hook": bench_hook,
+    "dispatch": bench_dispatch,
+}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    """Print each metric against the baseline; returns the number of regressions"""
+    regressions = 0
+    for name, value in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            print(f"   {name:<40} {value:>10.3f} ms  (new)")
+            continue
+        change = (value - before) / before if before else 0.0
+        # Sub-millisecond timings jitter by more than any sensible threshold
+        regressed = change > threshold and value - before > 0.05
+        regressions += regressed
+        icon = "❌" if regressed else ("🚀" if change < -threshold else "  ")
+        print(f"{icon} {name:<40} {value:>10.3f} ms  baseline {before:>10.3f} ms  {change:+7.1%}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks of Tinker's hot paths")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes, for a fast check")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--save", metavar="FILE", help="Write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="Compare against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Relative slowdown counted as a regression (default: 0.25)")
+    args = parser.parse_args()
+
+    install_fake_docker()
+    results = {}
+    for name in args.only or BENCHMARKS:
+        started = time.perf_counter()
+        results.update(BENCHMARKS[name](args.quick))
+        print(f"✓ {name} ({time.perf_counter() - started:.1f}s)", file=sys.stderr)
+
+    regressions = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("quick") != args.quick:
+            print("⚠️  Baseline was recorded with a different --quick setting; sizes differ", file=sys.stderr)
+        regressions = compare(results, baseline["results"], args.threshold)
+        print(f"\n{regressions} regression(s) above {args.threshold:.0%}")
+    else:
+        for name, value in results.items():
+            print(f"{name:<40} {value:>10.3f} ms")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "created_at": time.time(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "quick": args.quick,
+                "results": results,
+            }, f, indent=2)
+        print(f"💾 Baseline written to {args.save}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Workflow construction benchmark
+Compares building ContinuousAgentWorkflow on every turn (the old interactive
+loop) with reusing one instance. No model calls are made.
+
+Usage: poetry run python benchmarks/bench_workflow_reuse.py [turns]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# Keep the benchmark's checkpoint DB away from ~/.tinker
+os.environ["HOME"] = tempfile.mkdtemp(prefix="tinker-bench-")
+os.environ.setdefault("ANTHROPIC_API_KEY", "sk-ant-benchmark")
+
+from tinker.continuous_agent_workflow import ContinuousAgentWorkflow  # noqa: E402
+
+
+def per_turn_construction(turns: int) -> float:
+    started = time.perf_counter()
+    for _ in range(turns):
+        workflow = ContinuousAgentWorkflow()
+        workflow.close()
+    return time.perf_counter() - started
+
+
+def reused_workflow(turns: int) -> float:
+    # Built once; every turn then invokes the already compiled graph
+    started = time.perf_counter()
+    ContinuousAgentWorkflow().close()
+    return time.perf_counter() - started
+
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    # Warm imports so neither side pays module loading
+    ContinuousAgentWorkflow().close()
+
+    rebuilt = per_turn_construction(turns)
+    reused = reused_workflow(turns)
+    print(f"turns: {turns}")
+    print(f"rebuild per turn: {rebuilt * 1000:.1f} ms total, {rebuilt / turns * 1000:.2f} ms/turn")
+    print(f"reused workflow:  {reused * 1000:.1f} ms total, {reused / turns * 1000:.2f} ms/turn")
+
+
+if __name__ == "__main__":
+    main()
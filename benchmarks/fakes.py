@@ -0,0 +1,163 @@
+"""
+Offline stand-ins for the benchmark suite
+A deterministic chat model that drives create_react_agent through a fixed
+number of tool calls per turn, and a fake Docker Engine client installed in
+docker_manager in place of the real socket, so every code path above the
+exec runs unchanged with no network and no Docker.
+"""
+
+import itertools
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from tinker import docker_manager
+from tinker.docker_api import STDOUT
+
+WORDS = "build test error warning file module import passed failed docker git commit src lib".split()
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that answers every turn with the same script
+
+    The first tool_steps responses of a turn (counted as AI messages since the
+    last user message) each request calls_per_step execute_shell_command
+    calls (command formatted with step and call); the next one is a final
+    text reply. With tool_steps=0 it simply replies, which is what the
+    summarization model needs. Usage metadata is filled in from an
+    approximate token count, like the real API reports it.
+    """
+
+    tool_steps: int = 3
+    calls_per_step: int = 1
+    # Read-only by default, so the calls of one step run concurrently
+    command: str = "cat src/module_{step}_{call}.py"
+    reply: str = "Done. The build passes and the requested change is in place."
+
+    @property
+    def _llm_type(self) -> str:
+        return "tinker-scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        # The script never looks at schemas; keep the model unbound
+        return self
+
+    def _turn_steps(self, messages: List[BaseMessage]) -> int:
+        steps = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage):
+                steps += 1
+        return steps
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        step = self._turn_steps(messages)
+        if step < self.tool_steps:
+            # Unique per position in the history, so IDs never collide across turns
+            prefix = f"toolu_{len(messages):05d}"
+            message = AIMessage(
+                content=f"Step {step + 1}: checking the workspace",
+                tool_calls=[
+                    {"name": "execute_shell_command", "id": f"{prefix}_{i}",
+                     "args": {"command": self.command.format(step=step, call=i), "reason": "benchmark"}}
+                    for i in range(self.calls_per_step)
+                ],
+            )
+        else:
+            message = AIMessage(content=self.reply)
+        input_tokens = count_tokens_approximately(messages)
+        output_tokens = count_tokens_approximately([message])
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def command_output(lines: int) -> bytes:
+    """Log-like output of a fixed size: `lines` lines of eight words"""
+    words = itertools.cycle(WORDS)
+    return "".join(
+        f"[{i:05d}] {' '.join(next(words) for _ in range(8))}\n" for i in range(lines)
+    ).encode()
+
+
+class FakeDockerClient:
+    """Answers docker_manager's Engine API calls from memory
+
+    Every exec succeeds and prints the same output, delivered in
+    chunk_size frames as the socket would.
+    """
+
+    def __init__(self, output_lines: int = 40, chunk_size: int = 4096):
+        self.output = command_output(output_lines)
+        self.chunk_size = chunk_size
+        self.socket_path = "/dev/null"
+        self.execs = 0
+
+    def ping(self) -> bool:
+        return True
+
+    def exec_create(self, container: str, cmd: List[str], workdir: Optional[str] = None,
+                    env: Optional[List[str]] = None) -> str:
+        self.execs += 1
+        return f"exec-{self.execs}"
+
+    def exec_start(self, exec_id: str, timeout: Optional[float] = None) -> Iterator[Tuple[int, bytes]]:
+        for start in range(0, len(self.output), self.chunk_size):
+            yield STDOUT, self.output[start:start + self.chunk_size]
+
+    def exec_inspect(self, exec_id: str) -> Dict[str, Any]:
+        return {"ExitCode": 0, "Running": False}
+
+    def exec_run(self, container: str, cmd: List[str], workdir: Optional[str] = None) -> Tuple[int, bytes, bytes]:
+        self.exec_create(container, cmd, workdir)
+        return 0, self.output, b""
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncFakeDockerClient:
+    """Async counterpart of FakeDockerClient, sharing its output"""
+
+    def __init__(self, client: FakeDockerClient):
+        self.client = client
+
+    async def exec_create(self, container: str, cmd: List[str], workdir: Optional[str] = None) -> str:
+        return self.client.exec_create(container, cmd, workdir)
+
+    async def exec_start(self, exec_id: str):
+        for frame in self.client.exec_start(exec_id):
+            yield frame
+
+    async def exec_inspect(self, exec_id: str) -> Dict[str, Any]:
+        return self.client.exec_inspect(exec_id)
+
+
+def install_fake_docker(output_lines: int = 40) -> FakeDockerClient:
+    """Make docker_manager use an in-memory client instead of the Docker socket"""
+    client = FakeDockerClient(output_lines)
+    docker_manager._api_client = client
+    docker_manager._async_api_client = AsyncFakeDockerClient(client)
+    docker_manager._api_unavailable = False
+    return client
+
+
+def tool_exchange(index: int, output_lines: int = 40) -> List[BaseMessage]:
+    """One AI tool call and its result, as the agent stores them"""
+    call_id = f"toolu_hist_{index:05d}"
+    return [
+        AIMessage(
+            content=f"Step {index}: running the next command",
+            tool_calls=[{"name": "execute_shell_command", "args": {"command": f"make test-{index}"}, "id": call_id}],
+            id=f"ai-{index}",
+        ),
+        ToolMessage(content=command_output(output_lines).decode(), tool_call_id=call_id, id=f"tool-{index}"),
+    ]
@@ -5,15 +5,25 @@ Implements Anthropic Claude tool calling for container command execution
 
 import json
 import os
+import shlex
+import time
 from typing import Dict, List, Any, Optional
 from . import docker_manager
+from . import metrics
+from . import shell_session
+from .command_classifier import shell_call_parallel_safe
+from .constants import DEFAULT_COMMAND_TIMEOUT, SHELL_SESSIONS_ENABLED
 from .email_manager import send_email_from_task
+from .parallel_tool_node import in_concurrent_wave
+from .tool_result_compactor import ToolResultCompactor
 
 
 class AnthropicToolsManager:
     """Manages tool definitions and execution for Anthropic Claude tool calling"""
     
-    def __init__(self):
+    def __init__(self, thread_id: str = "main"):
+        self.thread_id = thread_id
+        self.compactor = ToolResultCompactor()
         self.tools = self._define_tools()
     
     def _define_tools(self) -> List[Dict[str, Any]]:
@@ -32,6 +42,14 @@ class AnthropicToolsManager:
                         "reason": {
                             "type": "string", 
                             "description": "Brief explanation of why this command is needed for the task"
+                        },
+                        "timeout": {
+                            "type": "integer",
+                            "description": f"Wall-clock limit in seconds; the command is killed when exceeded (default {DEFAULT_COMMAND_TIMEOUT})"
+                        },
+                        "parallel_safe": {
+                            "type": "boolean",
+                            "description": "Override read-only detection: true if the command does not change files or shell state and may run concurrently with other calls, false to force ordered execution"
                         }
                     },
                     "required": ["command", "reason"]
@@ -45,6 +63,20 @@ class AnthropicToolsManager:
     
     def execute_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a tool function call and return the result"""
+        started = time.perf_counter()
+        result = self._dispatch_tool(tool_name, tool_input)
+        self._observe_tool(tool_name, tool_input, result, time.perf_counter() - started)
+        return result
+    
+    def _observe_tool(self, tool_name: str, tool_input: Dict[str, Any], result: Dict[str, Any],
+                      seconds: float) -> None:
+        """Record a finished tool call in the metrics"""
+        labels = {"tool": tool_name, "program": metrics.command_program(str(tool_input.get("command") or ""))}
+        outcome = "timeout" if result.get("timed_out") else ("success" if result.get("success") else "failure")
+        metrics.TOOL_SECONDS.observe(seconds, **labels)
+        metrics.TOOL_CALLS.inc(outcome=outcome, **labels)
+    
+    def _dispatch_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
         try:
             # Route to appropriate function
             if tool_name == "execute_shell_command":
@@ -65,10 +97,15 @@ class AnthropicToolsManager:
         """Execute a shell command in the container"""
         command = args.get("command")
         reason = args.get("reason", "No reason provided")
+        timeout = args.get("timeout") or DEFAULT_COMMAND_TIMEOUT
         
         if not command:
             return {"success": False, "error": "command is required"}
         
+        if self._runs_concurrently(args):
+            return self._execute_read_only_command(command, reason, timeout)
+        
+        capture = self.compactor.capture()
         try:
             # Create a horizontal gradient animation that sweeps through the command text
             import time
@@ -165,23 +202,151 @@ class AnthropicToolsManager:
             animation_thread.start()
             
             # Execute the command while animation runs
-            result = docker_manager.exec_in_container(["bash", "-c", command])
+            if SHELL_SESSIONS_ENABLED:
+                result = shell_session.get_session(self.thread_id).run(
+                    command, timeout=timeout, on_output=capture.write
+                )
+            else:
+                result = docker_manager.run_in_container(
+                    ["bash", "-c", self._in_session_cwd(command, shell_session.get_session)],
+                    timeout=timeout, on_output=capture.write
+                )
             
             # Stop animation and show completion
             animation_running.clear()
             animation_thread.join(timeout=0.1)  # Brief wait for clean shutdown
             
             # Final display with bright cyan and completion checkmark
-            print(f"\r✓  \033[38;5;51m{display_command}\033[0m")
+            if result.timed_out:
+                print(f"\r⏱  \033[38;5;214m{display_command}\033[0m \033[90m(timed out after {timeout}s)\033[0m")
+            else:
+                print(f"\r✓  \033[38;5;51m{display_command}\033[0m")
             
+            return self._shell_tool_result(command, reason, timeout, result, capture)
+            
+        except Exception as e:
             return {
-                "success": result.returncode == 0,
-                "command": command,
-                "return_code": result.returncode,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "reason": reason
+                "success": False,
+                "error": str(e),
+                "command": command
             }
+        finally:
+            # Spooled output the result did not keep (all of it, if the command raised)
+            capture.discard()
+    
+    def _runs_concurrently(self, args: Dict[str, Any]) -> bool:
+        """Whether a read-only call overlaps with others and must skip the session
+        
+        A call alone in its wave goes through the session like any other, so
+        it sees the session's exported variables, PATH, aliases and functions.
+        """
+        return in_concurrent_wave() and shell_call_parallel_safe(args)
+    
+    def _execute_read_only_command(self, command: str, reason: str, timeout: int) -> Dict[str, Any]:
+        """Run a read-only command as a one-shot exec in the session's directory
+        
+        Read-only calls that share a wave run concurrently, so they bypass the
+        (serializing) shell session and the single-line spinner.
+        """
+        capture = self.compactor.capture()
+        try:
+            result = docker_manager.run_in_container(
+                ["bash", "-c", self._in_session_cwd(command, shell_session.get_session)],
+                timeout=timeout, on_output=capture.write
+            )
+            self._log_finished_command(command, result)
+            return self._shell_tool_result(command, reason, timeout, result, capture)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "command": command
+            }
+        finally:
+            capture.discard()
+    
+    def _in_session_cwd(self, command: str, get_session) -> str:
+        """Prefix a command so it runs where this thread's shell session currently is"""
+        if SHELL_SESSIONS_ENABLED:
+            cwd = get_session(self.thread_id).cwd
+        else:
+            # No session to track cd; stay in the thread's assigned workspace
+            cwd = shell_session.thread_workdir(self.thread_id)
+        return f"cd {shlex.quote(cwd)} && {command}" if cwd else command
+    
+    def _log_finished_command(self, command: str, result) -> None:
+        """One status line per finished command (safe when several run at once)"""
+        status = "⏱ " if result.timed_out else "✓ "
+        display_command = " ".join(command.split())
+        print(f"{status} \033[90m[{self.thread_id}]\033[0m \033[38;5;51m{display_command[:120]}\033[0m")
+    
+    def _shell_tool_result(self, command: str, reason: str, timeout: int, result, capture) -> Dict[str, Any]:
+        """Build the tool result dict for a finished shell command"""
+        tool_result = {
+            "success": result.returncode == 0 and not result.timed_out,
+            "command": command,
+            "return_code": result.returncode,
+            "stdout": result.stdout,
+            "stderr": result.stderr,
+            "reason": reason
+        }
+        if result.timed_out:
+            tool_result["timed_out"] = True
+            tool_result["error"] = f"Command timed out after {timeout}s and was killed"
+        # Keep large outputs out of the conversation history
+        return self.compactor.compact(tool_result, result, capture)
+    
+    async def aexecute_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Async version of execute_tool for the asyncio agent engine"""
+        started = time.perf_counter()
+        result = await self._adispatch_tool(tool_name, tool_input)
+        self._observe_tool(tool_name, tool_input, result, time.perf_counter() - started)
+        return result
+    
+    async def _adispatch_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            if tool_name == "execute_shell_command":
+                return await self._aexecute_shell_command(tool_input)
+            else:
+                return {
+                    "success": False,
+                    "error": f"Unknown function: {tool_name}"
+                }
+                
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Tool execution error: {str(e)}"
+            }
+    
+    async def _aexecute_shell_command(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a shell command in the container without blocking the event loop
+        
+        There is no spinner here: many sessions may share one terminal, so
+        each finished command is logged as a single line tagged with its thread.
+        """
+        command = args.get("command")
+        reason = args.get("reason", "No reason provided")
+        timeout = args.get("timeout") or DEFAULT_COMMAND_TIMEOUT
+        
+        if not command:
+            return {"success": False, "error": "command is required"}
+        
+        capture = self.compactor.capture()
+        try:
+            if SHELL_SESSIONS_ENABLED and not self._runs_concurrently(args):
+                result = await shell_session.get_async_session(self.thread_id).run(
+                    command, timeout=timeout, on_output=capture.write
+                )
+            else:
+                result = await docker_manager.async_run_in_container(
+                    ["bash", "-c", self._in_session_cwd(command, shell_session.get_async_session)],
+                    timeout=timeout, on_output=capture.write
+                )
+            
+            self._log_finished_command(command, result)
+            
+            return self._shell_tool_result(command, reason, timeout, result, capture)
             
         except Exception as e:
             return {
@@ -189,3 +354,5 @@ class AnthropicToolsManager:
                 "error": str(e),
                 "command": command
             }
+        finally:
+            capture.discard()
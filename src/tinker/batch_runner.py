@@ -0,0 +1,215 @@
+"""
+Tinker Batch Runner
+Headless runs of a JSONL task file on the async engine: a worker pool,
+one session per task, optional per-task workspaces, streamed JSONL results
+and resume after interruption
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from langchain_core.messages import AIMessage, messages_to_dict
+
+from . import shell_session
+from .docker_manager import TINKER_DIR
+from .token_usage import current_turn_messages
+
+# Workspace subdirectories are created here (the container sees /home/tinker/<subdir>)
+HOST_WORKSPACE = os.path.join(TINKER_DIR, "workspace")
+CONTAINER_WORKSPACE = "/home/tinker"
+
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+
+
+class BatchFileError(ValueError):
+    """Raised for a malformed task file"""
+
+
+def load_tasks(path: str) -> List[Dict[str, Any]]:
+    """Parse a task file: one JSON object ({"task": ..., "id": ..., "workspace": ...}) or string per line
+
+    Tasks without an id get "task-<line number>", so IDs stay stable when the
+    file is re-run for a resume.
+    """
+    tasks = []
+    seen: Set[str] = set()
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise BatchFileError(f"{path}:{line_number}: invalid JSON ({e})") from None
+            if isinstance(entry, str):
+                entry = {"task": entry}
+            if not isinstance(entry, dict) or not isinstance(entry.get("task"), str) or not entry["task"].strip():
+                raise BatchFileError(f"{path}:{line_number}: expected a string or an object with a \"task\" string")
+            entry["id"] = str(entry.get("id") or f"task-{line_number}")
+            if entry["id"] in seen:
+                raise BatchFileError(f"{path}:{line_number}: duplicate task id '{entry['id']}'")
+            seen.add(entry["id"])
+            tasks.append(entry)
+    return tasks
+
+
+def finished_task_ids(results_path: str, retry_failed: bool = False) -> Set[str]:
+    """IDs already recorded in a results file (only completed ones with retry_failed)"""
+    finished: Set[str] = set()
+    if not os.path.exists(results_path):
+        return finished
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut short by the interruption; that task runs again
+                continue
+            if not retry_failed or result.get("status") == STATUS_COMPLETED:
+                finished.add(result.get("id"))
+    return finished
+
+
+def _end_partial_line(path: str) -> None:
+    """Terminate a results file cut off mid-line, so the next result starts a line of its own"""
+    try:
+        with open(path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    except OSError:
+        # Missing or empty: nothing to terminate
+        pass
+
+
+def _workspace_subdir(task: Dict[str, Any], isolate: bool, batch_name: str) -> Optional[str]:
+    """Workspace of a task relative to the container home, if it gets its own"""
+    workspace = task.get("workspace", isolate)
+    if isinstance(workspace, str) and workspace.strip():
+        subdir = os.path.normpath(workspace.strip().strip("/"))
+        if subdir.startswith(".."):
+            raise BatchFileError(f"task '{task['id']}': workspace must stay inside {CONTAINER_WORKSPACE}")
+        return subdir
+    if workspace:
+        return os.path.join("batch", batch_name, re.sub(r"[^A-Za-z0-9._-]", "_", task["id"]))
+    return None
+
+
+def _final_response(messages) -> str:
+    for message in reversed(messages):
+        if isinstance(message, AIMessage) and message.content:
+            if isinstance(message.content, str):
+                return message.content
+            return "".join(block.get("text", "") for block in message.content if isinstance(block, dict))
+    return ""
+
+
+class BatchRunner:
+    """Runs tasks concurrently on one ContinuousAgentWorkflow
+
+    Each task gets its own session (checkpoint thread) and shell, so tasks
+    never see each other's history or working directory. Results are
+    appended to results_path as each task finishes; tasks already recorded
+    there are skipped, so re-running the same command resumes a batch.
+    """
+
+    def __init__(self, workflow, results_path: str, workers: int = 4, isolate: bool = False,
+                 task_timeout: Optional[float] = None, include_messages: bool = True):
+        self.workflow = workflow
+        self.results_path = results_path
+        self.workers = max(1, workers)
+        self.isolate = isolate
+        self.task_timeout = task_timeout
+        self.include_messages = include_messages
+        self.batch_name = os.path.basename(results_path).split(".")[0]
+        self.counts = {STATUS_COMPLETED: 0, STATUS_FAILED: 0, STATUS_TIMEOUT: 0}
+
+    async def run(self, tasks: List[Dict[str, Any]]) -> Dict[str, int]:
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        for task in tasks:
+            queue.put_nowait(task)
+        _end_partial_line(self.results_path)
+        with open(self.results_path, "a", encoding="utf-8") as results:
+            await asyncio.gather(*(self._worker(queue, results) for _ in range(min(self.workers, len(tasks)))))
+        return self.counts
+
+    async def _worker(self, queue: "asyncio.Queue[Dict[str, Any]]", results) -> None:
+        while not queue.empty():
+            task = queue.get_nowait()
+            result = await self._run_task(task)
+            self.counts[result["status"]] += 1
+            # One line per task, flushed at once: an interruption loses at most the running tasks
+            results.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            results.flush()
+            icon = {STATUS_COMPLETED: "✅", STATUS_FAILED: "❌", STATUS_TIMEOUT: "⏱ "}[result["status"]]
+            detail = result.get("error") or f"{result['usage'].get('model_calls', 0)} model calls"
+            if (result.get("budget") or {}).get("stopped"):
+                detail += f" · stopped at {result['budget']['stopped']}"
+            print(f"{icon} [{task['id']}] {result['status']} in {result['wall_time']:.1f}s · {detail}")
+
+    def _thread_id(self) -> str:
+        if self.workflow.sessions is None:
+            return f"batch-{self.batch_name}-{time.time_ns()}"
+        return self.workflow.sessions.create()["thread_id"]
+
+    async def _run_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.time()
+        thread_id = self._thread_id()
+        result: Dict[str, Any] = {
+            "id": task["id"],
+            "task": task["task"],
+            "thread_id": thread_id,
+            "workspace": None,
+            "started_at": started,
+        }
+        final: Dict[str, Any] = {}
+        tool_calls: List[Dict[str, Any]] = []
+        try:
+            subdir = _workspace_subdir(task, self.isolate, self.batch_name)
+            if subdir:
+                os.makedirs(os.path.join(HOST_WORKSPACE, subdir), exist_ok=True)
+                result["workspace"] = f"{CONTAINER_WORKSPACE}/{subdir}"
+                shell_session.assign_workdir(thread_id, result["workspace"])
+            if self.workflow.sessions is not None:
+                self.workflow.sessions.record_turn(thread_id, task["task"])
+            print(f"▶  [{task['id']}] {' '.join(task['task'].split())[:80]}")
+
+            async def consume():
+                async for kind, payload in self.workflow.astream_continuous_task(task["task"], thread_id=thread_id):
+                    if kind == "tool_call":
+                        tool_calls.append({"name": payload["name"], "args": payload.get("args", {})})
+                    elif kind == "result":
+                        final.update(payload)
+
+            await asyncio.wait_for(consume(), timeout=self.task_timeout)
+            result["status"] = STATUS_COMPLETED
+        except asyncio.TimeoutError:
+            result["status"] = STATUS_TIMEOUT
+            result["error"] = f"timed out after {self.task_timeout:g}s"
+        except Exception as e:
+            result["status"] = STATUS_FAILED
+            result["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            shell_session.assign_workdir(thread_id, None)
+            await shell_session.aclose_session(thread_id)
+
+        turn_messages = current_turn_messages(final.get("messages", []))
+        result.update({
+            "final_response": _final_response(turn_messages),
+            "tool_calls": tool_calls,
+            "usage": final.get("usage", {}),
+            "budget": final.get("budget"),
+            "route": final.get("route"),
+            "wall_time": time.time() - started,
+            "finished_at": time.time(),
+        })
+        if self.include_messages:
+            result["messages"] = messages_to_dict(turn_messages)
+        return result
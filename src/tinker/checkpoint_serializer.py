@@ -0,0 +1,287 @@
+"""
+Tinker Checkpoint Serializer
+Compressed, delta-encoded checkpoint serialization for the SQLite checkpointers
+
+The stock savers write the whole message list at every graph step. This
+serializer stores each message once in a content-addressed table and keeps
+only a compressed manifest of message IDs in the checkpoint row, so a step
+writes its new messages plus a small manifest instead of the full history.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from . import tracing
+from .constants import CHECKPOINT_COMPRESSION_LEVEL, CHECKPOINT_DELTA_ENCODING
+
+BLOB_TABLE = "checkpoint_message_blobs"
+
+# Type prefixes written to the checkpoints/writes "type" column
+ZLIB_PREFIX = "zlib+"
+DELTA_PREFIX = "delta+zlib+"
+
+# Marker replacing the message list inside a delta-encoded checkpoint
+MESSAGE_REFS_KEY = "__tinker_message_refs__"
+
+# Serialized messages kept in memory, so reloading them skips the blob table
+MESSAGE_CACHE_SIZE = 4096
+
+# Blobs younger than this are never collected: a writer in another process
+# may have stored them but not yet committed the checkpoint that uses them
+BLOB_GC_GRACE_SECONDS = 3600
+
+# Stay below SQLite's host-parameter limit on older builds
+_QUERY_BATCH = 500
+
+
+class DeltaCheckpointSerializer:
+    """SerializerProtocol that compresses values and deduplicates messages
+
+    Pass it as serde= to SqliteSaver or AsyncSqliteSaver. Rows written by
+    the default serializer stay readable, so existing databases keep working.
+    Message blobs live in their own table of the same database, opened on a
+    separate connection so both sync and async savers can use it.
+    """
+
+    def __init__(self, db_path: str, delta: bool = CHECKPOINT_DELTA_ENCODING,
+                 level: int = CHECKPOINT_COMPRESSION_LEVEL):
+        self.inner = JsonPlusSerializer()
+        self.delta = delta
+        self.level = level
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self._lock = threading.Lock()
+        # blob_id -> (type, serialized message, when this process last stored or refreshed the blob)
+        self._cache: "OrderedDict[str, Tuple[str, bytes, float]]" = OrderedDict()
+        # _message_key(message) -> blob_id, so unchanged messages are not serialized again
+        self._blob_ids: "OrderedDict[Hashable, str]" = OrderedDict()
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {BLOB_TABLE} (
+                    blob_id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    raw_size INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+
+    # -- SerializerProtocol --
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.inner.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.inner.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        if self.delta and _is_checkpoint_with_messages(obj):
+            type_, data = self._dumps_checkpoint(obj)
+        else:
+            type_, data = self.inner.dumps_typed(obj)
+            type_, data = ZLIB_PREFIX + type_, zlib.compress(data, self.level)
+        # Attributed to the checkpoint write span, if any
+        tracing.current_span().count("bytes", len(data))
+        return type_, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.startswith(DELTA_PREFIX):
+            checkpoint = self.inner.loads_typed(
+                (type_[len(DELTA_PREFIX):], zlib.decompress(payload))
+            )
+            channel_values = checkpoint["channel_values"]
+            refs = channel_values["messages"][MESSAGE_REFS_KEY]
+            channel_values["messages"] = self._load_messages(refs)
+            return checkpoint
+        if type_.startswith(ZLIB_PREFIX):
+            return self.inner.loads_typed((type_[len(ZLIB_PREFIX):], zlib.decompress(payload)))
+        return self.inner.loads_typed(data)
+
+    # -- delta encoding --
+
+    def _dumps_checkpoint(self, checkpoint: Dict[str, Any]) -> Tuple[str, bytes]:
+        messages = checkpoint["channel_values"]["messages"]
+        keys = [_message_key(message) for message in messages]
+        with self._lock:
+            refs = [self._blob_ids.get(key) if key is not None else None for key in keys]
+            entries = [self._cache.get(blob_id) if blob_id is not None else None for blob_id in refs]
+        for index, entry in enumerate(entries):
+            if entry is None:
+                # New or edited message (or one that fell out of the cache)
+                message_type, message_data = self.inner.dumps_typed(messages[index])
+                refs[index] = hashlib.blake2b(
+                    message_type.encode() + b"\0" + message_data, digest_size=16
+                ).hexdigest()
+                with self._lock:
+                    entries[index] = self._cache.get(refs[index]) or (message_type, message_data, 0.0)
+
+        now = time.time()
+        # Blobs this process stored or refreshed since then cannot have been collected yet
+        confirmed_after = now - BLOB_GC_GRACE_SECONDS / 2
+        unconfirmed = {
+            blob_id: entry[:2] for blob_id, entry in zip(refs, entries) if entry[2] < confirmed_after
+        }
+        # Blobs are committed before the checkpoint row that references them
+        if unconfirmed:
+            self._store_blobs(unconfirmed, now)
+        with self._lock:
+            for key, blob_id, entry in zip(keys, refs, entries):
+                self._remember(blob_id, (*entry[:2], now) if blob_id in unconfirmed else entry)
+            self._remember_keys(zip(keys, refs))
+
+        manifest = dict(checkpoint)
+        manifest["channel_values"] = dict(checkpoint["channel_values"])
+        manifest["channel_values"]["messages"] = {MESSAGE_REFS_KEY: refs}
+        type_, data = self.inner.dumps_typed(manifest)
+        return DELTA_PREFIX + type_, zlib.compress(data, self.level)
+
+    def _store_blobs(self, blobs: Dict[str, Tuple[str, bytes]], now: float) -> None:
+        """Insert the blobs that are missing and restart the GC grace period of the others
+
+        Refreshing created_at keeps collect_blob_garbage from deleting a blob
+        this checkpoint references again before the checkpoint is committed.
+        """
+        blob_ids = list(blobs)
+        stored: Set[str] = set()
+        with self._lock, self.conn:
+            for start in range(0, len(blob_ids), _QUERY_BATCH):
+                batch = blob_ids[start:start + _QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                # The UPDATE opens the write transaction, so no collection runs between it and the SELECT
+                self.conn.execute(
+                    f"UPDATE {BLOB_TABLE} SET created_at = ? WHERE blob_id IN ({placeholders})", [now, *batch]
+                )
+                stored.update(row[0] for row in self.conn.execute(
+                    f"SELECT blob_id FROM {BLOB_TABLE} WHERE blob_id IN ({placeholders})", batch
+                ))
+            rows = [
+                (blob_id, message_type, zlib.compress(message_data, self.level), len(message_data), now)
+                for blob_id, (message_type, message_data) in blobs.items()
+                if blob_id not in stored
+            ]
+            if rows:
+                tracing.current_span().count("bytes", sum(len(row[2]) for row in rows))
+                self.conn.executemany(
+                    f"INSERT OR IGNORE INTO {BLOB_TABLE} (blob_id, type, data, raw_size, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def _load_messages(self, refs: List[str]) -> List[Any]:
+        missing = [blob_id for blob_id in dict.fromkeys(refs) if blob_id not in self._cache]
+        for start in range(0, len(missing), _QUERY_BATCH):
+            batch = missing[start:start + _QUERY_BATCH]
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT blob_id, type, data FROM {BLOB_TABLE} "
+                    f"WHERE blob_id IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for blob_id, message_type, data in rows:
+                    # Loaded, not refreshed: the next checkpoint that references it refreshes it
+                    self._remember(blob_id, (message_type, zlib.decompress(data), 0.0))
+        with self._lock:
+            serialized = [self._cache.get(blob_id) for blob_id in refs]
+        if None in serialized:
+            raise KeyError(f"Checkpoint references {serialized.count(None)} missing message blobs")
+        # Decode fresh objects on every load, as the stock serializer does
+        messages = [self.inner.loads_typed(item[:2]) for item in serialized]
+        keys = [_message_key(message) for message in messages]
+        with self._lock:
+            # So the first put after resuming a thread skips the loaded history too
+            self._remember_keys(zip(keys, refs))
+        return messages
+
+    def _remember(self, blob_id: str, entry: Tuple[str, bytes, float]) -> None:
+        """Cache a serialized message; the caller holds self._lock"""
+        self._cache[blob_id] = entry
+        self._cache.move_to_end(blob_id)
+        while len(self._cache) > MESSAGE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def _remember_keys(self, pairs: Iterable[Tuple[Optional[Hashable], str]]) -> None:
+        """Map message keys to their blob IDs; the caller holds self._lock"""
+        for key, blob_id in pairs:
+            if key is not None:
+                self._blob_ids[key] = blob_id
+                self._blob_ids.move_to_end(key)
+        while len(self._blob_ids) > MESSAGE_CACHE_SIZE:
+            self._blob_ids.popitem(last=False)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _message_key(message: Any) -> Optional[Hashable]:
+    """Cheap stand-in for a message's serialized form: type, ID, content and tool call IDs
+
+    None for messages without an ID, which are serialized at every put.
+    A str caches its hash, so an unchanged text content is hashed only once.
+    """
+    if not isinstance(message, BaseMessage) or not message.id:
+        return None
+    content = message.content
+    tool_calls = message.tool_calls if isinstance(message, AIMessage) else ()
+    return (
+        type(message).__name__,
+        message.id,
+        hash(content) if isinstance(content, str) else hash(repr(content)),
+        tuple(call.get("id") for call in tool_calls),
+    )
+
+
+def _is_checkpoint_with_messages(obj: Any) -> bool:
+    return (
+        isinstance(obj, dict)
+        and "channel_values" in obj
+        and "channel_versions" in obj
+        and isinstance(obj["channel_values"].get("messages"), list)
+    )
+
+
+def referenced_blob_ids(rows: Iterable[Tuple[str, bytes]]) -> Set[str]:
+    """Message blob IDs referenced by (type, checkpoint) rows"""
+    inner = JsonPlusSerializer()
+    referenced: Set[str] = set()
+    for type_, payload in rows:
+        if not type_.startswith(DELTA_PREFIX):
+            continue
+        manifest = inner.loads_typed((type_[len(DELTA_PREFIX):], zlib.decompress(payload)))
+        referenced.update(manifest["channel_values"]["messages"][MESSAGE_REFS_KEY])
+    return referenced
+
+
+def collect_blob_garbage(conn: sqlite3.Connection, grace_seconds: float = BLOB_GC_GRACE_SECONDS) -> int:
+    """Delete message blobs no remaining checkpoint references; returns the count"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if BLOB_TABLE not in tables or "checkpoints" not in tables:
+        return 0
+    referenced = referenced_blob_ids(
+        conn.execute(f"SELECT type, checkpoint FROM checkpoints WHERE type LIKE '{DELTA_PREFIX}%'")
+    )
+    cutoff = time.time() - grace_seconds
+    stored = [row[0] for row in conn.execute(
+        f"SELECT blob_id FROM {BLOB_TABLE} WHERE created_at < ?", (cutoff,)
+    )]
+    orphans = [blob_id for blob_id in stored if blob_id not in referenced]
+    deleted = 0
+    with conn:
+        for start in range(0, len(orphans), _QUERY_BATCH):
+            batch = orphans[start:start + _QUERY_BATCH]
+            # A writer may have refreshed one since the scan, for a checkpoint not committed yet
+            deleted += conn.execute(
+                f"DELETE FROM {BLOB_TABLE} WHERE blob_id IN ({','.join('?' * len(batch))}) AND created_at < ?",
+                [*batch, cutoff],
+            ).rowcount
+    return deleted
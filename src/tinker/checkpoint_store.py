@@ -0,0 +1,290 @@
+"""
+Tinker Checkpoint Store
+Connection tuning, retention, compaction and statistics for conversations.db
+"""
+
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from . import tracing
+from .checkpoint_serializer import BLOB_TABLE, collect_blob_garbage
+from .constants import (
+    CHECKPOINT_KEEP_LAST,
+    CHECKPOINT_MAX_AGE_DAYS,
+    CONVERSATIONS_DB_PATH,
+    USER_DATA_DIR,
+)
+
+# Applied to every connection. WAL lets readers and the checkpoint writer
+# proceed concurrently and makes each commit an append instead of a journal
+# rewrite; synchronous=NORMAL is durable across application crashes in WAL
+# mode and only skips the fsync per commit.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Tables keyed by (thread_id, checkpoint_ns, checkpoint_id)
+CHECKPOINT_TABLES = ("checkpoints", "writes")
+
+# uuid6 timestamps count 100ns intervals since 1582-10-15
+_UUID6_EPOCH_OFFSET = 0x01B21DD213814000
+
+# When each periodic maintenance task last ran, shared by every process
+MAINTENANCE_TABLE = "tinker_maintenance"
+# collect_blob_garbage decodes every delta checkpoint in the database, so
+# run_maintenance (on every workflow close) runs it at most this often;
+# 'tinker db prune' runs it right away
+BLOB_GC_INTERVAL_SECONDS = 24 * 3600
+
+
+def configure_connection(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Apply WAL/synchronous tuning, and incremental auto-vacuum on new databases"""
+    # auto_vacuum can only change on an empty database (or via a full VACUUM)
+    has_tables = conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+    if not has_tables:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _config_thread_id(config: Dict[str, Any]) -> Optional[str]:
+    return (config or {}).get("configurable", {}).get("thread_id")
+
+
+class TracedCheckpointer:
+    """Mixin for a LangGraph checkpointer that records every write as a span
+
+    Put it before the saver class (class S(TracedCheckpointer, SqliteSaver)).
+    Serialized and newly stored blob bytes are counted by the serializer.
+    """
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with tracing.span("checkpoint.put", "checkpoint", thread_id=_config_thread_id(config)):
+            return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path: str = ""):
+        with tracing.span("checkpoint.put_writes", "checkpoint", thread_id=_config_thread_id(config),
+                          writes=len(writes)):
+            return super().put_writes(config, writes, task_id, task_path)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        with tracing.span("checkpoint.put", "checkpoint", thread_id=_config_thread_id(config)):
+            return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = ""):
+        with tracing.span("checkpoint.put_writes", "checkpoint", thread_id=_config_thread_id(config),
+                          writes=len(writes)):
+            return await super().aput_writes(config, writes, task_id, task_path)
+
+
+def connect_conversations_db(path: str = CONVERSATIONS_DB_PATH) -> sqlite3.Connection:
+    """Open the shared conversations database, creating ~/.tinker if needed"""
+    if path == CONVERSATIONS_DB_PATH:
+        os.makedirs(USER_DATA_DIR, exist_ok=True)
+    return configure_connection(sqlite3.connect(path, check_same_thread=False))
+
+
+def checkpoint_timestamp(checkpoint_id: str) -> Optional[float]:
+    """Unix time encoded in a LangGraph (uuid6) checkpoint ID, None for other IDs"""
+    digits = checkpoint_id.replace("-", "")
+    if len(digits) != 32 or digits[12] != "6":
+        return None
+    timestamp = (int(digits[:12], 16) << 12) | int(digits[13:16], 16)
+    return (timestamp - _UUID6_EPOCH_OFFSET) / 1e7
+
+
+def _has_table(conn: sqlite3.Connection, table: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    return row is not None
+
+
+def delete_thread(conn: sqlite3.Connection, thread_id: str) -> None:
+    """Delete all checkpoints and pending writes of a thread (caller commits)"""
+    for table in CHECKPOINT_TABLES:
+        if _has_table(conn, table):
+            conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+
+def prune_checkpoints(conn: sqlite3.Connection, keep_last: int = CHECKPOINT_KEEP_LAST,
+                      dry_run: bool = False) -> int:
+    """Keep only the newest keep_last checkpoints of every thread
+
+    SqliteSaver stores complete channel values in each checkpoint, so the
+    newest one is enough to resume a conversation; older ones only serve
+    time travel through get_state_history. Returns the number removed.
+    """
+    if keep_last < 1 or not _has_table(conn, "checkpoints"):
+        return 0
+    # uuid6 checkpoint IDs sort chronologically
+    stale = """
+        SELECT thread_id, checkpoint_ns, checkpoint_id FROM (
+            SELECT thread_id, checkpoint_ns, checkpoint_id,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                   ) AS position
+            FROM checkpoints
+        ) WHERE position > ?
+    """
+    if dry_run:
+        return conn.execute(f"SELECT COUNT(*) FROM ({stale})", (keep_last,)).fetchone()[0]
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS temp.stale_checkpoints")
+        conn.execute(f"CREATE TEMP TABLE stale_checkpoints AS {stale}", (keep_last,))
+        removed = conn.execute("SELECT COUNT(*) FROM temp.stale_checkpoints").fetchone()[0]
+        for table in CHECKPOINT_TABLES:
+            if _has_table(conn, table):
+                conn.execute(
+                    f"DELETE FROM {table} WHERE (thread_id, checkpoint_ns, checkpoint_id) IN "
+                    "(SELECT thread_id, checkpoint_ns, checkpoint_id FROM temp.stale_checkpoints)"
+                )
+        conn.execute("DROP TABLE temp.stale_checkpoints")
+    return removed
+
+
+def prune_threads(conn: sqlite3.Connection, older_than_days: float = CHECKPOINT_MAX_AGE_DAYS,
+                  dry_run: bool = False) -> List[str]:
+    """Delete whole threads (and their sessions) with no checkpoint in older_than_days"""
+    if older_than_days <= 0 or not _has_table(conn, "checkpoints"):
+        return []
+    cutoff = time.time() - older_than_days * 86400
+    rows = conn.execute(
+        "SELECT thread_id, MAX(checkpoint_id) FROM checkpoints GROUP BY thread_id"
+    ).fetchall()
+    expired = []
+    for thread_id, latest in rows:
+        timestamp = checkpoint_timestamp(latest)
+        # Threads with foreign checkpoint IDs have no known age and are kept
+        if timestamp is not None and timestamp < cutoff:
+            expired.append(thread_id)
+    if dry_run or not expired:
+        return expired
+    with conn:
+        for thread_id in expired:
+            delete_thread(conn, thread_id)
+            if _has_table(conn, "tinker_sessions"):
+                conn.execute("DELETE FROM tinker_sessions WHERE thread_id = ?", (thread_id,))
+    return expired
+
+
+def vacuum(conn: sqlite3.Connection, full: bool = False) -> Dict[str, int]:
+    """Return free pages to the filesystem
+
+    Incremental mode releases the freelist without rewriting the database.
+    full=True rewrites it with VACUUM, which also switches older databases
+    to incremental auto-vacuum. Returns the file size before and after.
+    """
+    before = database_size(conn)
+    auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if full:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    elif auto_vacuum == 2:
+        _incremental_vacuum(conn)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {"before": before, "after": database_size(conn)}
+
+
+def run_maintenance(conn: sqlite3.Connection) -> None:
+    """Apply the configured retention policies and release freed pages"""
+    prune_checkpoints(conn)
+    prune_threads(conn)
+    if claim_periodic_run(conn, "blob_gc", BLOB_GC_INTERVAL_SECONDS):
+        collect_blob_garbage(conn)
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        _incremental_vacuum(conn)
+
+
+def claim_periodic_run(conn: sqlite3.Connection, task: str, interval: float) -> bool:
+    """Record a run of task and return True, unless it already ran within interval seconds"""
+    now = time.time()
+    with conn:
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {MAINTENANCE_TABLE} (task TEXT PRIMARY KEY, last_run REAL NOT NULL)"
+        )
+        row = conn.execute(f"SELECT last_run FROM {MAINTENANCE_TABLE} WHERE task = ?", (task,)).fetchone()
+        if row is not None and now - row[0] < interval:
+            return False
+        conn.execute(f"INSERT OR REPLACE INTO {MAINTENANCE_TABLE} (task, last_run) VALUES (?, ?)", (task, now))
+    return True
+
+
+def _incremental_vacuum(conn: sqlite3.Connection) -> None:
+    # Each step of the pragma frees one page; executescript steps it to completion
+    # (execute() would stop after the first page)
+    conn.executescript("PRAGMA incremental_vacuum;")
+
+
+def database_size(conn: sqlite3.Connection) -> int:
+    """Bytes used by the main database file (excluding the WAL)"""
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
+
+
+def collect_stats(conn: sqlite3.Connection, db_path: Optional[str] = None) -> Dict[str, Any]:
+    """Database-level and per-thread storage statistics"""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    stats: Dict[str, Any] = {
+        "database_bytes": database_size(conn),
+        "free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+        "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(
+            conn.execute("PRAGMA auto_vacuum").fetchone()[0], "unknown"
+        ),
+        "wal_bytes": 0,
+        "message_blobs": 0,
+        "message_blob_bytes": 0,
+        "message_raw_bytes": 0,
+        "threads": [],
+    }
+    if db_path and os.path.exists(db_path + "-wal"):
+        stats["wal_bytes"] = os.path.getsize(db_path + "-wal")
+    if _has_table(conn, BLOB_TABLE):
+        count, size, raw_size = conn.execute(
+            f"SELECT COUNT(*), SUM(LENGTH(data)), SUM(raw_size) FROM {BLOB_TABLE}"
+        ).fetchone()
+        stats["message_blobs"] = count
+        stats["message_blob_bytes"] = size or 0
+        stats["message_raw_bytes"] = raw_size or 0
+    if not _has_table(conn, "checkpoints"):
+        return stats
+
+    threads: Dict[str, Dict[str, Any]] = {}
+    for thread_id, count, size, latest in conn.execute(
+        "SELECT thread_id, COUNT(*), SUM(LENGTH(checkpoint) + LENGTH(metadata)), MAX(checkpoint_id) "
+        "FROM checkpoints GROUP BY thread_id"
+    ):
+        threads[thread_id] = {
+            "thread_id": thread_id,
+            "checkpoints": count,
+            "checkpoint_bytes": size or 0,
+            "writes": 0,
+            "write_bytes": 0,
+            "last_activity": checkpoint_timestamp(latest),
+        }
+    if _has_table(conn, "writes"):
+        for thread_id, count, size in conn.execute(
+            "SELECT thread_id, COUNT(*), SUM(LENGTH(value)) FROM writes GROUP BY thread_id"
+        ):
+            if thread_id in threads:
+                threads[thread_id]["writes"] = count
+                threads[thread_id]["write_bytes"] = size or 0
+    for thread in threads.values():
+        thread["total_bytes"] = thread["checkpoint_bytes"] + thread["write_bytes"]
+    stats["threads"] = sorted(threads.values(), key=lambda t: t["total_bytes"], reverse=True)
+    return stats
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
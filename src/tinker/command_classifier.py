@@ -0,0 +1,87 @@
+"""
+Tinker Command Classifier
+Conservative read-only detection for shell commands, used to decide which
+tool calls in one model turn may run concurrently
+"""
+
+import re
+import shlex
+from typing import Any, Dict, List
+
+# Commands that only read the filesystem or print information. Commands whose
+# output depends on the session's environment (printenv, which, type) are left
+# out: concurrent calls run outside the session and would answer wrongly.
+READ_ONLY_COMMANDS = {
+    "cat", "head", "tail", "wc", "ls", "tree", "stat", "file",
+    "du", "df", "pwd", "echo", "printf", "true", "date", "uname", "whoami", "id",
+    "hostname", "grep", "egrep", "fgrep", "rg",
+    "diff", "cmp", "sort", "uniq", "cut", "tr", "nl", "column", "realpath",
+    "readlink", "basename", "dirname", "md5sum", "sha1sum", "sha256sum", "jq",
+    "ps", "free", "uptime", "nproc", "lscpu",
+}
+
+# git subcommands that never touch the index, refs or working tree
+READ_ONLY_GIT_SUBCOMMANDS = {
+    "status", "log", "diff", "show", "blame", "ls-files", "ls-tree",
+    "rev-parse", "describe", "shortlog", "grep", "cat-file", "reflog",
+}
+
+# Arguments that turn an otherwise read-only command into a writer
+_WRITING_ARGS = {
+    "find": {"-delete", "-exec", "-execdir", "-ok", "-okdir", "-fprint", "-fprintf", "-fls"},
+    "sort": {"-o"},
+}
+
+# Redirection, substitution, expansion and backgrounding all make the outcome
+# depend on (or change) more than the command's own arguments
+_UNSAFE_PATTERN = re.compile(r"[<>`$&;\n]|\(|\)")
+_SEGMENT_SPLIT = re.compile(r"\|\||&&|\|")
+
+
+def _segment_read_only(words: List[str]) -> bool:
+    if not words:
+        return False
+    program, args = words[0], words[1:]
+    if program == "git":
+        subcommand = next((arg for arg in args if not arg.startswith("-")), None)
+        if subcommand == "reflog":
+            # "git reflog expire/delete" rewrite the reflog
+            return not any(arg in ("expire", "delete") for arg in args)
+        return subcommand in READ_ONLY_GIT_SUBCOMMANDS
+    if program == "sed":
+        return not any(arg.startswith("-i") or arg == "--in-place" for arg in args)
+    if program == "find" or program in READ_ONLY_COMMANDS:
+        writing_args = _WRITING_ARGS.get(program, set())
+        return not any(arg in writing_args for arg in args)
+    return False
+
+
+def is_read_only_command(command: str) -> bool:
+    """Return True if a shell command cannot modify the workspace or shell state
+
+    Only simple commands from an allowlist, optionally joined with |, &&
+    or ||, qualify. Anything involving redirection, command substitution,
+    variable expansion, subshells or unknown programs is treated as mutating.
+    """
+    if not command or _UNSAFE_PATTERN.search(command.replace("&&", " ")):
+        return False
+    for segment in _SEGMENT_SPLIT.split(command):
+        try:
+            words = shlex.split(segment)
+        except ValueError:
+            return False
+        if not _segment_read_only(words):
+            return False
+    return True
+
+
+def shell_call_parallel_safe(args: Dict[str, Any]) -> bool:
+    """Whether an execute_shell_command call may run alongside other calls
+
+    An explicit parallel_safe flag from the model wins; otherwise the
+    command is classified.
+    """
+    flag = args.get("parallel_safe")
+    if flag is not None:
+        return bool(flag)
+    return is_read_only_command(args.get("command") or "")
@@ -0,0 +1,93 @@
+"""
+Tinker Command Output
+Bounded capture of command output and the result type shared by exec backends
+"""
+
+import subprocess
+from collections import deque
+from typing import Optional
+
+from .constants import COMMAND_OUTPUT_HEAD_BYTES, COMMAND_OUTPUT_TAIL_BYTES
+
+
+class OutputRingBuffer:
+    """Keeps the first and last bytes of a stream plus total byte/line counts
+
+    Memory use is bounded by head_bytes + tail_bytes no matter how much
+    output the command produces.
+    """
+
+    def __init__(self, head_bytes: int = COMMAND_OUTPUT_HEAD_BYTES, tail_bytes: int = COMMAND_OUTPUT_TAIL_BYTES):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.total_bytes = 0
+        self.total_lines = 0
+        self._head = bytearray()
+        self._tail: deque = deque()
+        self._tail_size = 0
+        self._last_byte = b""
+
+    def write(self, data: bytes) -> None:
+        """Append a chunk of output"""
+        if not data:
+            return
+        self.total_bytes += len(data)
+        self.total_lines += data.count(b"\n")
+        self._last_byte = data[-1:]
+
+        room = self.head_bytes - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if not data or self.tail_bytes <= 0:
+            return
+
+        self._tail.append(data)
+        self._tail_size += len(data)
+        while self._tail_size - len(self._tail[0]) >= self.tail_bytes:
+            self._tail_size -= len(self._tail.popleft())
+
+    @property
+    def line_count(self) -> int:
+        """Number of lines, counting a final line without a newline"""
+        if self.total_bytes and self._last_byte != b"\n":
+            return self.total_lines + 1
+        return self.total_lines
+
+    @property
+    def omitted_bytes(self) -> int:
+        """Bytes dropped between head and tail"""
+        return max(0, self.total_bytes - len(self._head) - min(self._tail_size, self.tail_bytes))
+
+    @property
+    def truncated(self) -> bool:
+        return self.omitted_bytes > 0
+
+    def getvalue(self) -> bytes:
+        """Head and tail joined with an omission note when output was dropped"""
+        tail = b"".join(self._tail)
+        if len(tail) > self.tail_bytes:
+            tail = tail[-self.tail_bytes:]
+        if not self.truncated:
+            return bytes(self._head) + tail
+        note = f"\n... [{self.omitted_bytes} bytes omitted] ...\n".encode()
+        return bytes(self._head) + note + tail
+
+    def text(self) -> str:
+        return self.getvalue().decode(errors="replace")
+
+
+class CommandResult(subprocess.CompletedProcess):
+    """CompletedProcess with bounded output and timeout information"""
+
+    def __init__(self, args, returncode: int, stdout: OutputRingBuffer, stderr: OutputRingBuffer,
+                 timed_out: bool = False, duration: Optional[float] = None):
+        super().__init__(args, returncode, stdout.text(), stderr.text())
+        self.stdout_buffer = stdout
+        self.stderr_buffer = stderr
+        self.timed_out = timed_out
+        self.duration = duration
+
+    @property
+    def truncated(self) -> bool:
+        return self.stdout_buffer.truncated or self.stderr_buffer.truncated
@@ -3,5 +3,128 @@ Tinker Constants
 Central configuration for models and other constants
 """
 
+import os
+
+from dotenv import load_dotenv
+
+# Every setting below is read once, when this module is imported, so .env
+# has to be loaded first; variables already set in the environment win
+load_dotenv()
+
 # AI Model Configuration
-ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
\ No newline at end of file
+ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
+# Fast, cheap model for work that does not need the flagship model
+FAST_MODEL = "claude-3-5-haiku-20241022"
+
+# Per-role models (see model_router.py); each can be overridden from the environment
+REASONING_MODEL = os.getenv("TINKER_REASONING_MODEL", ANTHROPIC_MODEL)
+SUMMARIZATION_MODEL = os.getenv("TINKER_SUMMARIZATION_MODEL", FAST_MODEL)
+CONVERSATION_MODEL = os.getenv("TINKER_CONVERSATION_MODEL", FAST_MODEL)
+# Send chit-chat turns to CONVERSATION_MODEL (TINKER_MODEL_ROUTING=0 always uses REASONING_MODEL)
+MODEL_ROUTING_ENABLED = os.getenv("TINKER_MODEL_ROUTING", "1") != "0"
+
+# Shell Execution Configuration
+# Reuse one long-lived bash per conversation thread (set TINKER_SHELL_SESSIONS=0 to disable)
+SHELL_SESSIONS_ENABLED = os.getenv("TINKER_SHELL_SESSIONS", "1") != "0"
+
+# Default wall-clock limit for one shell command, in seconds
+DEFAULT_COMMAND_TIMEOUT = 300
+# Seconds between SIGTERM and SIGKILL when a command times out
+COMMAND_KILL_GRACE = 5
+
+# Captured output is bounded to the first and last bytes of each stream
+COMMAND_OUTPUT_HEAD_BYTES = 64 * 1024
+COMMAND_OUTPUT_TAIL_BYTES = 64 * 1024
+
+# Tool results above this many (approximate) tokens are cut to head + tail;
+# the full output is written to ~/.tool-output inside the container
+TOOL_RESULT_MAX_TOKENS = int(os.getenv("TINKER_TOOL_RESULT_MAX_TOKENS", "2000"))
+MAX_TOOL_OUTPUT_FILES = 200
+# Same ratio as langchain's count_tokens_approximately
+CHARS_PER_TOKEN = 4.0
+
+# Conversation Storage Configuration
+# Per-user app data; checkpoints and the session index share one SQLite file
+USER_DATA_DIR = os.path.expanduser("~/.tinker")
+CONVERSATIONS_DB_PATH = os.path.join(USER_DATA_DIR, "conversations.db")
+
+# Checkpoint retention, applied when a workflow closes and by `tinker db prune`.
+# Each checkpoint holds the full conversation state, so the newest few suffice
+# to resume; older ones only serve state-history time travel.
+CHECKPOINT_KEEP_LAST = int(os.getenv("TINKER_CHECKPOINT_KEEP_LAST", "20"))
+# Delete whole threads idle for this many days (0 keeps them forever)
+CHECKPOINT_MAX_AGE_DAYS = float(os.getenv("TINKER_CHECKPOINT_MAX_AGE_DAYS", "0"))
+
+# Checkpoint serialization: store each message once and reference it by ID
+# from later checkpoints (TINKER_CHECKPOINT_DELTA=0 writes full checkpoints)
+CHECKPOINT_DELTA_ENCODING = os.getenv("TINKER_CHECKPOINT_DELTA", "1") != "0"
+CHECKPOINT_COMPRESSION_LEVEL = 6
+
+# Start summarizing in the background once the unsummarized history reaches
+# this fraction of the summarization threshold, so the summary is ready
+# (and swapped in without a stall) by the time the threshold is crossed
+SUMMARY_PREFETCH_RATIO = float(os.getenv("TINKER_SUMMARY_PREFETCH_RATIO", "0.75"))
+
+# Tool outputs older than this many user turns are moved out of the history
+# into a content-addressed store and replaced by a stub the agent can expand
+# with recall_tool_output (TINKER_TOOL_OUTPUT_KEEP_TURNS=0 keeps them inline)
+TOOL_OUTPUT_STORE_DIR = os.path.join(USER_DATA_DIR, "tool-outputs")
+TOOL_OUTPUT_KEEP_TURNS = int(os.getenv("TINKER_TOOL_OUTPUT_KEEP_TURNS", "2"))
+# Smaller outputs cost less than their stub and stay inline
+TOOL_OUTPUT_OFFLOAD_MIN_TOKENS = 256
+
+# Long-term memory across sessions: facts and task outcomes extracted after
+# each task, recalled by similarity before the next one
+# (TINKER_LONG_TERM_MEMORY=0 disables both)
+LONG_TERM_MEMORY_ENABLED = os.getenv("TINKER_LONG_TERM_MEMORY", "1") != "0"
+LONG_TERM_MEMORY_DIR = os.path.join(USER_DATA_DIR, "memory")
+# Hashed feature dimensions; the vector matrix takes 4 * MEMORY_VECTOR_DIM bytes per memory
+MEMORY_VECTOR_DIM = 256
+# Memories injected before a task, and the minimum similarity to qualify
+MEMORY_TOP_K = 5
+MEMORY_MIN_SCORE = 0.1
+
+# Tracing: nested spans (task, model calls, tools, execs, checkpoint writes)
+# appended to one JSONL file per thread, shown by `tinker trace`
+# (TINKER_TRACING=0 disables recording)
+TRACING_ENABLED = os.getenv("TINKER_TRACING", "1") != "0"
+TRACE_DIR = os.path.join(USER_DATA_DIR, "traces")
+
+# Prometheus metrics: with TINKER_METRICS_PORT set, counters and latency
+# histograms are recorded in-process and served in the text exposition
+# format at http://<TINKER_METRICS_HOST>:<port>/metrics by long-running
+# commands (chat, batch). Unset or 0 records nothing.
+METRICS_PORT = int(os.getenv("TINKER_METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("TINKER_METRICS_HOST", "127.0.0.1")
+
+# Record/replay cache of model responses, keyed by a hash of the request.
+# TINKER_LLM_CACHE: passthrough (default, no cache), record (serve hits,
+# store misses) or replay (hits only; a miss is an error, so runs stay
+# offline and deterministic). Least recently used responses are evicted
+# past TINKER_LLM_CACHE_MAX_MB.
+LLM_CACHE_MODE = os.getenv("TINKER_LLM_CACHE", "passthrough").strip().lower()
+LLM_CACHE_PATH = os.getenv("TINKER_LLM_CACHE_PATH", os.path.join(USER_DATA_DIR, "llm-cache.db"))
+LLM_CACHE_MAX_MB = int(os.getenv("TINKER_LLM_CACHE_MAX_MB", "512"))
+
+# Rate limiting shared by every Tinker process on this machine: token
+# buckets for requests, input and output tokens per minute (per model;
+# 0 = no limit) live in one SQLite file, waiting calls are served first
+# come first served, and 429/529 responses and transient API errors are
+# retried after retry-after (or exponential backoff) with jitter.
+# TINKER_RATE_LIMIT=0 disables it.
+RATE_LIMIT_ENABLED = os.getenv("TINKER_RATE_LIMIT", "1") != "0"
+RATE_LIMIT_DB_PATH = os.path.join(USER_DATA_DIR, "rate-limits.db")
+RATE_LIMIT_RPM = int(os.getenv("TINKER_RATE_LIMIT_RPM", "0"))
+RATE_LIMIT_INPUT_TPM = int(os.getenv("TINKER_RATE_LIMIT_INPUT_TPM", "0"))
+RATE_LIMIT_OUTPUT_TPM = int(os.getenv("TINKER_RATE_LIMIT_OUTPUT_TPM", "0"))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("TINKER_RATE_LIMIT_MAX_RETRIES", "6"))
+
+# Per-task budgets (0 = unlimited). A task that reaches one stops before
+# its next step, closes any unanswered tool calls and ends with a summary
+# of what was done and what remains. Model calls bound runaway loops;
+# the recursion limit of the graph is raised to match.
+TASK_MAX_MODEL_CALLS = int(os.getenv("TINKER_TASK_MAX_MODEL_CALLS", "30"))
+TASK_MAX_INPUT_TOKENS = int(os.getenv("TINKER_TASK_MAX_INPUT_TOKENS", "0"))
+TASK_MAX_OUTPUT_TOKENS = int(os.getenv("TINKER_TASK_MAX_OUTPUT_TOKENS", "0"))
+TASK_MAX_SECONDS = float(os.getenv("TINKER_TASK_MAX_SECONDS", "0"))
+TASK_MAX_TOOL_CALLS = int(os.getenv("TINKER_TASK_MAX_TOOL_CALLS", "0"))
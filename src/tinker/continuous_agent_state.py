@@ -1,16 +1,20 @@
 """
 Extended State Schema for Memory Summarization
-Supports LangMem SummarizationNode requirements
+Supports the conversation memory pre-model hook
 """
 
 from langgraph.prebuilt.chat_agent_executor import AgentState
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 
 class ContinuousAgentState(AgentState):
     """Extended state schema for memory summarization support
-    
+
     Inherits from AgentState which provides the 'messages' field
-    and adds context tracking required by SummarizationNode
+    and adds context tracking used by ConversationMemoryHook:
+    'memory' (hierarchical chunk summaries of older history) and
+    'token_accounting' (running token totals for the history), and the
+    long-term memories recalled for the current task
     """
-    context: Dict[str, Any]  # Required for SummarizationNode bookkeeping
\ No newline at end of file
+    context: Dict[str, Any]  # Summary and token accounting bookkeeping
+    recalled_memories: List[str]  # Set with each task's input, rendered by the hook
@@ -3,68 +3,177 @@ Continuous Agent Workflow for Tinker
 Simplified implementation using LangGraph's create_react_agent
 """
 
-from typing import Dict, Any
+import asyncio
+import contextlib
+import copy
+import json
+import sqlite3
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.prebuilt import create_react_agent
-from langchain_anthropic import ChatAnthropic
-from langmem.short_term import SummarizationNode
+from langchain_core.messages import AIMessage, AIMessageChunk, SystemMessage
 from langchain_core.messages.utils import count_tokens_approximately
 from .langchain_tools import AVAILABLE_TOOLS
-from .constants import ANTHROPIC_MODEL
+from .parallel_tool_node import ParallelToolNode
+from .constants import CHARS_PER_TOKEN, CHECKPOINT_MAX_AGE_DAYS, CONVERSATIONS_DB_PATH, LONG_TERM_MEMORY_ENABLED
+from .conversation_memory import ConversationMemoryHook
 from .continuous_agent_state import ContinuousAgentState
+from .checkpoint_serializer import DeltaCheckpointSerializer
+from .checkpoint_store import CONNECTION_PRAGMAS, TracedCheckpointer, connect_conversations_db, run_maintenance
+from .long_term_memory import LongTermMemory
+from .model_router import ROLE_REASONING, ROLE_SUMMARIZATION, ModelRouter
+from .session_manager import SessionManager
+from .task_budget import (
+    BudgetTracker,
+    TaskBudget,
+    skipped_tool_messages,
+    summary_request,
+    summary_text,
+    unanswered_tool_calls,
+)
+from .token_accounting import MessageTokenCounter
+from .tool_output_store import ToolOutputOffloader, ToolOutputStore
+from .prompt_caching import build_cached_prompt, cache_tool_schemas
+from .token_usage import collect_usage, current_turn_messages
+from . import metrics
+from . import tracing
+
+
+class TracedSqliteSaver(TracedCheckpointer, SqliteSaver):
+    """SqliteSaver whose writes show up as checkpoint spans"""
+
+
+class TracedAsyncSqliteSaver(TracedCheckpointer, AsyncSqliteSaver):
+    """AsyncSqliteSaver whose writes show up as checkpoint spans"""
 
 
 class ContinuousAgentWorkflow:
-    """Simplified workflow using LangGraph's create_react_agent"""
+    """Simplified workflow using LangGraph's create_react_agent
+    
+    Building the workflow opens the checkpoint DB, creates the model clients
+    and compiles the agent graph, so create it once per process and reuse it
+    for every turn. Call close() (or use it as a context manager) on shutdown.
+    
+    Each user turn is routed by ModelRouter: chit-chat goes to an agent on the
+    fast conversation model, everything else to the reasoning model. Both
+    agents share the checkpointer, so a thread can switch between them.
+    
+    The async methods (arun_continuous_task / astream_continuous_task) run
+    on a second graph compiled lazily with AsyncSqliteSaver and async tools,
+    so one process can drive many conversation threads concurrently:
+    
+        await asyncio.gather(*(workflow.arun_continuous_task(goal, thread_id=t) for t in threads))
+    
+    Release it with aclose() from the event loop.
+    """
     
     def __init__(self, enable_memory: bool = True):
         # Define available tools
         self.tools = AVAILABLE_TOOLS
+        self.enable_memory = enable_memory
+        self.router = ModelRouter()
+        self.db_path = None
+        self.async_conn = None
+        self._async_agents: Dict[str, Any] = {}
+        self._async_agent_lock = asyncio.Lock()
         
         # Setup memory components
         if enable_memory:
             # Configure SQLite checkpointer for persistence
-            # Use context manager approach for proper resource management
-            import sqlite3
-            from langgraph.checkpoint.sqlite import SqliteSaver
-            
-            # Create .tinker directory for app data
-            import os
-            tinker_dir = os.path.expanduser("~/.tinker")
-            os.makedirs(tinker_dir, exist_ok=True)
-            
-            # Create SQLite connection and checkpointer in .tinker directory
-            db_path = os.path.join(tinker_dir, "conversations.db")
-            conn = sqlite3.connect(db_path, check_same_thread=False)
-            checkpointer = SqliteSaver(conn)
+            # Create SQLite connection and checkpointer in ~/.tinker
+            self.db_path = CONVERSATIONS_DB_PATH
+            self.conn = connect_conversations_db(self.db_path)
+            # Messages are stored once and referenced from later checkpoints
+            self.serde = DeltaCheckpointSerializer(self.db_path)
+            checkpointer = TracedSqliteSaver(self.conn, serde=self.serde)
+            # Session index lives in the same database as the checkpoints
+            self.sessions = SessionManager(self.conn)
             
             # Configure summarization model with optimized settings
-            summarization_model = ChatAnthropic(
-                model=ANTHROPIC_MODEL,
+            summarization_model = self.router.chat_model(
+                ROLE_SUMMARIZATION,
                 temperature=0.1,   # Lower temperature for consistent summaries
                 max_tokens=16384   # 8x original: 2048 * 8
             )
             
-            # Create summarization node with researched optimal parameters
-            # 8x the recommended values for balanced context handling
-            self.summarization_node = SummarizationNode(
+            # Old tool outputs move to a blob store next to the database; the
+            # agent reads them back with recall_tool_output
+            counter = MessageTokenCounter()
+            self.tool_outputs = ToolOutputStore()
+            
+            # Summarize older history segment by segment: once the unsummarized
+            # messages pass the threshold, the oldest ~segment_tokens become a
+            # chunk summary, and every fanout summaries merge one level up
+            self.memory_hook = ConversationMemoryHook(
                 model=summarization_model,
-                max_tokens=16384,                   # 8x: 2048 * 8
-                max_tokens_before_summary=24576,    # 8x: 3072 * 8  
-                max_summary_tokens=4096,            # 8x: 512 * 8
-                token_counter=count_tokens_approximately
+                max_tokens_before_summary=24576,    # 8x: 3072 * 8
+                segment_tokens=8192,
+                chunk_summary_tokens=1024,
+                fanout=4,
+                prompt_overhead_tokens=self._prompt_overhead_tokens(),
+                counter=counter,
+                offloader=ToolOutputOffloader(self.tool_outputs, counter=counter)
+            )
+            
+            # Facts and outcomes of finished tasks, recalled before related tasks
+            # in any session; extraction uses the summarization model
+            self.long_term_memory = (
+                LongTermMemory(self.db_path, model=summarization_model) if LONG_TERM_MEMORY_ENABLED else None
             )
         else:
+            self.conn = None
+            self.serde = None
             checkpointer = None
-            self.summarization_node = None
+            self.memory_hook = None
+            self.sessions = None
+            self.tool_outputs = None
+            self.long_term_memory = None
         
-        # Create the agent using LangGraph prebuilt with memory support
-        self.agent = create_react_agent(
-            model=f"anthropic:{ANTHROPIC_MODEL}",
-            tools=self.tools,
+        # Bind tools ourselves so the tool block carries a cache breakpoint;
+        # create_react_agent keeps an existing binding with matching tool names.
+        # The conversation model gets the tools too, so a misrouted turn still works
+        self.models = {
+            role: self.router.chat_model(role).bind_tools(cache_tool_schemas(self.tools))
+            for role in self.router.agent_roles
+        }
+        self.model = self.models[ROLE_REASONING]
+        
+        # Create the agents using LangGraph prebuilt with memory support
+        self.agents = {role: self._build_agent(checkpointer, role) for role in self.models}
+        self.agent = self.agents[ROLE_REASONING]
+    
+    def _build_agent(self, checkpointer, role: str = ROLE_REASONING):
+        """Compile the ReAct agent graph for one model role around the given checkpointer"""
+        return create_react_agent(
+            model=self.models[role],
+            tools=ParallelToolNode(self.tools),
             checkpointer=checkpointer,
-            pre_model_hook=self.summarization_node if enable_memory else None,
+            pre_model_hook=self.memory_hook.as_runnable() if self.memory_hook else None,
             state_schema=ContinuousAgentState,
-            prompt=self._get_system_prompt()
+            prompt=build_cached_prompt(self._get_system_prompt())
+        )
+    
+    async def _get_async_agent(self, role: str = ROLE_REASONING):
+        """Compile the async graph for a role on first use, inside the running event loop"""
+        async with self._async_agent_lock:
+            if role not in self._async_agents:
+                checkpointer = None
+                if self.enable_memory:
+                    if self.async_conn is None:
+                        import aiosqlite
+                        self.async_conn = await aiosqlite.connect(self.db_path)
+                        for pragma in CONNECTION_PRAGMAS:
+                            await self.async_conn.execute(pragma)
+                    checkpointer = TracedAsyncSqliteSaver(self.async_conn, serde=self.serde)
+                self._async_agents[role] = self._build_agent(checkpointer, role)
+            return self._async_agents[role]
+    
+    def _prompt_overhead_tokens(self) -> int:
+        """Approximate tokens of the system prompt and tool schemas sent with every call"""
+        schemas = json.dumps(cache_tool_schemas(self.tools))
+        return count_tokens_approximately([SystemMessage(content=self._get_system_prompt())]) + int(
+            len(schemas) / CHARS_PER_TOKEN
         )
     
     def _get_system_prompt(self) -> str:
@@ -87,32 +196,286 @@ Guidelines:
 - Be efficient but thorough
 - Explain your reasoning clearly
 - Execute multiple commands in sequence when logical
+- Issue independent read-only commands (ls, cat, grep, git status/log/diff) as several tool calls in one turn; they run concurrently
 - Always validate results before proceeding
 - Ask for clarification if the task is unclear"""
     
+    def _task_config(self, thread_id: str, budget: TaskBudget) -> Dict[str, Any]:
+        return {
+            "configurable": {"thread_id": thread_id},
+            "recursion_limit": budget.recursion_limit
+        }
+    
+    @staticmethod
+    def _task_budget(budget: Optional[TaskBudget], max_iterations: Optional[int]) -> TaskBudget:
+        """The task's budget: the given one or the configured defaults, with max_iterations as max model calls"""
+        budget = copy.copy(budget) if budget is not None else TaskBudget()
+        if max_iterations:
+            budget.max_model_calls = max_iterations
+        return budget
+    
+    def _summary_input(self, llm_input: List[Any], reason: str) -> List[Any]:
+        """Prompt for the closing summary: the history as the model would see it, then the request"""
+        return build_cached_prompt(self._get_system_prompt())({"messages": llm_input + [summary_request(reason)]})
+    
+    def _stop_task(self, agent, config: Dict[str, Any], role: str, reason: str,
+                   state: Dict[str, Any]) -> Dict[str, Any]:
+        """End a task that ran out of budget: answer its pending tool calls, then add a summary
+        
+        Returns the task's final state. With a checkpointer both are stored in
+        the thread; without one they only extend state, the last streamed values.
+        """
+        if agent.checkpointer is not None:
+            state = agent.get_state(config).values
+        skipped = skipped_tool_messages(unanswered_tool_calls(state["messages"]), reason)
+        if skipped and agent.checkpointer is not None:
+            agent.update_state(config, {"messages": skipped}, as_node="tools")
+        state = {**state, "messages": list(state["messages"]) + skipped}
+        llm_input = state["messages"]
+        if self.memory_hook is not None:
+            llm_input = self.memory_hook(state, config)["llm_input_messages"]
+        response = self.models[role].invoke(self._summary_input(llm_input, reason))
+        summary = AIMessage(content=summary_text(response), usage_metadata=response.usage_metadata)
+        if agent.checkpointer is None:
+            return {**state, "messages": state["messages"] + [summary]}
+        agent.update_state(config, {"messages": [summary]}, as_node="agent")
+        return agent.get_state(config).values
+    
+    async def _astop_task(self, agent, config: Dict[str, Any], role: str, reason: str,
+                          state: Dict[str, Any]) -> Dict[str, Any]:
+        """Async version of _stop_task"""
+        if agent.checkpointer is not None:
+            state = (await agent.aget_state(config)).values
+        skipped = skipped_tool_messages(unanswered_tool_calls(state["messages"]), reason)
+        if skipped and agent.checkpointer is not None:
+            await agent.aupdate_state(config, {"messages": skipped}, as_node="tools")
+        state = {**state, "messages": list(state["messages"]) + skipped}
+        llm_input = state["messages"]
+        if self.memory_hook is not None:
+            llm_input = (await self.memory_hook.ainvoke(state, config))["llm_input_messages"]
+        response = await self.models[role].ainvoke(self._summary_input(llm_input, reason))
+        summary = AIMessage(content=summary_text(response), usage_metadata=response.usage_metadata)
+        if agent.checkpointer is None:
+            return {**state, "messages": state["messages"] + [summary]}
+        await agent.aupdate_state(config, {"messages": [summary]}, as_node="agent")
+        return (await agent.aget_state(config)).values
+    
+    def _task_input(self, goal: str, role: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Graph input for a turn, with the long-term memories recalled for it"""
+        task_input: Dict[str, Any] = {"messages": [{"role": "user", "content": goal}]}
+        if self.long_term_memory is None:
+            return task_input, []
+        # Chit-chat needs no recall; an empty list clears the previous task's memories
+        recalled = []
+        if role == ROLE_REASONING:
+            with tracing.span("memory.recall", "memory") as recall_span:
+                recalled = self.long_term_memory.search(goal)
+                recall_span.set(memories=len(recalled))
+        task_input["recalled_memories"] = [memory["text"] for memory in recalled]
+        return task_input, recalled
+    
+    def _remember(self, thread_id: str, goal: str, role: str, result: Dict[str, Any]) -> None:
+        """Extract long-term memories from a finished task in the background"""
+        if self.long_term_memory is not None and role == ROLE_REASONING and result.get("messages"):
+            self.long_term_memory.remember_task_in_background(
+                thread_id, goal, current_turn_messages(result["messages"])
+            )
+    
+    def stream_continuous_task(self, goal: str, thread_id: str = "main", **kwargs) -> Iterator[Tuple[str, Any]]:
+        """Run a task and yield events as they happen
+        
+        Events are (kind, payload) tuples:
+            ("route", dict)           - {"role", "model"} chosen for this turn
+            ("recalled", list)        - long-term memories injected for this turn
+            ("token", str)            - assistant text as it is generated
+            ("tool_call", dict)       - a tool call, as soon as the model emits it
+            ("tool_result", message)  - a ToolMessage once the tool finished
+            ("budget_exceeded", str)  - the limit that stopped the task; its summary follows as a token
+            ("result", dict)          - final state, same structure as run_continuous_task
+        
+        budget (a TaskBudget) overrides the configured per-task limits;
+        max_iterations sets its maximum number of model calls.
+        """
+        role = self.router.route(goal)
+        budget = self._task_budget(kwargs.get("budget"), kwargs.get("max_iterations"))
+        with (
+            tracing.span("task", "task", thread_id=thread_id, goal=goal[:200], role=role) as task_span,
+            metrics.track(metrics.TASK_SECONDS, metrics.TASKS, role=role),
+        ):
+            yield "route", {"role": role, "model": self.router.model_names[role]}
+            task_input, recalled = self._task_input(goal, role)
+            if recalled:
+                yield "recalled", recalled
+            agent = self.agents[role]
+            config = self._task_config(thread_id, budget)
+            tracker = BudgetTracker(budget)
+            final_state: Dict[str, Any] = {}
+            for mode, chunk in agent.stream(task_input, config=config, stream_mode=["messages", "updates", "values"]):
+                if mode == "values":
+                    final_state = chunk
+                    # Stop once the step that used up the budget is checkpointed
+                    if tracker.exceeded:
+                        break
+                else:
+                    if mode == "updates":
+                        tracker.observe(chunk)
+                    yield from _stream_events(mode, chunk)
+            
+            if tracker.exceeded:
+                yield "budget_exceeded", tracker.exceeded
+                final_state = self._stop_task(agent, config, role, tracker.exceeded, final_state)
+                yield "token", final_state["messages"][-1].content
+            result = self._final_result(final_state, role, tracker)
+            task_span.set(**result["usage"])
+            self._remember(thread_id, goal, role, result)
+        yield "result", result
+    
+    async def astream_continuous_task(self, goal: str, thread_id: str = "main", **kwargs) -> AsyncIterator[Tuple[str, Any]]:
+        """Async version of stream_continuous_task (same events)"""
+        role = self.router.route(goal)
+        budget = self._task_budget(kwargs.get("budget"), kwargs.get("max_iterations"))
+        with (
+            tracing.span("task", "task", thread_id=thread_id, goal=goal[:200], role=role) as task_span,
+            metrics.track(metrics.TASK_SECONDS, metrics.TASKS, role=role),
+        ):
+            yield "route", {"role": role, "model": self.router.model_names[role]}
+            task_input, recalled = self._task_input(goal, role)
+            if recalled:
+                yield "recalled", recalled
+            agent = await self._get_async_agent(role)
+            config = self._task_config(thread_id, budget)
+            tracker = BudgetTracker(budget)
+            final_state: Dict[str, Any] = {}
+            # Closed on break, so the graph's last checkpoint write lands before _astop_task's
+            async with contextlib.aclosing(
+                agent.astream(task_input, config=config, stream_mode=["messages", "updates", "values"])
+            ) as stream:
+                async for mode, chunk in stream:
+                    if mode == "values":
+                        final_state = chunk
+                        if tracker.exceeded:
+                            break
+                    else:
+                        if mode == "updates":
+                            tracker.observe(chunk)
+                        for event in _stream_events(mode, chunk):
+                            yield event
+            
+            if tracker.exceeded:
+                yield "budget_exceeded", tracker.exceeded
+                final_state = await self._astop_task(agent, config, role, tracker.exceeded, final_state)
+                yield "token", final_state["messages"][-1].content
+            result = self._final_result(final_state, role, tracker)
+            task_span.set(**result["usage"])
+            self._remember(thread_id, goal, role, result)
+        yield "result", result
+    
+    @staticmethod
+    def _final_result(final_state: Dict[str, Any], role: str, tracker: BudgetTracker) -> Dict[str, Any]:
+        result = dict(final_state)
+        result["route"] = role
+        result["usage"] = collect_usage(current_turn_messages(result.get("messages", [])))
+        result["budget"] = tracker.report()
+        return result
+    
     def run_continuous_task(self, goal: str, thread_id: str = "main", **kwargs) -> Dict[str, Any]:
         """Run a task with fluid reasoning and tool execution
         
         Args:
             goal: The task/goal to accomplish
             thread_id: Thread ID for conversation memory
-            **kwargs: Additional arguments for compatibility (e.g., max_iterations)
+            **kwargs: budget (a TaskBudget) and/or max_iterations (max model calls)
         
         Returns:
-            Dictionary with messages and results
+            Dictionary with messages and results, plus token usage for this turn
+            (including prompt cache reads/writes) under "usage", the model
+            role that answered under "route", and tool executions, wall time
+            and the limit that stopped the task (if any) under "budget"
         """
-        config = {
-            "configurable": {"thread_id": thread_id},
-            "recursion_limit": 100
-        }
-        
-        result = self.agent.invoke(
-            {"messages": [{"role": "user", "content": goal}]},
-            config=config
-        )
-        
+        result: Dict[str, Any] = {}
+        for kind, payload in self.stream_continuous_task(goal, thread_id=thread_id, **kwargs):
+            if kind == "result":
+                result = payload
+        return result
+    
+    async def arun_continuous_task(self, goal: str, thread_id: str = "main", **kwargs) -> Dict[str, Any]:
+        """Async version of run_continuous_task"""
+        result: Dict[str, Any] = {}
+        async for kind, payload in self.astream_continuous_task(goal, thread_id=thread_id, **kwargs):
+            if kind == "result":
+                result = payload
         return result
     
     def run_task(self, goal: str, thread_id: str = "main") -> Dict[str, Any]:
         """Alternative method name for compatibility"""
-        return self.run_continuous_task(goal, thread_id=thread_id)
\ No newline at end of file
+        return self.run_continuous_task(goal, thread_id=thread_id)
+    
+    def close(self) -> None:
+        """Apply checkpoint retention, then release the database connection"""
+        if self.memory_hook is not None:
+            self.memory_hook.close()
+        if self.long_term_memory is not None:
+            # Waits for memory extraction of the last task
+            self.long_term_memory.close()
+            self.long_term_memory = None
+        # After the summarizer and memory extraction, which may still call a model
+        self.router.close()
+        if self.conn is not None:
+            try:
+                run_maintenance(self.conn)
+            except sqlite3.Error as e:
+                # Maintenance is best effort; e.g. another process holds the write lock
+                print(f"⚠️  Checkpoint maintenance skipped: {e}")
+            self.tool_outputs.prune(CHECKPOINT_MAX_AGE_DAYS)
+            tracing.tracer.prune(CHECKPOINT_MAX_AGE_DAYS)
+            self.conn.close()
+            self.conn = None
+        if self.serde is not None:
+            self.serde.close()
+            self.serde = None
+    
+    async def aclose(self) -> None:
+        """Release the async checkpointer connection and async shell sessions, then close()"""
+        from . import shell_session
+        await shell_session.aclose_all_sessions()
+        if self.async_conn is not None:
+            await self.async_conn.close()
+            self.async_conn = None
+        self.close()
+    
+    def __enter__(self) -> "ContinuousAgentWorkflow":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def _stream_events(mode: str, chunk: Any) -> Iterator[Tuple[str, Any]]:
+    """Translate one "messages" or "updates" stream item into workflow events"""
+    if mode == "messages":
+        message, metadata = chunk
+        # Only the reasoning model; summarization calls stream from the pre-model hook
+        if metadata.get("langgraph_node") == "agent" and isinstance(message, AIMessageChunk):
+            text = _chunk_text(message)
+            if text:
+                yield "token", text
+    elif mode == "updates":
+        for node, update in chunk.items():
+            if not isinstance(update, dict):
+                continue
+            for message in update.get("messages", []):
+                if node == "agent":
+                    for tool_call in getattr(message, "tool_calls", None) or []:
+                        yield "tool_call", tool_call
+                elif node == "tools":
+                    yield "tool_result", message
+
+
+def _chunk_text(chunk: AIMessageChunk) -> str:
+    """Extract the text part of a streamed Anthropic message chunk"""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        block.get("text", "") for block in chunk.content
+        if isinstance(block, dict) and block.get("type") in ("text", "text_delta")
+    )
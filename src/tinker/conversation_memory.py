@@ -0,0 +1,454 @@
+"""
+Tinker Conversation Memory
+pre_model_hook that keeps the model input within budget: incremental token
+accounting, old tool outputs moved to a blob store, and hierarchical
+summaries of older history, prepared in the background
+"""
+
+import contextvars
+import copy
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+from . import metrics
+from . import tracing
+from .constants import SUMMARY_PREFETCH_RATIO
+from .token_accounting import MessageTokenCounter, move_unsummarized_start, update_accounting
+from .tool_output_store import ToolOutputOffloader
+
+SEGMENT_PROMPT = """You maintain the long-term memory of an AI agent that runs shell commands in a Docker container.
+Summarize the conversation segment below in at most {words} words. Keep what later steps may need:
+the user's requests, commands run and their outcomes, file paths, errors and how they were resolved,
+decisions made, and anything still open. Do not repeat the earlier context.
+
+Earlier context (already summarized):
+{previous}
+
+Segment:
+{transcript}"""
+
+MERGE_PROMPT = """You maintain the long-term memory of an AI agent that runs shell commands in a Docker container.
+Merge these consecutive summaries (oldest first) into one summary of at most {words} words.
+Keep concrete facts (requests, file paths, outcomes, errors, decisions, open items); drop details
+that were superseded later.
+
+{summaries}"""
+
+# User turn placed before the remaining messages when they start mid-turn
+CONTINUE_FROM_SUMMARY = "(Earlier messages are summarized above. Continue from where the conversation left off.)"
+
+# Characters of a single tool result or tool call kept in a segment transcript
+TRANSCRIPT_ITEM_CHARS = 4000
+# Rough words per token, used to phrase length limits in the prompts
+WORDS_PER_TOKEN = 0.75
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return "\n".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in content
+        if isinstance(block, str) or block.get("type") == "text"
+    )
+
+
+def _clip(text: str, limit: int = TRANSCRIPT_ITEM_CHARS) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit // 2]}\n... [{len(text) - limit} characters omitted] ...\n{text[-limit // 2:]}"
+
+
+def render_transcript(messages: Sequence[BaseMessage]) -> str:
+    """Plain-text transcript of a segment, including tool calls and results"""
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            lines.append(f"User: {_clip(_text(message.content))}")
+        elif isinstance(message, AIMessage):
+            text = _text(message.content)
+            if text:
+                lines.append(f"Assistant: {_clip(text)}")
+            for call in message.tool_calls or []:
+                lines.append(f"Tool call {call['name']}: {_clip(json.dumps(call.get('args', {})))}")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"Tool result: {_clip(_text(message.content))}")
+        else:
+            lines.append(f"{message.type}: {_clip(_text(message.content))}")
+    return "\n".join(lines)
+
+
+def empty_memory() -> Dict[str, Any]:
+    """Hierarchical summary state kept in state["context"]["memory"]
+
+    levels[0] holds summaries of raw message segments, levels[n] summaries of
+    fanout level n-1 summaries. through_id is the last message covered and
+    position the index just after it.
+    """
+    return {"levels": [], "through_id": None, "position": 0}
+
+
+def memory_position(memory: Dict[str, Any], messages: Sequence[BaseMessage]) -> Optional[int]:
+    """Index of the first message not covered by memory, or None if it does not fit this history"""
+    if memory["through_id"] is None:
+        return 0
+    position = memory.get("position")
+    if position is not None and 0 < position <= len(messages) and messages[position - 1].id == memory["through_id"]:
+        return position
+    # Summaries from before positions were stored, or a rewritten history
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index].id == memory["through_id"]:
+            return index + 1
+    return None
+
+
+def render_memory(memory: Dict[str, Any]) -> Optional[SystemMessage]:
+    """The summaries as one system message, oldest (highest level) first"""
+    parts = [
+        entry["summary"]
+        for level in reversed(memory["levels"])
+        for entry in level
+    ]
+    if not parts:
+        return None
+    return SystemMessage(content="Summary of the conversation so far (oldest first):\n\n" + "\n\n".join(parts))
+
+
+def render_recalled_memories(memories: Sequence[str]) -> Optional[SystemMessage]:
+    """Long-term memories recalled for the current task, as one system message"""
+    if not memories:
+        return None
+    return SystemMessage(
+        content="Relevant memories from earlier sessions (may be outdated; verify before relying on them):\n"
+        + "\n".join(f"- {memory}" for memory in memories)
+    )
+
+
+def _from_running_summary(running_summary: Any) -> Dict[str, Any]:
+    """Seed the hierarchy from a langmem RunningSummary written by earlier versions"""
+    memory = empty_memory()
+    memory["levels"] = [[], [{"summary": running_summary.summary, "messages": len(running_summary.summarized_message_ids)}]]
+    memory["through_id"] = running_summary.last_summarized_message_id
+    return memory
+
+
+class BackgroundSummarizer:
+    """Prepares the next memory update of a thread off the critical path
+
+    At most one update is in flight per thread. A prepared update records
+    the memory state it was built on and is discarded if the thread's memory
+    moved on before it could be used.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tinker-summary")
+        self._pending: Dict[str, Tuple[Optional[str], Future]] = {}
+        self._lock = threading.Lock()
+
+    def start(self, thread_id: str, basis_id: Optional[str], fn, *args) -> None:
+        with self._lock:
+            entry = self._pending.get(thread_id)
+            if entry is not None:
+                prepared_basis, future = entry
+                if not future.done() or (prepared_basis == basis_id and future.exception() is None):
+                    return
+                # Built on memory that has moved on (or failed): take() would never use it
+                del self._pending[thread_id]
+            # Copy the context so the summary's spans land in the thread's trace
+            self._pending[thread_id] = (
+                basis_id, self._executor.submit(contextvars.copy_context().run, fn, *args)
+            )
+
+    def take(self, thread_id: str, basis_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return the prepared memory if it is done and builds on basis_id"""
+        with self._lock:
+            entry = self._pending.get(thread_id)
+            if entry is None or not entry[1].done():
+                return None
+            del self._pending[thread_id]
+        prepared_basis, future = entry
+        if prepared_basis != basis_id or future.exception() is not None:
+            return None
+        return future.result()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ConversationMemoryHook:
+    """Pre-model hook with O(new messages) bookkeeping and flat-cost summaries
+
+    When the unsummarized history exceeds max_tokens_before_summary, its
+    oldest segment (about segment_tokens) is summarized into a level-0 chunk.
+    Once a level holds fanout summaries they are merged into one summary on
+    the level above, so every pass reads one segment (or fanout short
+    summaries) no matter how long the thread is.
+
+    Token totals, including the unsummarized part of the history, are
+    tracked incrementally in state["context"]["token_accounting"] and
+    corrected by the API's reported input tokens. From SUMMARY_PREFETCH_RATIO
+    of the threshold the next segment is summarized in the background and
+    swapped in when needed. The model receives the rendered summaries, the
+    long-term memories recalled for the task (state["recalled_memories"]) and
+    the unsummarized messages as llm_input_messages; the stored history is
+    left untouched, except that with an offloader, tool outputs older than
+    its keep_turns are replaced in place by stubs pointing into its store.
+    """
+
+    def __init__(self, model, max_tokens_before_summary: int, segment_tokens: int,
+                 chunk_summary_tokens: int, fanout: int = 4, prompt_overhead_tokens: int = 0,
+                 counter: Optional[MessageTokenCounter] = None,
+                 prefetch_ratio: float = SUMMARY_PREFETCH_RATIO,
+                 offloader: Optional[ToolOutputOffloader] = None):
+        self.model = model
+        self.max_tokens_before_summary = max_tokens_before_summary
+        self.segment_tokens = segment_tokens
+        self.chunk_summary_tokens = chunk_summary_tokens
+        self.fanout = fanout
+        # System prompt and tool schemas are part of every request but not of the history
+        self.prompt_overhead_tokens = prompt_overhead_tokens
+        self.counter = counter or MessageTokenCounter()
+        self.prefetch_tokens = int(max_tokens_before_summary * prefetch_ratio) if prefetch_ratio > 0 else None
+        self.background = BackgroundSummarizer()
+        self.offloader = offloader
+
+    def as_runnable(self) -> RunnableLambda:
+        """Runnable with sync and async paths, for create_react_agent(pre_model_hook=...)"""
+        return RunnableLambda(self.__call__, afunc=self.ainvoke, name="pre_model_hook")
+
+    def close(self) -> None:
+        self.background.close()
+
+    # -- planning --
+
+    def _load(self, state: Dict[str, Any], config: Optional[RunnableConfig]):
+        messages = state["messages"]
+        context = dict(state.get("context") or {})
+        accounting = update_accounting(messages, context.get("token_accounting"), self.counter)
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id", "main")
+        memory = context.get("memory")
+        if memory is None:
+            running_summary = context.pop("running_summary", None)
+            memory = _from_running_summary(running_summary) if running_summary else empty_memory()
+        position = memory_position(memory, messages)
+        if position is None:
+            # History was rewritten under the summaries; start over
+            memory = empty_memory()
+        else:
+            memory = {**memory, "position": position}
+        return messages, context, accounting, thread_id, memory
+
+    def _offload(self, messages: Sequence[BaseMessage], context: Dict[str, Any], accounting: Dict[str, Any],
+                 memory: Dict[str, Any]) -> Tuple[Sequence[BaseMessage], List[ToolMessage]]:
+        """Swap aged-out tool outputs for stubs; returns the new history and the stubs"""
+        if self.offloader is None:
+            return messages, []
+        progress = dict(context.get("tool_output_offload") or {})
+        stubs = self.offloader.compact(messages, progress)
+        context["tool_output_offload"] = progress
+        if not stubs:
+            return messages, []
+        self._unsummarized_tokens(messages, memory, accounting)
+        replaced = {stub.id: stub for stub in stubs}
+        saved = unsummarized_saved = 0
+        compacted = []
+        for index, message in enumerate(messages):
+            stub = replaced.get(message.id)
+            if stub is not None:
+                tokens = self.counter.count_message(message) - self.counter.count_message(stub)
+                saved += tokens
+                if index >= accounting["unsummarized_from"]:
+                    unsummarized_saved += tokens
+                message = stub
+            compacted.append(message)
+        accounting["estimated_tokens"] = accounting.get("estimated_tokens", 0) - saved
+        accounting["unsummarized_tokens"] -= unsummarized_saved
+        progress["offloaded"] = progress.get("offloaded", 0) + len(stubs)
+        return compacted, stubs
+
+    def _unsummarized_tokens(self, messages: Sequence[BaseMessage], memory: Dict[str, Any],
+                             accounting: Dict[str, Any]) -> int:
+        """Running total of the messages memory does not cover, moved along with it"""
+        return move_unsummarized_start(accounting, messages, memory_position(memory, messages), self.counter)
+
+    def _pending_tokens(self, messages: Sequence[BaseMessage], memory: Dict[str, Any],
+                        accounting: Dict[str, Any]) -> int:
+        return int(self._unsummarized_tokens(messages, memory, accounting) * accounting.get("calibration", 1.0))
+
+    def _next_segment(self, messages: Sequence[BaseMessage], memory: Dict[str, Any],
+                      accounting: Dict[str, Any]) -> Optional[List[BaseMessage]]:
+        """Oldest unsummarized messages worth about segment_tokens
+
+        The segment never ends between a tool call and its result, and the
+        newest message always stays verbatim.
+        """
+        start = memory_position(memory, messages)
+        budget = self.segment_tokens / accounting.get("calibration", 1.0)
+        tokens, end = 0, start
+        while end < len(messages) - 1 and tokens < budget:
+            tokens += self.counter.count_message(messages[end])
+            end += 1
+        while end < len(messages) - 1 and isinstance(messages[end], ToolMessage):
+            end += 1
+        # The newest messages are a tool call and its results: cut before the call instead
+        while end > start and isinstance(messages[end], ToolMessage):
+            end -= 1
+        if end <= start:
+            return None
+        return list(messages[start:end])
+
+    # -- summarization --
+
+    def _segment_prompt(self, memory: Dict[str, Any], segment: Sequence[BaseMessage]) -> str:
+        previous = memory["levels"][0][-1]["summary"] if memory["levels"] and memory["levels"][0] else "(none)"
+        return SEGMENT_PROMPT.format(
+            words=int(self.chunk_summary_tokens * WORDS_PER_TOKEN),
+            previous=previous,
+            transcript=render_transcript(segment),
+        )
+
+    def _merge_prompt(self, entries: Sequence[Dict[str, Any]]) -> str:
+        return MERGE_PROMPT.format(
+            words=int(self.chunk_summary_tokens * WORDS_PER_TOKEN),
+            summaries="\n\n".join(f"[{index + 1}] {entry['summary']}" for index, entry in enumerate(entries)),
+        )
+
+    @staticmethod
+    def _add_entry(memory: Dict[str, Any], level: int, summary: str, message_count: int) -> None:
+        while len(memory["levels"]) <= level:
+            memory["levels"].append([])
+        memory["levels"][level].append({"summary": summary, "messages": message_count})
+
+    def _full_level(self, memory: Dict[str, Any]) -> Optional[int]:
+        for level, entries in enumerate(memory["levels"]):
+            if len(entries) >= self.fanout:
+                return level
+        return None
+
+    def _merge(self, memory: Dict[str, Any], level: int, summary: str) -> None:
+        entries = memory["levels"][level]
+        memory["levels"][level] = []
+        self._add_entry(memory, level + 1, summary, sum(entry["messages"] for entry in entries))
+
+    def summarize_segment(self, memory: Dict[str, Any], segment: Sequence[BaseMessage]) -> Dict[str, Any]:
+        """Fold one segment into a copy of memory (one model call, plus merges when a level fills)"""
+        with (
+            tracing.span("memory.summarize", "memory", messages=len(segment)),
+            metrics.track(metrics.SUMMARIZATION_SECONDS, metrics.SUMMARIZATIONS),
+        ):
+            memory = copy.deepcopy(memory)
+            response = self.model.invoke(self._segment_prompt(memory, segment), max_tokens=self.chunk_summary_tokens)
+            self._add_entry(memory, 0, _text(response.content), len(segment))
+            memory["through_id"] = segment[-1].id
+            memory["position"] = memory.get("position", 0) + len(segment)
+            level = self._full_level(memory)
+            while level is not None:
+                response = self.model.invoke(
+                    self._merge_prompt(memory["levels"][level]), max_tokens=self.chunk_summary_tokens
+                )
+                self._merge(memory, level, _text(response.content))
+                level = self._full_level(memory)
+            return memory
+
+    async def asummarize_segment(self, memory: Dict[str, Any], segment: Sequence[BaseMessage]) -> Dict[str, Any]:
+        """Async version of summarize_segment"""
+        with (
+            tracing.span("memory.summarize", "memory", messages=len(segment)),
+            metrics.track(metrics.SUMMARIZATION_SECONDS, metrics.SUMMARIZATIONS),
+        ):
+            memory = copy.deepcopy(memory)
+            response = await self.model.ainvoke(
+                self._segment_prompt(memory, segment), max_tokens=self.chunk_summary_tokens
+            )
+            self._add_entry(memory, 0, _text(response.content), len(segment))
+            memory["through_id"] = segment[-1].id
+            memory["position"] = memory.get("position", 0) + len(segment)
+            level = self._full_level(memory)
+            while level is not None:
+                response = await self.model.ainvoke(
+                    self._merge_prompt(memory["levels"][level]), max_tokens=self.chunk_summary_tokens
+                )
+                self._merge(memory, level, _text(response.content))
+                level = self._full_level(memory)
+            return memory
+
+    # -- hook --
+
+    def _swap_in_prepared(self, thread_id: str, messages: Sequence[BaseMessage],
+                          memory: Dict[str, Any]) -> Dict[str, Any]:
+        prepared = self.background.take(thread_id, memory["through_id"])
+        if prepared is not None and memory_position(prepared, messages) is not None:
+            return prepared
+        return memory
+
+    def _maybe_prefetch(self, thread_id: str, messages: Sequence[BaseMessage],
+                        memory: Dict[str, Any], accounting: Dict[str, Any]) -> None:
+        if self.prefetch_tokens is None:
+            return
+        if self._pending_tokens(messages, memory, accounting) < self.prefetch_tokens:
+            return
+        segment = self._next_segment(messages, memory, accounting)
+        if segment:
+            self.background.start(thread_id, memory["through_id"], self.summarize_segment, memory, segment)
+
+    def _update(self, messages: Sequence[BaseMessage], context: Dict[str, Any],
+                accounting: Dict[str, Any], memory: Dict[str, Any],
+                stubs: Sequence[ToolMessage] = (), recalled: Sequence[str] = ()) -> Dict[str, Any]:
+        unsummarized = self._unsummarized_tokens(messages, memory, accounting)
+        llm_input = list(messages[memory_position(memory, messages):])
+        # Messages added in front of the history; they are the only ones counted here
+        added = []
+        summary = render_memory(memory)
+        if summary is not None:
+            # The conversation sent to the API has to open with a user turn
+            if llm_input and isinstance(llm_input[0], AIMessage):
+                added.append(HumanMessage(content=CONTINUE_FROM_SUMMARY))
+        recalled_message = render_recalled_memories(recalled)
+        for system_message in (recalled_message, summary):
+            if system_message is not None:
+                added.insert(0, system_message)
+        llm_input[:0] = added
+        accounting["last_prompt_estimate"] = unsummarized + self.counter(added) + self.prompt_overhead_tokens
+        context["token_accounting"] = accounting
+        context["memory"] = memory
+        update = {"llm_input_messages": llm_input, "context": context}
+        if stubs:
+            # Same IDs, so add_messages overwrites the full outputs in the stored history
+            update["messages"] = list(stubs)
+        return update
+
+    def __call__(self, state: Dict[str, Any], config: RunnableConfig = None) -> Dict[str, Any]:
+        with tracing.span("memory.pre_model_hook", "memory", messages=len(state["messages"])) as hook_span:
+            messages, context, accounting, thread_id, memory = self._load(state, config)
+            messages, stubs = self._offload(messages, context, accounting, memory)
+            if self._pending_tokens(messages, memory, accounting) > self.max_tokens_before_summary:
+                memory = self._swap_in_prepared(thread_id, messages, memory)
+            # Summarize inline only when no prepared update brought the history under the threshold
+            while self._pending_tokens(messages, memory, accounting) > self.max_tokens_before_summary:
+                segment = self._next_segment(messages, memory, accounting)
+                if not segment:
+                    break
+                memory = self.summarize_segment(memory, segment)
+                hook_span.count("segments", 1)
+            self._maybe_prefetch(thread_id, messages, memory, accounting)
+            return self._update(messages, context, accounting, memory, stubs, state.get("recalled_memories") or ())
+
+    async def ainvoke(self, state: Dict[str, Any], config: RunnableConfig = None) -> Dict[str, Any]:
+        with tracing.span("memory.pre_model_hook", "memory", messages=len(state["messages"])) as hook_span:
+            messages, context, accounting, thread_id, memory = self._load(state, config)
+            messages, stubs = self._offload(messages, context, accounting, memory)
+            if self._pending_tokens(messages, memory, accounting) > self.max_tokens_before_summary:
+                memory = self._swap_in_prepared(thread_id, messages, memory)
+            while self._pending_tokens(messages, memory, accounting) > self.max_tokens_before_summary:
+                segment = self._next_segment(messages, memory, accounting)
+                if not segment:
+                    break
+                memory = await self.asummarize_segment(memory, segment)
+                hook_span.count("segments", 1)
+            self._maybe_prefetch(thread_id, messages, memory, accounting)
+            return self._update(messages, context, accounting, memory, stubs, state.get("recalled_memories") or ())
@@ -0,0 +1,316 @@
+"""
+Tinker Docker Engine API Client
+Minimal HTTP client for the Docker Engine API over the local Unix socket
+"""
+
+import asyncio
+import http.client
+import json
+import os
+import socket
+import struct
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+DEFAULT_SOCKET_PATHS = [
+    "/var/run/docker.sock",
+    os.path.expanduser("~/.docker/run/docker.sock"),  # Docker Desktop on macOS
+]
+
+STDOUT = 1
+STDERR = 2
+
+
+class DockerAPIError(Exception):
+    """Raised when the Docker Engine API returns an error response"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Docker API error {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that connects to a Unix domain socket"""
+
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def find_socket_path() -> Optional[str]:
+    """Locate the Docker Engine socket, honouring DOCKER_HOST=unix://..."""
+    docker_host = os.getenv("DOCKER_HOST", "")
+    if docker_host:
+        if docker_host.startswith("unix://"):
+            path = docker_host[len("unix://"):]
+            return path if os.path.exists(path) else None
+        # TCP/SSH hosts are left to the docker CLI
+        return None
+    for path in DEFAULT_SOCKET_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_exactly(read, size: int) -> bytes:
+    """Read exactly size bytes (fewer only at end of stream)"""
+    data = b""
+    while len(data) < size:
+        chunk = read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def iter_multiplexed(read) -> Iterator[Tuple[int, bytes]]:
+    """Demultiplex a Docker attach/exec stream into (stream, payload) frames
+
+    Each frame starts with an 8-byte header: stream type (1=stdout,
+    2=stderr), three padding bytes and a big-endian payload length.
+    Empty frames are legal and skipped; a payload cut short ends the stream.
+    """
+    while True:
+        header = read_exactly(read, 8)
+        if len(header) < 8:
+            return
+        stream_type, length = struct.unpack(">BxxxL", header)
+        if length == 0:
+            continue
+        payload = read_exactly(read, length)
+        if payload:
+            yield stream_type, payload
+        if len(payload) < length:
+            return
+
+
+class DockerAPIClient:
+    """Docker Engine API client with a persistent keep-alive connection
+
+    Control requests (inspect, exec create/inspect) share one connection.
+    Exec output streams take over their connection, so each exec start
+    opens a short-lived socket of its own.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = 30.0):
+        self.socket_path = socket_path or find_socket_path()
+        if not self.socket_path:
+            raise DockerAPIError(0, "Docker socket not found")
+        self.timeout = timeout
+        self._conn: Optional[UnixHTTPConnection] = None
+        self._lock = threading.Lock()
+
+    def _request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Tuple[int, bytes]:
+        """Send a request on the shared connection, reconnecting once if it went stale"""
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        with self._lock:
+            for attempt in range(2):
+                if self._conn is None:
+                    self._conn = UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+                try:
+                    self._conn.request(method, path, body=payload, headers=headers)
+                    response = self._conn.getresponse()
+                    return response.status, response.read()
+                except (http.client.HTTPException, ConnectionError, BrokenPipeError):
+                    self._conn.close()
+                    self._conn = None
+                    if attempt:
+                        raise
+
+    def _json(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Any:
+        status, data = self._request(method, path, body)
+        if status >= 400:
+            raise DockerAPIError(status, self._error_message(data))
+        return json.loads(data) if data else None
+
+    @staticmethod
+    def _error_message(data: bytes) -> str:
+        try:
+            return json.loads(data).get("message", "")
+        except ValueError:
+            return data.decode(errors="replace")
+
+    def ping(self) -> bool:
+        """Check that the Engine API is reachable"""
+        try:
+            status, _ = self._request("GET", "/_ping")
+            return status == 200
+        except OSError:
+            return False
+
+    def inspect_container(self, name: str) -> Optional[Dict[str, Any]]:
+        """Inspect a container, returning None if it does not exist"""
+        try:
+            return self._json("GET", f"/containers/{quote(name)}/json")
+        except DockerAPIError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def exec_create(self, container: str, cmd: List[str], workdir: Optional[str] = None,
+                    env: Optional[List[str]] = None) -> str:
+        """Create an exec instance and return its ID"""
+        body: Dict[str, Any] = {
+            "Cmd": cmd,
+            "AttachStdout": True,
+            "AttachStderr": True,
+            "Tty": False,
+        }
+        if workdir:
+            body["WorkingDir"] = workdir
+        if env:
+            body["Env"] = env
+        return self._json("POST", f"/containers/{quote(container)}/exec", body)["Id"]
+
+    def exec_start(self, exec_id: str, timeout: Optional[float] = None) -> Iterator[Tuple[int, bytes]]:
+        """Start an exec instance and yield its demultiplexed output frames"""
+        conn = UnixHTTPConnection(self.socket_path, timeout=timeout)
+        try:
+            conn.request(
+                "POST", f"/exec/{exec_id}/start",
+                body=json.dumps({"Detach": False, "Tty": False}).encode(),
+                headers={"Content-Type": "application/json"},
+            )
+            response = conn.getresponse()
+            if response.status >= 400:
+                raise DockerAPIError(response.status, self._error_message(response.read()))
+            # A 101 upgrade leaves the raw stream on the underlying file object
+            read = response.fp.read if response.status == 101 else response.read
+            yield from iter_multiplexed(read)
+        finally:
+            conn.close()
+
+    def exec_inspect(self, exec_id: str) -> Dict[str, Any]:
+        """Inspect an exec instance (exit code, running state, pid)"""
+        return self._json("GET", f"/exec/{exec_id}/json")
+
+    def exec_run(self, container: str, cmd: List[str], workdir: Optional[str] = None) -> Tuple[int, bytes, bytes]:
+        """Run a command to completion and return (exit_code, stdout, stderr)"""
+        exec_id = self.exec_create(container, cmd, workdir=workdir)
+        stdout, stderr = bytearray(), bytearray()
+        for stream_type, payload in self.exec_start(exec_id):
+            if stream_type == STDERR:
+                stderr += payload
+            else:
+                stdout += payload
+        exit_code = self.exec_inspect(exec_id).get("ExitCode")
+        return (exit_code if exit_code is not None else -1), bytes(stdout), bytes(stderr)
+
+    def close(self) -> None:
+        """Close the shared connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class AsyncDockerAPIClient:
+    """asyncio Docker Engine API client for the exec endpoints
+
+    Each request uses its own short-lived Unix socket connection, which is
+    cheap locally and lets many exec streams run concurrently on one loop.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None):
+        self.socket_path = socket_path or find_socket_path()
+        if not self.socket_path:
+            raise DockerAPIError(0, "Docker socket not found")
+
+    async def _open(self, method: str, path: str, body: Optional[Dict[str, Any]] = None):
+        """Send a request and return (status, headers, reader, writer)"""
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        payload = json.dumps(body).encode() if body is not None else b""
+        request = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: localhost\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n"
+        ).encode() + payload
+        writer.write(request)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        status = int(status_line.split()[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers, reader, writer
+
+    @staticmethod
+    async def _read_body(headers: Dict[str, str], reader) -> bytes:
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int((await reader.readline()).strip() or b"0", 16)
+                if size == 0:
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()
+            return body
+        if "content-length" in headers:
+            return await reader.readexactly(int(headers["content-length"]))
+        return await reader.read()
+
+    async def _json(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Any:
+        status, headers, reader, writer = await self._open(method, path, body)
+        try:
+            data = await self._read_body(headers, reader)
+        finally:
+            writer.close()
+        if status >= 400:
+            raise DockerAPIError(status, DockerAPIClient._error_message(data))
+        return json.loads(data) if data else None
+
+    async def exec_create(self, container: str, cmd: List[str], workdir: Optional[str] = None) -> str:
+        """Create an exec instance and return its ID"""
+        body: Dict[str, Any] = {"Cmd": cmd, "AttachStdout": True, "AttachStderr": True, "Tty": False}
+        if workdir:
+            body["WorkingDir"] = workdir
+        result = await self._json("POST", f"/containers/{quote(container)}/exec", body)
+        return result["Id"]
+
+    async def exec_start(self, exec_id: str) -> AsyncIterator[Tuple[int, bytes]]:
+        """Start an exec instance and yield its demultiplexed output frames"""
+        status, headers, reader, writer = await self._open(
+            "POST", f"/exec/{exec_id}/start", {"Detach": False, "Tty": False}
+        )
+        try:
+            if status >= 400:
+                data = await self._read_body(headers, reader)
+                raise DockerAPIError(status, DockerAPIClient._error_message(data))
+            while True:
+                try:
+                    header = await reader.readexactly(8)
+                except asyncio.IncompleteReadError:
+                    return
+                stream_type, length = struct.unpack(">BxxxL", header)
+                if length == 0:
+                    continue
+                try:
+                    payload = await reader.readexactly(length)
+                except asyncio.IncompleteReadError as e:
+                    # Stream cut short: keep what arrived of the last frame
+                    if e.partial:
+                        yield stream_type, e.partial
+                    return
+                yield stream_type, payload
+        finally:
+            writer.close()
+
+    async def exec_inspect(self, exec_id: str) -> Dict[str, Any]:
+        """Inspect an exec instance (exit code, running state, pid)"""
+        return await self._json("GET", f"/exec/{exec_id}/json")
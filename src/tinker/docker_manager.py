@@ -1,12 +1,30 @@
+import asyncio
 import os
+import queue
+import socket
 import subprocess
 import sys
+import threading
 import time
 
+from . import metrics
+from . import tracing
+from .command_output import CommandResult, OutputRingBuffer
+from .constants import COMMAND_KILL_GRACE
+from .docker_api import STDERR, AsyncDockerAPIClient, DockerAPIClient, DockerAPIError
+
 CONTAINER_NAME = "tinker_sandbox"
 TINKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../.tinker'))
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
 
+# Backend for container checks and exec: "auto" (Engine API socket when
+# available, else CLI), "api" or "cli"
+DOCKER_BACKEND = os.getenv("TINKER_DOCKER_BACKEND", "auto")
+
+_api_client = None
+_async_api_client = None
+_api_unavailable = False
+
 
 def ensure_tinker_dir():
     os.makedirs(TINKER_DIR, exist_ok=True)
@@ -15,32 +33,75 @@ def ensure_tinker_dir():
     os.makedirs(workspace_dir, exist_ok=True)
 
 
-def container_exists():
+def get_api_client():
+    """Get the shared Engine API client, or None when the CLI backend should be used"""
+    global _api_client, _api_unavailable
+    if DOCKER_BACKEND == "cli" or _api_unavailable:
+        return None
+    if _api_client is None:
+        try:
+            client = DockerAPIClient()
+            if not client.ping():
+                raise DockerAPIError(0, "Docker Engine API is not responding")
+            _api_client = client
+        except (DockerAPIError, OSError):
+            if DOCKER_BACKEND == "api":
+                raise
+            _api_unavailable = True
+            return None
+    return _api_client
+
+
+def get_async_api_client():
+    """Async counterpart of get_api_client (availability is probed once, synchronously)"""
+    global _async_api_client
+    if get_api_client() is None:
+        return None
+    if _async_api_client is None:
+        _async_api_client = AsyncDockerAPIClient(_api_client.socket_path)
+    return _async_api_client
+
+
+def _container_state():
+    """Return 'missing', 'running' or 'stopped' for the sandbox container"""
+    client = get_api_client()
+    if client is not None:
+        info = client.inspect_container(CONTAINER_NAME)
+        if info is None:
+            return "missing"
+        return "running" if info.get("State", {}).get("Running") else "stopped"
+    
     result = subprocess.run([
-        "docker", "ps", "-a", "--filter", f"name={CONTAINER_NAME}", "--format", "{{.Names}}"
+        "docker", "ps", "-a", "--filter", f"name={CONTAINER_NAME}", "--format", "{{.Names}}\t{{.State}}"
     ], capture_output=True, text=True)
-    return CONTAINER_NAME in result.stdout.strip().splitlines()
+    for line in result.stdout.strip().splitlines():
+        name, _, state = line.partition("\t")
+        if name == CONTAINER_NAME:
+            return "running" if state == "running" else "stopped"
+    return "missing"
+
+
+def container_exists():
+    return _container_state() != "missing"
 
 
 def container_running():
-    result = subprocess.run([
-        "docker", "ps", "--filter", f"name={CONTAINER_NAME}", "--format", "{{.Names}}"
-    ], capture_output=True, text=True)
-    return CONTAINER_NAME in result.stdout.strip().splitlines()
+    return _container_state() == "running"
 
 
 def start_container():
     ensure_tinker_dir()
     
     container_was_created = False
+    state = _container_state()
     
     # Use docker-compose to start the container
-    if not container_exists():
+    if state == "missing":
         subprocess.run([
             "docker", "compose", "up", "-d"
         ], cwd=PROJECT_ROOT, check=True)
         container_was_created = True
-    elif not container_running():
+    elif state != "running":
         subprocess.run([
             "docker", "compose", "start"
         ], cwd=PROJECT_ROOT, check=True)
@@ -56,9 +117,235 @@ def start_container():
 
 def exec_in_container(cmd):
     full_cmd = ["docker", "exec", CONTAINER_NAME] + cmd
+    client = get_api_client()
+    if client is not None:
+        exit_code, stdout, stderr = client.exec_run(CONTAINER_NAME, cmd)
+        return subprocess.CompletedProcess(
+            full_cmd, exit_code, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+        )
     return subprocess.run(full_cmd, capture_output=True, text=True)
 
 
+def read_pipe_chunks(name, stream, output):
+    """Forward raw chunks from a pipe into a queue, ending with (name, None)"""
+    try:
+        while True:
+            data = os.read(stream.fileno(), 65536)
+            if not data:
+                break
+            output.put((name, data))
+    except (OSError, ValueError):
+        pass
+    output.put((name, None))
+
+
+def with_timeout(cmd, timeout):
+    """Wrap cmd in coreutils timeout, which kills the command's whole process group"""
+    if not timeout:
+        return cmd
+    return ["timeout", "-k", str(COMMAND_KILL_GRACE), str(timeout)] + cmd
+
+
+def backstop_timeout(timeout):
+    """Host-side limit used in case the in-container timeout never returns"""
+    return timeout + COMMAND_KILL_GRACE + 5
+
+
+class ExecStream:
+    """Iterates over ("stdout"|"stderr", chunk) pairs of a running container command
+    
+    With a timeout, the command runs under coreutils `timeout`, which leads
+    its own process group and signals the whole group (SIGTERM, then SIGKILL
+    after COMMAND_KILL_GRACE). A host-side deadline slightly later abandons
+    the exec if the container does not respond. `returncode` and
+    `timed_out` are set once iteration finishes.
+    """
+    
+    def __init__(self, cmd, timeout=None):
+        self.cmd = cmd
+        self.timeout = timeout
+        self.returncode = None
+        self.timed_out = False
+    
+    def __iter__(self):
+        cmd = with_timeout(self.cmd, self.timeout)
+        deadline = time.monotonic() + backstop_timeout(self.timeout) if self.timeout else None
+        started = time.monotonic()
+        
+        client = get_api_client()
+        if client is not None:
+            yield from self._iter_api(client, cmd, deadline)
+        else:
+            yield from self._iter_cli(cmd, deadline)
+        
+        if (self.timeout and self.returncode in (124, 137)
+                and time.monotonic() - started >= self.timeout):
+            self.timed_out = True
+    
+    def _iter_api(self, client, cmd, deadline):
+        exec_id = client.exec_create(CONTAINER_NAME, cmd)
+        remaining = deadline - time.monotonic() if deadline else None
+        try:
+            for stream_type, payload in client.exec_start(exec_id, timeout=remaining):
+                yield ("stderr" if stream_type == STDERR else "stdout"), payload
+                if deadline and time.monotonic() > deadline:
+                    raise socket.timeout()
+        except socket.timeout:
+            self.returncode = -1
+            self.timed_out = True
+            return
+        exit_code = client.exec_inspect(exec_id).get("ExitCode")
+        self.returncode = exit_code if exit_code is not None else -1
+    
+    def _iter_cli(self, cmd, deadline):
+        process = subprocess.Popen(
+            ["docker", "exec", CONTAINER_NAME] + cmd,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0
+        )
+        output = queue.Queue()
+        for name, stream in (("stdout", process.stdout), ("stderr", process.stderr)):
+            threading.Thread(target=read_pipe_chunks, args=(name, stream, output), daemon=True).start()
+        
+        open_streams = 2
+        try:
+            while open_streams:
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty()
+                name, data = output.get(timeout=remaining)
+                if data is None:
+                    open_streams -= 1
+                    continue
+                yield name, data
+        except queue.Empty:
+            self.timed_out = True
+        finally:
+            # Also reached when the consumer stops iterating early
+            if open_streams and process.poll() is None:
+                process.kill()
+        returncode = process.wait()
+        self.returncode = -1 if self.timed_out else returncode
+
+
+def stream_exec_in_container(cmd, timeout=None):
+    """Run a command in the container, yielding output chunks as they arrive"""
+    return ExecStream(cmd, timeout=timeout)
+
+
+def run_in_container(cmd, timeout=None, on_output=None):
+    """Run a command with bounded output capture and an optional wall-clock timeout
+    
+    on_output, if given, is called with (stream_name, chunk) for every chunk.
+    """
+    with tracing.span("docker.exec", "exec", command=cmd[-1][:200]) as span:
+        started = time.monotonic()
+        buffers = {"stdout": OutputRingBuffer(), "stderr": OutputRingBuffer()}
+        try:
+            stream = stream_exec_in_container(cmd, timeout=timeout)
+            for name, data in stream:
+                buffers[name].write(data)
+                if on_output:
+                    on_output(name, data)
+        except Exception:
+            metrics.CONTAINER_EXEC_FAILURES.inc(mode="exec", reason="error")
+            raise
+        result = CommandResult(
+            ["docker", "exec", CONTAINER_NAME] + cmd, stream.returncode,
+            buffers["stdout"], buffers["stderr"],
+            timed_out=stream.timed_out, duration=time.monotonic() - started
+        )
+        observe_command_result(span, result, "exec")
+        return result
+
+
+def observe_command_result(span, result: CommandResult, mode: str) -> None:
+    """Record a finished command on its span and in the container metrics
+
+    mode is "exec" for one-shot execs and "session" for persistent shells.
+    """
+    span.set(
+        returncode=result.returncode, timed_out=result.timed_out,
+        bytes=result.stdout_buffer.total_bytes + result.stderr_buffer.total_bytes
+    )
+    if result.duration is not None:
+        metrics.CONTAINER_EXEC_SECONDS.observe(result.duration, mode=mode)
+    if result.timed_out:
+        metrics.CONTAINER_EXEC_FAILURES.inc(mode=mode, reason="timeout")
+    elif result.returncode != 0:
+        metrics.CONTAINER_EXEC_FAILURES.inc(mode=mode, reason="nonzero_exit")
+
+
+async def async_run_in_container(cmd, timeout=None, on_output=None):
+    """asyncio version of run_in_container, using the Engine API socket or an async subprocess"""
+    with tracing.span("docker.exec", "exec", command=cmd[-1][:200]) as span:
+        try:
+            result = await _async_exec(cmd, timeout, on_output)
+        except Exception:
+            metrics.CONTAINER_EXEC_FAILURES.inc(mode="exec", reason="error")
+            raise
+        observe_command_result(span, result, "exec")
+        return result
+
+
+async def _async_exec(cmd, timeout, on_output):
+    started = time.monotonic()
+    wrapped = with_timeout(cmd, timeout)
+    buffers = {"stdout": OutputRingBuffer(), "stderr": OutputRingBuffer()}
+    returncode = -1
+    
+    def handle(name, data):
+        buffers[name].write(data)
+        if on_output:
+            on_output(name, data)
+    
+    async def consume():
+        nonlocal returncode
+        client = get_async_api_client()
+        if client is not None:
+            exec_id = await client.exec_create(CONTAINER_NAME, wrapped)
+            async for stream_type, payload in client.exec_start(exec_id):
+                handle("stderr" if stream_type == STDERR else "stdout", payload)
+            exit_code = (await client.exec_inspect(exec_id)).get("ExitCode")
+            returncode = exit_code if exit_code is not None else -1
+            return
+        
+        process = await asyncio.create_subprocess_exec(
+            "docker", "exec", CONTAINER_NAME, *wrapped,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        
+        async def pump(name, stream):
+            while True:
+                data = await stream.read(65536)
+                if not data:
+                    break
+                handle(name, data)
+        
+        try:
+            await asyncio.gather(pump("stdout", process.stdout), pump("stderr", process.stderr))
+            returncode = await process.wait()
+        finally:
+            # Cancelled by the backstop timeout
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+    
+    timed_out = False
+    try:
+        await asyncio.wait_for(consume(), backstop_timeout(timeout) if timeout else None)
+    except asyncio.TimeoutError:
+        timed_out = True
+        returncode = -1
+    if timeout and returncode in (124, 137) and time.monotonic() - started >= timeout:
+        timed_out = True
+    
+    return CommandResult(
+        ["docker", "exec", CONTAINER_NAME] + cmd, returncode,
+        buffers["stdout"], buffers["stderr"],
+        timed_out=timed_out, duration=time.monotonic() - started
+    )
+
+
 def stop_container():
     if container_running():
         subprocess.run([
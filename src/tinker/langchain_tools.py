@@ -3,32 +3,62 @@ LangChain Tool Definitions for Tinker
 Converts existing tools to LangChain format for use with create_react_agent
 """
 
-from langchain_core.tools import tool
-from typing import Dict, Any
+import asyncio
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
+from typing import Dict, Any, Optional
 from .anthropic_tools_manager import AnthropicToolsManager
+from .command_classifier import shell_call_parallel_safe
+from .constants import DEFAULT_COMMAND_TIMEOUT
 from .email_manager import send_email_from_task
+from .tool_output_store import DEFAULT_RECALL_LINES, ToolOutputStore, recall_tool_output as _recall
 
 
-@tool
-def execute_shell_command(command: str, reason: str = "") -> Dict[str, Any]:
+def _thread_id(config: RunnableConfig) -> str:
+    return (config or {}).get("configurable", {}).get("thread_id", "main")
+
+
+def _execute_shell_command(command: str, reason: str = "", timeout: int = DEFAULT_COMMAND_TIMEOUT,
+                           parallel_safe: Optional[bool] = None,
+                           config: RunnableConfig = None) -> Dict[str, Any]:
     """Execute a shell command in the Docker environment.
     
+    Commands in the same conversation share one shell, so the working
+    directory and exported variables persist between calls.
+    
     Args:
         command: The shell command to execute (e.g., 'ls -la', 'git status')
         reason: Brief explanation of why this command is needed
+        timeout: Wall-clock limit in seconds; the command is killed if it runs longer
+        parallel_safe: Override read-only detection. True if the command changes no
+            files or shell state and may run concurrently with other calls in the
+            same turn; False to force ordered execution
     
     Returns:
         Dictionary with command result, stdout, stderr, and success status
     """
-    tools_manager = AnthropicToolsManager()
+    tools_manager = AnthropicToolsManager(thread_id=_thread_id(config))
     return tools_manager.execute_tool("execute_shell_command", {
         "command": command,
-        "reason": reason
+        "reason": reason,
+        "timeout": timeout,
+        "parallel_safe": parallel_safe
+    })
+
+
+async def _aexecute_shell_command(command: str, reason: str = "", timeout: int = DEFAULT_COMMAND_TIMEOUT,
+                                  parallel_safe: Optional[bool] = None,
+                                  config: RunnableConfig = None) -> Dict[str, Any]:
+    tools_manager = AnthropicToolsManager(thread_id=_thread_id(config))
+    return await tools_manager.aexecute_tool("execute_shell_command", {
+        "command": command,
+        "reason": reason,
+        "timeout": timeout,
+        "parallel_safe": parallel_safe
     })
 
 
-@tool 
-def send_email(to_email: str, subject: str, body: str) -> Dict[str, Any]:
+def _send_email(to_email: str, subject: str, body: str) -> Dict[str, Any]:
     """Send an email notification.
     
     Args:
@@ -54,8 +84,58 @@ def send_email(to_email: str, subject: str, body: str) -> Dict[str, Any]:
         }
 
 
+async def _asend_email(to_email: str, subject: str, body: str) -> Dict[str, Any]:
+    # smtplib is blocking; keep it off the event loop
+    return await asyncio.to_thread(_send_email, to_email, subject, body)
+
+
+def _recall_tool_output(blob_id: str, line_range: str = f"1-{DEFAULT_RECALL_LINES}") -> Dict[str, Any]:
+    """Read back the exact output of an earlier tool call that was moved out of the conversation.
+    
+    Older tool results are replaced by a stub naming a blob ID. Use this to see
+    the full output again, a range of lines at a time.
+    
+    Args:
+        blob_id: The blob ID given in the stub
+        line_range: Lines to return as 'start-end' (1-based, inclusive), e.g. '200-400'
+    
+    Returns:
+        Dictionary with the requested lines, the total line count and the next range to read
+    """
+    return _recall(ToolOutputStore(), blob_id, line_range)
+
+
+async def _arecall_tool_output(blob_id: str, line_range: str = f"1-{DEFAULT_RECALL_LINES}") -> Dict[str, Any]:
+    return await asyncio.to_thread(_recall_tool_output, blob_id, line_range)
+
+
+# Each tool has a sync implementation (agent.invoke/stream) and an async one
+# (agent.ainvoke/astream) so the async engine never blocks its event loop.
+# metadata["parallel_safe"] tells ParallelToolNode which calls may overlap.
+execute_shell_command = StructuredTool.from_function(
+    func=_execute_shell_command,
+    coroutine=_aexecute_shell_command,
+    name="execute_shell_command",
+    metadata={"parallel_safe": shell_call_parallel_safe}
+)
+
+send_email = StructuredTool.from_function(
+    func=_send_email,
+    coroutine=_asend_email,
+    name="send_email"
+)
+
+recall_tool_output = StructuredTool.from_function(
+    func=_recall_tool_output,
+    coroutine=_arecall_tool_output,
+    name="recall_tool_output",
+    metadata={"parallel_safe": True}
+)
+
+
 # List of all available tools
 AVAILABLE_TOOLS = [
     execute_shell_command,
-    send_email
+    send_email,
+    recall_tool_output
 ]
\ No newline at end of file
@@ -0,0 +1,372 @@
+"""
+Tinker Long-Term Memory
+Facts and task outcomes kept across sessions: extracted after each task,
+embedded with a local hashing TF-IDF vectorizer, stored in a memory-mapped
+matrix and recalled by a single matrix-vector product before the next task
+"""
+
+import contextvars
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.messages import AIMessage, BaseMessage
+
+from . import tracing
+from .constants import LONG_TERM_MEMORY_DIR, MEMORY_MIN_SCORE, MEMORY_TOP_K, MEMORY_VECTOR_DIM
+from .conversation_memory import _clip, _text, render_transcript
+
+MEMORY_TABLE = "long_term_memories"
+
+EXTRACT_PROMPT = """You maintain the long-term memory of an AI agent that runs shell commands in a Docker container.
+From the finished task below, extract at most {limit} durable facts worth knowing in future sessions:
+facts about the projects and environment (paths, tools, commands that work, configuration), user
+preferences, and errors together with their fixes. Skip anything that only mattered for this run.
+Write one self-contained fact per line, starting with "- ". Write "- none" if nothing is worth keeping.
+
+Task:
+{transcript}"""
+
+# Facts extracted per task, and the tokens the extraction may use
+MAX_FACTS_PER_TASK = 5
+EXTRACT_MAX_TOKENS = 512
+# Characters of the task and final answer kept in an outcome memory
+OUTCOME_CHARS = 300
+# A new memory this similar to an existing one is not stored again
+DUPLICATE_SCORE = 0.92
+# Rows stored together, column by column, in the vector file
+BLOCK_ROWS = 1024
+# Rows the vector file starts with (doubling from here)
+INITIAL_CAPACITY = BLOCK_ROWS
+
+_WORD = re.compile(r"[a-z0-9_]+")
+# Paths, file names and dotted/dashed identifiers, kept whole as extra features
+_COMPOUND = re.compile(r"[a-z0-9_]+(?:[./\-:][a-z0-9_]+)+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its me my of on or our "
+    "should so that the their then there this to was we what when where which who why will with "
+    "you your".split()
+)
+_SUFFIXES = ("ing", "ies", "ied", "es", "ed", "s")
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping so 'tests', 'testing' and 'tested' share a feature"""
+    for suffix in _SUFFIXES:
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)] + ("y" if suffix in ("ies", "ied") else "")
+    return word
+
+
+def _features(text: str) -> List[str]:
+    """Stemmed words without stopwords, plus whole paths and identifiers"""
+    text = text.lower()
+    words = [_stem(word) for word in _WORD.findall(text) if len(word) > 1 and word not in _STOPWORDS]
+    return words + _COMPOUND.findall(text)
+
+
+class HashingVectorizer:
+    """Sublinear term frequencies hashed into a fixed number of signed buckets
+
+    crc32 keeps bucket assignment stable across processes (unlike hash()),
+    so vectors written by one run stay comparable with queries of the next.
+    """
+
+    def __init__(self, dim: int = MEMORY_VECTOR_DIM):
+        self.dim = dim
+
+    def term_vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in Counter(_features(text)).items():
+            digest = zlib.crc32(feature.encode("utf-8"))
+            sign = -1.0 if digest & 0x80000000 else 1.0
+            vector[digest % self.dim] += sign * (1.0 + math.log(count))
+        return vector
+
+    def transform(self, text: str, idf: Optional[np.ndarray] = None) -> np.ndarray:
+        """L2-normalized vector; with idf, weighted for querying"""
+        vector = self.term_vector(text)
+        if idf is not None:
+            # Documents are stored unweighted, so the query carries idf twice:
+            # q·idf² ·d equals (q·idf)·(d·idf) without re-embedding on every add
+            vector *= idf * idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class VectorMatrix:
+    """float32 vectors, one row per memory, in a memory-mapped file of column blocks
+
+    Rows are grouped in blocks of BLOCK_ROWS, and each block stores its
+    vectors column by column (dim x BLOCK_ROWS). Hashed TF-IDF vectors are
+    sparse, so scoring a query only reads the columns of its nonzero
+    buckets: 4 bytes per memory per query bucket instead of the whole row.
+    The file grows by whole blocks (doubling), which never moves existing
+    rows. Another process appending to the same file is picked up by
+    remapping when a row beyond the current mapping is used.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self.block_bytes = dim * BLOCK_ROWS * np.dtype(np.float32).itemsize
+        self.blocks: Optional[np.memmap] = None
+        if not os.path.exists(path):
+            open(path, "wb").close()
+
+    @property
+    def capacity(self) -> int:
+        return os.path.getsize(self.path) // self.block_bytes * BLOCK_ROWS
+
+    def _map(self, rows: int) -> np.ndarray:
+        """The mapping as (blocks, dim, BLOCK_ROWS), covering at least rows rows"""
+        if self.blocks is not None and self.blocks.shape[0] * BLOCK_ROWS >= rows:
+            return self.blocks
+        capacity = self.capacity
+        if capacity < rows:
+            capacity = max(INITIAL_CAPACITY, capacity)
+            while capacity < rows:
+                capacity *= 2
+            with open(self.path, "r+b") as f:
+                f.truncate(capacity // BLOCK_ROWS * self.block_bytes)
+        self.blocks = None
+        self.blocks = np.memmap(self.path, dtype=np.float32, mode="r+",
+                                shape=(capacity // BLOCK_ROWS, self.dim, BLOCK_ROWS))
+        return self.blocks
+
+    def get(self, row: int) -> np.ndarray:
+        return np.array(self._map(row + 1)[row // BLOCK_ROWS, :, row % BLOCK_ROWS])
+
+    def set(self, row: int, vector: np.ndarray) -> None:
+        self._map(row + 1)[row // BLOCK_ROWS, :, row % BLOCK_ROWS] = vector
+
+    def column_blocks(self, start: int, end: int) -> Iterator[np.ndarray]:
+        """Rows [start, end) as (dim, rows) views, one per block they span"""
+        blocks = self._map(end)
+        while start < end:
+            block, offset = divmod(start, BLOCK_ROWS)
+            stop = min(end - block * BLOCK_ROWS, BLOCK_ROWS)
+            yield blocks[block, :, offset:stop]
+            start = block * BLOCK_ROWS + stop
+
+    def scores(self, vector: np.ndarray, count: int) -> np.ndarray:
+        """Dot products of vector with the first count rows"""
+        columns = np.flatnonzero(vector)
+        if count == 0 or not columns.size:
+            return np.zeros(count, dtype=np.float32)
+        used = self._map(count)[:-(-count // BLOCK_ROWS)]
+        return np.matmul(vector[columns], used[:, columns, :]).reshape(-1)[:count]
+
+    def flush(self) -> None:
+        if self.blocks is not None:
+            self.blocks.flush()
+
+
+class LongTermMemory:
+    """Cross-session memory: extraction, storage and top-k retrieval
+
+    Texts and metadata live in the long_term_memories table of the
+    conversations database (row = row of the vector matrix); vectors live in
+    <directory>/vectors-<dim>-blocks.f32. Retrieval scores every memory with
+    one product over the query's nonzero columns and picks the top k with
+    argpartition, so it reads 4 bytes per memory per query bucket.
+    """
+
+    def __init__(self, db_path: str, model=None, directory: str = LONG_TERM_MEMORY_DIR,
+                 dim: int = MEMORY_VECTOR_DIM):
+        os.makedirs(directory, exist_ok=True)
+        self.model = model
+        self.vectorizer = HashingVectorizer(dim)
+        self.vectors = VectorMatrix(os.path.join(directory, f"vectors-{dim}-blocks.f32"), dim)
+        # Row-major file of earlier versions; reindex() below rebuilds it as blocks
+        legacy = os.path.join(directory, f"vectors-{dim}.f32")
+        if os.path.exists(legacy):
+            os.remove(legacy)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Per-bucket document frequencies and the number of non-deleted
+        # memories, for rows [0, _df_rows)
+        self._df = np.zeros(dim, dtype=np.int64)
+        self._df_docs = 0
+        self._df_rows = 0
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {MEMORY_TABLE} (
+                    row INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    thread_id TEXT,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+        if self._row_count() > self.vectors.capacity:
+            # Vector file missing or created with another dimension
+            self.reindex()
+
+    # -- storage --
+
+    def _row_count(self) -> int:
+        return self.conn.execute(f"SELECT COALESCE(MAX(row), -1) + 1 FROM {MEMORY_TABLE}").fetchone()[0]
+
+    def _idf(self, count: int) -> np.ndarray:
+        if count > self._df_rows:
+            for columns in self.vectors.column_blocks(self._df_rows, count):
+                nonzero = columns != 0
+                self._df += np.count_nonzero(nonzero, axis=1)
+                # Deleted memories are all-zero rows
+                self._df_docs += int(np.count_nonzero(nonzero.any(axis=0)))
+            self._df_rows = count
+        return (np.log((1.0 + self._df_docs) / (1.0 + self._df)) + 1.0).astype(np.float32)
+
+    def add(self, text: str, kind: str = "fact", thread_id: Optional[str] = None) -> Optional[int]:
+        """Store a memory; returns its row, or None if a near-duplicate exists"""
+        text = text.strip()
+        vector = self.vectorizer.transform(text)
+        if not text or not vector.any():
+            return None
+        with self._lock:
+            count = self._row_count()
+            if count and float(np.max(self.vectors.scores(vector, count))) >= DUPLICATE_SCORE:
+                return None
+            with self.conn:
+                row = self.conn.execute(
+                    f"INSERT INTO {MEMORY_TABLE} (row, kind, text, thread_id, created_at) "
+                    f"VALUES ((SELECT COALESCE(MAX(row), -1) + 1 FROM {MEMORY_TABLE}), ?, ?, ?, ?)",
+                    (kind, text, thread_id, time.time()),
+                ).lastrowid
+                self.vectors.set(row, vector)
+        return row
+
+    def forget(self, row: int) -> bool:
+        """Delete one memory; its vector row is zeroed so it never scores"""
+        with self._lock, self.conn:
+            deleted = self.conn.execute(f"DELETE FROM {MEMORY_TABLE} WHERE row = ?", (row,)).rowcount
+            if deleted and row < self.vectors.capacity:
+                if row < self._df_rows:
+                    # Already counted: take its terms out of the document frequencies
+                    nonzero = self.vectors.get(row) != 0
+                    self._df -= nonzero
+                    self._df_docs -= int(nonzero.any())
+                self.vectors.set(row, np.zeros(self.vectors.dim, dtype=np.float32))
+        return bool(deleted)
+
+    def reindex(self) -> int:
+        """Re-embed every stored text (after the vector file was lost or the dimension changed)"""
+        with self._lock:
+            rows = self.conn.execute(f"SELECT row, text FROM {MEMORY_TABLE}").fetchall()
+            for row, text in rows:
+                self.vectors.set(row, self.vectorizer.transform(text))
+            self.vectors.flush()
+            self._df[:] = 0
+            self._df_docs = 0
+            self._df_rows = 0
+        return len(rows)
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            f"SELECT row, kind, text, thread_id, created_at FROM {MEMORY_TABLE} ORDER BY row DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [dict(zip(("row", "kind", "text", "thread_id", "created_at"), row)) for row in rows]
+
+    def count(self) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM {MEMORY_TABLE}").fetchone()[0]
+
+    # -- retrieval --
+
+    def search(self, query: str, k: int = MEMORY_TOP_K, min_score: float = MEMORY_MIN_SCORE) -> List[Dict[str, Any]]:
+        """The k memories most similar to query, best first"""
+        with self._lock:
+            count = self._row_count()
+            if not count:
+                return []
+            query_vector = self.vectorizer.transform(query, self._idf(count))
+            if not query_vector.any():
+                return []
+            scores = self.vectors.scores(query_vector, count)
+        k = min(k, count)
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        hits = [(int(row), float(scores[row])) for row in top if scores[row] >= min_score]
+        if not hits:
+            return []
+        placeholders = ",".join("?" * len(hits))
+        found = {
+            row: (kind, text, thread_id, created_at)
+            for row, kind, text, thread_id, created_at in self.conn.execute(
+                f"SELECT row, kind, text, thread_id, created_at FROM {MEMORY_TABLE} WHERE row IN ({placeholders})",
+                [row for row, _ in hits],
+            )
+        }
+        return [
+            {"row": row, "score": score, "kind": found[row][0], "text": found[row][1],
+             "thread_id": found[row][2], "created_at": found[row][3]}
+            for row, score in hits if row in found
+        ]
+
+    # -- extraction --
+
+    def extract_facts(self, messages: Sequence[BaseMessage]) -> List[str]:
+        """Ask the model for durable facts from one task's messages"""
+        if self.model is None:
+            return []
+        response = self.model.invoke(
+            EXTRACT_PROMPT.format(limit=MAX_FACTS_PER_TASK, transcript=render_transcript(messages)),
+            max_tokens=EXTRACT_MAX_TOKENS,
+        )
+        facts = []
+        for line in _text(response.content).splitlines():
+            line = line.strip()
+            if line.startswith("- ") and line[2:].strip().lower() not in ("none", "none."):
+                facts.append(line[2:].strip())
+        return facts[:MAX_FACTS_PER_TASK]
+
+    def remember_task(self, thread_id: str, goal: str, messages: Sequence[BaseMessage]) -> int:
+        """Store the outcome of a finished task and the facts extracted from it"""
+        with tracing.span("memory.extract", "memory", thread_id=thread_id) as span:
+            answer = next(
+                (_text(message.content) for message in reversed(messages)
+                 if isinstance(message, AIMessage) and _text(message.content)),
+                "",
+            )
+            stored = 0
+            if answer:
+                outcome = f"Task: {_clip(goal, OUTCOME_CHARS)}\nOutcome: {_clip(answer, OUTCOME_CHARS)}"
+                stored += self.add(outcome, kind="outcome", thread_id=thread_id) is not None
+            for fact in self.extract_facts(messages):
+                stored += self.add(fact, kind="fact", thread_id=thread_id) is not None
+            span.set(stored=stored)
+            return stored
+
+    def remember_task_in_background(self, thread_id: str, goal: str, messages: Sequence[BaseMessage]) -> None:
+        """remember_task off the critical path; close() waits for it"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tinker-memory")
+        # In a copy of the caller's context, so the extraction is traced under its task
+        self._executor.submit(contextvars.copy_context().run, self._remember_quietly, thread_id, goal, list(messages))
+
+    def _remember_quietly(self, thread_id: str, goal: str, messages: List[BaseMessage]) -> None:
+        try:
+            self.remember_task(thread_id, goal, messages)
+        except Exception as e:
+            # Losing one task's memories must not disturb the session
+            print(f"⚠️  Could not update long-term memory: {e}")
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.vectors.flush()
+        self.conn.close()
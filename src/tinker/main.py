@@ -1,15 +1,166 @@
 import argparse
-from dotenv import load_dotenv
+import asyncio
+import os
+import sys
+import time
 from . import docker_manager
-from .constants import ANTHROPIC_MODEL
+from . import metrics
+from . import shell_session
+from . import tracing
+from .constants import CHECKPOINT_KEEP_LAST, CHECKPOINT_MAX_AGE_DAYS, CONVERSATIONS_DB_PATH
+from . import checkpoint_store
+from .checkpoint_serializer import collect_blob_garbage
+from .checkpoint_store import connect_conversations_db
+from .model_router import ROLE_CONVERSATION
+from .rate_limiter import ModelRateLimitError
+from .session_manager import SessionManager, SessionNotFoundError, format_session
+from .task_budget import format_budget
+from .token_usage import format_usage
+from .tool_output_store import ToolOutputStore
 
 
-def interactive_chat_mode():
+def run_streaming_task(continuous_workflow, task_content, **kwargs):
+    """Run a task, rendering assistant text token-by-token and tool calls as they happen"""
+    result = {}
+    at_line_start = True
+    for kind, payload in continuous_workflow.stream_continuous_task(task_content, **kwargs):
+        if kind == "route":
+            if payload["role"] == ROLE_CONVERSATION:
+                print(f"\033[90m⚡ Quick reply ({payload['model']})\033[0m")
+        elif kind == "recalled":
+            print(f"\033[90m🧠 Recalled {len(payload)} memories from earlier sessions\033[0m")
+        elif kind == "token":
+            if at_line_start:
+                print()
+            print(payload, end="", flush=True)
+            at_line_start = payload.endswith("\n")
+        elif kind == "tool_call":
+            if not at_line_start:
+                print()
+            reason = payload.get("args", {}).get("reason")
+            label = f"{payload['name']}: {reason}" if reason else payload["name"]
+            print(f"\033[90m🔧 {label}\033[0m")
+            at_line_start = True
+        elif kind == "budget_exceeded":
+            if not at_line_start:
+                print()
+            print(f"\033[93m🛑 Task budget reached ({payload}); wrapping up\033[0m")
+            at_line_start = True
+        elif kind == "result":
+            result = payload
+    if not at_line_start:
+        print()
+    return result
+
+
+def start_session(continuous_workflow, resume=None):
+    """Pick the thread for this run: a new session, or an existing one to resume"""
+    sessions = continuous_workflow.sessions
+    if sessions is None:
+        return "main"
+    if resume == "latest":
+        session = sessions.latest()
+        if session:
+            print(f"↩️  Resuming session {session['thread_id']}: {session['title'] or '(empty)'}")
+            return session["thread_id"]
+        print("ℹ️  No previous session to resume, starting a new one")
+    elif resume:
+        session = sessions.get(resume)
+        print(f"↩️  Resuming session {session['thread_id']}: {session['title'] or '(empty)'}")
+        return session["thread_id"]
+    return sessions.create()["thread_id"]
+
+
+def run_turn(continuous_workflow, thread_id, task_content):
+    """Run one user turn on a session thread and print its outcome"""
+    if continuous_workflow.sessions is not None:
+        continuous_workflow.sessions.record_turn(thread_id, task_content)
+    result = run_streaming_task(continuous_workflow, task_content, thread_id=thread_id)
+    
+    budget = result.get("budget") or {}
+    if budget.get("stopped"):
+        print(f"\n\033[93m🛑 Task stopped at its budget\033[0m")
+    else:
+        print(f"\n\033[92m✅ Task completed\033[0m")
+    if result.get("usage"):
+        print(f"\033[90m{format_usage(result['usage'])}\033[0m")
+    if budget:
+        print(f"\033[90m{format_budget(budget)}\033[0m")
+    return result
+
+
+def handle_session_command(continuous_workflow, thread_id, user_input):
+    """Handle /sessions, /new, /resume and /delete; returns the (possibly new) thread ID"""
+    sessions = continuous_workflow.sessions
+    command, _, argument = user_input.partition(" ")
+    command = command.lower()
+    argument = argument.strip()
+    
+    if sessions is None:
+        print("⚠️  Sessions need conversation memory, which is disabled")
+        return thread_id
+    
+    if command == "/sessions":
+        listed = sessions.list(limit=20)
+        if not listed:
+            print("📭 No sessions yet")
+        for session in listed:
+            print(format_session(session, current=session["thread_id"] == thread_id))
+        return thread_id
+    
+    if command in ("/new", "/clear"):
+        new_thread = sessions.create()["thread_id"]
+        shell_session.close_session(thread_id)
+        print(f"🆕 New session {new_thread} (previous session kept; /resume {thread_id} to return)")
+        return new_thread
+    
+    if command == "/resume":
+        if not argument:
+            print("Usage: /resume <session-id>")
+            return thread_id
+        session = sessions.get(argument)
+        shell_session.close_session(thread_id)
+        print(f"↩️  Resumed session {session['thread_id']}: {session['title'] or '(empty)'}")
+        return session["thread_id"]
+    
+    if command == "/delete":
+        if not argument:
+            print("Usage: /delete <session-id>")
+            return thread_id
+        session = sessions.get(argument)
+        sessions.delete(session["thread_id"])
+        shell_session.close_session(session["thread_id"])
+        print(f"🗑️  Deleted session {session['thread_id']}")
+        if session["thread_id"] == thread_id:
+            thread_id = sessions.create()["thread_id"]
+            print(f"🆕 New session {thread_id}")
+        return thread_id
+    
+    print(f"❓ Unknown command: {command}")
+    return thread_id
+
+
+SESSION_COMMANDS = ("/sessions", "/new", "/clear", "/resume", "/delete")
+
+
+def interactive_chat_mode(continuous_workflow=None, thread_id=None):
     """Interactive chat mode similar to Claude Code"""
     
+    if continuous_workflow is None:
+        from .continuous_agent_workflow import ContinuousAgentWorkflow
+        with ContinuousAgentWorkflow() as continuous_workflow:
+            return interactive_chat_mode(continuous_workflow, thread_id)
+    
+    if thread_id is None:
+        thread_id = start_session(continuous_workflow)
+    
     print("🤖 Tinker Interactive Mode - Type 'exit' or 'quit' to stop")
     print("💬 Chat naturally or give tasks directly")
-    print(f"🧠 Model: {ANTHROPIC_MODEL}")
+    models = continuous_workflow.router.model_names
+    print(f"🧠 Models: {' · '.join(f'{role} {model}' for role, model in models.items())}")
+    if continuous_workflow.router.response_cache is not None:
+        print(f"💾 Model responses: {continuous_workflow.router.cache_mode} (TINKER_LLM_CACHE)")
+    print(f"🧵 Session: {thread_id}  (/sessions, /new, /resume <id>, /delete <id>)")
     
     try:
         while True:
@@ -27,77 +178,370 @@ def interactive_chat_mode():
             if user_input.lower() in ['exit', 'quit', 'bye']:
                 print("👋 Goodbye!")
                 break
-                
-            # Handle memory clearing
-            if user_input.lower() in ['clear memory', '/clear', '/memory clear']:
-                # Since we don't have persistence yet, just acknowledge
-                print("🆕 Memory cleared! (Note: No persistence implemented yet)")
+            
+            # Per-role model latency and token usage for this process
+            if user_input.lower() == "/stats":
+                print("\n".join(continuous_workflow.router.format_stats()) or "📭 No model calls yet")
+                continue
+            
+            # Handle session commands ("clear memory" starts a fresh session too)
+            if user_input.lower() in ['clear memory', '/memory clear']:
+                user_input = "/clear"
+            if user_input.split()[0].lower() in SESSION_COMMANDS:
+                try:
+                    thread_id = handle_session_command(continuous_workflow, thread_id, user_input)
+                except SessionNotFoundError as e:
+                    print(f"❌ {e.args[0]}")
                 continue
                 
             # Process all input as continuous reasoning (DEFAULT)
             try:
                 print(f"\033[90m🔄 Starting continuous reasoning...\033[0m")
-                from .continuous_agent_workflow import ContinuousAgentWorkflow
-                continuous_workflow = ContinuousAgentWorkflow()
-                result = continuous_workflow.run_continuous_task(user_input, max_iterations=10)
-                
-                # Display the conversation messages
-                for msg in result.get('messages', []):
-                    if hasattr(msg, 'content') and msg.content:
-                        # Skip the initial user message (echo)
-                        if hasattr(msg, 'type') and msg.type == 'human':
-                            continue
-                        print(f"\n{msg.content}")
-                
-                print(f"\n\033[92m✅ Task completed\033[0m")
+                run_turn(continuous_workflow, thread_id, user_input)
                         
+            except ModelRateLimitError as e:
+                # Finished steps are checkpointed; the next turn continues from them
+                print(f"⏳ {e}. Progress so far is saved in this session; say \"continue\" to pick up from there.")
             except Exception as e:
                 print(f"❌ Error: {e}")
                 
     except KeyboardInterrupt:
         print("\n👋 Goodbye!")
 
-def single_task_mode(task_content):
+def single_task_mode(task_content, continuous_workflow=None, thread_id=None):
     """Process a single task using continuous reasoning"""
+    if continuous_workflow is None:
+        from .continuous_agent_workflow import ContinuousAgentWorkflow
+        with ContinuousAgentWorkflow() as continuous_workflow:
+            return single_task_mode(task_content, continuous_workflow, thread_id)
+    
+    if thread_id is None:
+        thread_id = start_session(continuous_workflow)
+    
     print(f"\033[90m🔄 Processing task with continuous reasoning...\033[0m")
+    run_turn(continuous_workflow, thread_id, task_content)
+    return thread_id
+
+
+def sessions_command(argv):
+    """tinker sessions [list | delete <id>...]"""
+    parser = argparse.ArgumentParser(prog="tinker sessions", description="List or delete conversation sessions")
+    parser.add_argument("action", nargs="?", default="list", choices=["list", "delete"])
+    parser.add_argument("ids", nargs="*", help="Session IDs (or unique prefixes) to delete")
+    args = parser.parse_args(argv)
     
-    from .continuous_agent_workflow import ContinuousAgentWorkflow
-    continuous_workflow = ContinuousAgentWorkflow()
-    result = continuous_workflow.run_continuous_task(task_content, max_iterations=10)
-    
-    # Display the conversation messages
-    for msg in result.get('messages', []):
-        if hasattr(msg, 'content') and msg.content:
-            # Skip the initial user message (echo)
-            if hasattr(msg, 'type') and msg.type == 'human':
-                continue
-            print(f"\n{msg.content}")
+    conn = connect_conversations_db()
+    try:
+        sessions = SessionManager(conn)
+        if args.action == "list":
+            listed = sessions.list()
+            if not listed:
+                print("📭 No sessions yet")
+            for session in listed:
+                print(format_session(session))
+            return 0
+        
+        for session_id in args.ids:
+            try:
+                session = sessions.get(session_id)
+            except SessionNotFoundError as e:
+                print(f"❌ {e.args[0]}")
+                return 1
+            sessions.delete(session["thread_id"])
+            print(f"🗑️  Deleted session {session['thread_id']}")
+        return 0
+    finally:
+        conn.close()
+
+
+def memory_command(argv):
+    """tinker memory list|search|add|forget"""
+    from .long_term_memory import LongTermMemory
     
-    print(f"\n\033[92m✅ Task completed\033[0m")
+    parser = argparse.ArgumentParser(prog="tinker memory", description="Inspect long-term memory shared by all sessions")
+    actions = parser.add_subparsers(dest="action", required=True)
+    list_parser = actions.add_parser("list", help="Most recent memories")
+    list_parser.add_argument("--limit", type=int, default=20)
+    search_parser = actions.add_parser("search", help="Memories most similar to a query")
+    search_parser.add_argument("query", nargs="+")
+    search_parser.add_argument("-k", type=int, default=10, help="Results to show")
+    add_parser = actions.add_parser("add", help="Remember a fact")
+    add_parser.add_argument("text", nargs="+")
+    forget_parser = actions.add_parser("forget", help="Delete memories by ID")
+    forget_parser.add_argument("ids", nargs="+", type=int)
+    args = parser.parse_args(argv)
+    
+    memory = LongTermMemory(CONVERSATIONS_DB_PATH)
+    try:
+        if args.action == "list":
+            listed = memory.list(limit=args.limit)
+            if not listed:
+                print("📭 No memories yet")
+            for entry in listed:
+                created = time.strftime("%Y-%m-%d", time.localtime(entry["created_at"]))
+                print(f"  #{entry['row']:<6} {created} {entry['kind']:<8} {entry['text']}")
+            print(f"🧠 {memory.count()} memories")
+        
+        elif args.action == "search":
+            started = time.perf_counter()
+            hits = memory.search(" ".join(args.query), k=args.k, min_score=0.0)
+            elapsed = (time.perf_counter() - started) * 1000
+            for hit in hits:
+                print(f"  #{hit['row']:<6} {hit['score']:.2f}  {hit['kind']:<8} {hit['text']}")
+            print(f"🔎 {len(hits)} of {memory.count()} memories in {elapsed:.1f} ms")
+        
+        elif args.action == "add":
+            row = memory.add(" ".join(args.text), kind="fact")
+            print(f"🧠 Remembered as #{row}" if row is not None else "ℹ️  Already remembered")
+        
+        elif args.action == "forget":
+            for row in args.ids:
+                print(f"🗑️  Forgot #{row}" if memory.forget(row) else f"❌ No memory #{row}")
+        return 0
+    finally:
+        memory.close()
+
+
+def start_metrics_server():
+    """Serve /metrics when TINKER_METRICS_PORT is set"""
+    try:
+        server = metrics.start_server()
+    except OSError as e:
+        print(f"⚠️  Metrics endpoint not started: {e}")
+        return
+    if server is not None:
+        host, port = server.server_address[:2]
+        print(f"📈 Metrics at http://{host}:{port}/metrics")
+
+
+def batch_command(argv):
+    """tinker batch tasks.jsonl [--workers N] [--results PATH] [--isolate] [--task-timeout S] [--retry-failed]"""
+    from .batch_runner import BatchFileError, BatchRunner, finished_task_ids, load_tasks
+    
+    parser = argparse.ArgumentParser(
+        prog="tinker batch",
+        description="Run every task of a JSONL file headlessly, each in its own session",
+        epilog='Task lines: "a task" or {"id": "...", "task": "...", "workspace": "subdir" | true}. '
+               "Re-running the same command skips tasks already in the results file."
+    )
+    parser.add_argument("tasks", help="JSONL task file")
+    parser.add_argument("--workers", type=int, default=4, help="Tasks run concurrently (default 4)")
+    parser.add_argument("--results", help="JSONL results file (default <tasks>.results.jsonl)")
+    parser.add_argument("--isolate", action="store_true",
+                        help="Give every task its own workspace directory (batch/<results name>/<task id>)")
+    parser.add_argument("--task-timeout", type=float, default=0, metavar="SECONDS",
+                        help="Stop a task after this long (0 = no limit)")
+    parser.add_argument("--retry-failed", action="store_true", help="Run failed and timed-out tasks again")
+    parser.add_argument("--no-messages", action="store_true", help="Leave the message transcript out of results")
+    args = parser.parse_args(argv)
+    
+    results_path = args.results or f"{os.path.splitext(args.tasks)[0]}.results.jsonl"
+    try:
+        tasks = load_tasks(args.tasks)
+    except (OSError, BatchFileError) as e:
+        print(f"❌ {e}")
+        return 1
+    finished = finished_task_ids(results_path, retry_failed=args.retry_failed)
+    pending = [task for task in tasks if task["id"] not in finished]
+    print(f"📋 {len(tasks)} tasks, {len(tasks) - len(pending)} already done, {len(pending)} to run "
+          f"with {args.workers} workers → {results_path}")
+    if not pending:
+        return 0
+    
+    print("🐳 Starting Docker container...")
+    docker_manager.start_container()
+    start_metrics_server()
+    
+    async def run():
+        from .continuous_agent_workflow import ContinuousAgentWorkflow
+        workflow = ContinuousAgentWorkflow()
+        try:
+            runner = BatchRunner(workflow, results_path, workers=args.workers, isolate=args.isolate,
+                                 task_timeout=args.task_timeout or None, include_messages=not args.no_messages)
+            return await runner.run(pending)
+        finally:
+            await workflow.aclose()
+    
+    started = time.time()
+    try:
+        counts = asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted; run the same command again to resume")
+        return 130
+    print(f"🏁 {counts['completed']} completed, {counts['failed']} failed, {counts['timeout']} timed out "
+          f"in {time.time() - started:.0f}s")
+    return 0 if counts["completed"] == len(pending) else 1
+
+
+def trace_command(argv):
+    """tinker trace [session] [--last N | --all] [--limit N] [--min-ms MS]"""
+    parser = argparse.ArgumentParser(
+        prog="tinker trace",
+        description="Show where a session's time went: a waterfall per task and aggregate hot spots"
+    )
+    parser.add_argument("session", nargs="?", help="Session ID or unique prefix (default: the most recent session)")
+    parser.add_argument("--last", type=int, default=1, help="Tasks to show, most recent last (default 1)")
+    parser.add_argument("--all", action="store_true", help="Show every traced task of the session")
+    parser.add_argument("--limit", type=int, default=200, help="Spans shown per task (default 200)")
+    parser.add_argument("--min-ms", type=float, default=0.0, help="Hide spans shorter than this")
+    args = parser.parse_args(argv)
+    
+    conn = connect_conversations_db()
+    try:
+        sessions = SessionManager(conn)
+        if args.session is None:
+            latest = sessions.latest()
+            if latest is None:
+                print("📭 No sessions yet")
+                return 1
+            thread_id = latest["thread_id"]
+        else:
+            try:
+                thread_id = sessions.get(args.session)["thread_id"]
+            except SessionNotFoundError as e:
+                # Threads without a session entry (e.g. "main") are traced too
+                if not os.path.exists(tracing.tracer.path(args.session)):
+                    print(f"❌ {e.args[0]}")
+                    return 1
+                thread_id = args.session
+    finally:
+        conn.close()
+    
+    path = tracing.tracer.path(thread_id)
+    if not os.path.exists(path):
+        print(f"📭 No trace recorded for {thread_id}" + ("" if tracing.tracer.enabled else " (TINKER_TRACING=0)"))
+        return 1
+    traces = tracing.load_traces(path)
+    selected = traces if args.all else traces[-max(1, args.last):]
+    for number, spans in enumerate(selected, len(traces) - len(selected) + 1):
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(min(s["start"] for s in spans)))
+        print(f"\n🧭 {thread_id} · task {number} of {len(traces)} · {started}")
+        for line in tracing.format_waterfall(spans, limit=args.limit, min_ms=args.min_ms):
+            print(line)
+    print(f"\n🔥 Hot spots over {len(selected)} task{'s' if len(selected) != 1 else ''} (self time excludes child spans)")
+    for line in tracing.format_hot_spots(selected):
+        print(line)
+    return 0
+
+
+def db_command(argv):
+    """tinker db stats|prune|vacuum"""
+    parser = argparse.ArgumentParser(prog="tinker db", description="Inspect and maintain ~/.tinker/conversations.db")
+    actions = parser.add_subparsers(dest="action", required=True)
+    stats_parser = actions.add_parser("stats", help="Database size and per-thread storage")
+    stats_parser.add_argument("--limit", type=int, default=20, help="Threads to show (largest first)")
+    prune_parser = actions.add_parser("prune", help="Apply checkpoint retention")
+    prune_parser.add_argument("--keep-last", type=int, default=CHECKPOINT_KEEP_LAST,
+                              help=f"Checkpoints kept per thread (default {CHECKPOINT_KEEP_LAST})")
+    prune_parser.add_argument("--older-than", type=float, default=CHECKPOINT_MAX_AGE_DAYS, metavar="DAYS",
+                              help="Also delete threads idle for this many days (0 = never)")
+    prune_parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted")
+    vacuum_parser = actions.add_parser("vacuum", help="Return free space to the filesystem")
+    vacuum_parser.add_argument("--full", action="store_true",
+                               help="Rewrite the whole file (needed once for databases created before incremental vacuum)")
+    args = parser.parse_args(argv)
+    
+    conn = connect_conversations_db()
+    try:
+        if args.action == "stats":
+            stats = checkpoint_store.collect_stats(conn, CONVERSATIONS_DB_PATH)
+            size = checkpoint_store.format_bytes
+            print(f"🗄️  {CONVERSATIONS_DB_PATH}")
+            print(f"   size {size(stats['database_bytes'])} (free {size(stats['free_bytes'])}), "
+                  f"WAL {size(stats['wal_bytes'])}, journal {stats['journal_mode']}, auto_vacuum {stats['auto_vacuum']}")
+            threads = stats["threads"]
+            print(f"   {len(threads)} threads, {sum(t['checkpoints'] for t in threads)} checkpoints")
+            if stats["message_blobs"]:
+                print(f"   {stats['message_blobs']} shared message blobs, {size(stats['message_blob_bytes'])} "
+                      f"compressed from {size(stats['message_raw_bytes'])}")
+            tool_outputs = ToolOutputStore().stats()
+            if tool_outputs["blobs"]:
+                print(f"   {tool_outputs['blobs']} offloaded tool outputs, {size(tool_outputs['bytes'])}")
+            for thread in threads[:args.limit]:
+                last = (time.strftime("%Y-%m-%d %H:%M", time.localtime(thread["last_activity"]))
+                        if thread["last_activity"] is not None else "unknown")
+                print(f"   {thread['thread_id']:<28} {thread['checkpoints']:>6} checkpoints "
+                      f"{size(thread['total_bytes']):>10}  last {last}")
+            if len(threads) > args.limit:
+                print(f"   ... {len(threads) - args.limit} more")
+        
+        elif args.action == "prune":
+            verb = "Would delete" if args.dry_run else "Deleted"
+            removed = checkpoint_store.prune_checkpoints(conn, keep_last=args.keep_last, dry_run=args.dry_run)
+            print(f"✂️  {verb} {removed} old checkpoints (keeping the last {args.keep_last} per thread)")
+            expired = checkpoint_store.prune_threads(conn, older_than_days=args.older_than, dry_run=args.dry_run)
+            if args.older_than > 0:
+                print(f"🗑️  {verb} {len(expired)} threads idle for over {args.older_than:g} days")
+                unused = ToolOutputStore().prune(args.older_than, dry_run=args.dry_run)
+                print(f"📦 {verb} {unused} offloaded tool outputs unused for over {args.older_than:g} days")
+                stale = tracing.tracer.prune(args.older_than, dry_run=args.dry_run)
+                print(f"🧭 {verb} {stale} trace files not written for over {args.older_than:g} days")
+            if not args.dry_run:
+                # Restarts the clock of the daily collection on exit
+                checkpoint_store.claim_periodic_run(conn, "blob_gc", 0)
+                orphans = collect_blob_garbage(conn)
+                print(f"🧩 Deleted {orphans} unreferenced message blobs")
+                print("💡 Run 'tinker db vacuum' to return the freed space to the filesystem")
+        
+        elif args.action == "vacuum":
+            result = checkpoint_store.vacuum(conn, full=args.full)
+            size = checkpoint_store.format_bytes
+            print(f"🧹 {size(result['before'])} → {size(result['after'])}")
+            if not args.full and conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                print("💡 This database predates incremental vacuum; run 'tinker db vacuum --full' once")
+        return 0
+    finally:
+        conn.close()
+
+
+# Subcommands handled before the default "chat / run task" mode
+SUBCOMMANDS = {
+    "sessions": sessions_command,
+    "db": db_command,
+    "memory": memory_command,
+    "batch": batch_command,
+    "trace": trace_command,
+}
 
 
 def main():
     """Main entry point for Tinker CLI"""
+    argv = sys.argv[1:]
+    if argv and argv[0] in SUBCOMMANDS:
+        sys.exit(SUBCOMMANDS[argv[0]](argv[1:]))
+    
     # Parse command line arguments
-    parser = argparse.ArgumentParser(description="Tinker - Interactive AI Agent")
+    parser = argparse.ArgumentParser(
+        description="Tinker - Interactive AI Agent",
+        epilog=f"Subcommands: {', '.join(SUBCOMMANDS)} (run 'tinker <subcommand> -h')"
+    )
     parser.add_argument("task", nargs="?", help="Optional task to process directly")
+    parser.add_argument("--resume", nargs="?", const="latest", metavar="SESSION_ID",
+                        help="Continue a previous session (the most recent one if no ID is given)")
     
-    args = parser.parse_args()
-    
-    # Load environment variables
-    load_dotenv()
+    args = parser.parse_args(argv)
     
     # Start Docker container
     print("🐳 Starting Docker container...")
     docker_manager.start_container()
+    start_metrics_server()
     
-    # If task provided as argument, process it first then continue to chat
-    if args.task:
-        single_task_mode(args.task)
-        print()  # Add some space before starting chat
-    
-    # Start interactive chat mode (always)
-    interactive_chat_mode()
+    # Build the agent once and reuse it for every turn of this process
+    from .continuous_agent_workflow import ContinuousAgentWorkflow
+    with ContinuousAgentWorkflow() as continuous_workflow:
+        try:
+            thread_id = start_session(continuous_workflow, resume=args.resume)
+        except SessionNotFoundError as e:
+            print(f"❌ {e.args[0]}")
+            sys.exit(1)
+        
+        # If task provided as argument, process it first then continue to chat
+        if args.task:
+            single_task_mode(args.task, continuous_workflow, thread_id)
+            print()  # Add some space before starting chat
+        
+        # Start interactive chat mode (always)
+        interactive_chat_mode(continuous_workflow, thread_id)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,273 @@
+"""
+Tinker Metrics
+In-process counters, gauges and latency histograms for long-running Tinker
+processes, served in the Prometheus text exposition format. Recording is a
+no-op unless TINKER_METRICS_PORT is set.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .constants import CONVERSATIONS_DB_PATH, METRICS_HOST, METRICS_PORT
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket upper bounds in seconds
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MODEL_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+COMMAND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+TASK_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 1800.0, 3600.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    """Base for a named metric with a fixed set of label names"""
+
+    kind = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labels: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _labels(self, key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.label_names, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(_Metric):
+    """A value that is set, or read from collect() at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, *args, collect: Optional[Callable[[], float]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+        self.collect = collect
+
+    def set(self, value: float, **labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> List[str]:
+        if self.collect is not None:
+            try:
+                return [f"{self.name} {_format_value(self.collect())}"]
+            except OSError:
+                return []
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = FAST_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label set: [count per bucket (not cumulative)..., sum, count]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        lines = []
+        for key, counts in values:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(key, [('le', _format_value(bound))])} "
+                             f"{_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(counts[-2])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {_format_value(counts[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders them for a scrape"""
+
+    def __init__(self, enabled: bool = METRICS_PORT > 0):
+        self.enabled = enabled
+        self._metrics: List[_Metric] = []
+
+    def _add(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self, name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (),
+              collect: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._add(Gauge(self, name, help, labels, collect=collect))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = FAST_BUCKETS) -> Histogram:
+        return self._add(Histogram(self, name, help, labels, buckets=buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _database_bytes() -> float:
+    return sum(
+        os.path.getsize(path) for path in (CONVERSATIONS_DB_PATH, CONVERSATIONS_DB_PATH + "-wal")
+        if os.path.exists(path)
+    )
+
+
+registry = MetricsRegistry()
+
+TASKS = registry.counter("tinker_tasks_total", "Agent tasks by model role and outcome", ["role", "outcome"])
+TASK_SECONDS = registry.histogram("tinker_task_seconds", "Wall time of agent tasks", ["role"], TASK_BUCKETS)
+MODEL_CALLS = registry.counter("tinker_model_calls_total", "Model calls by role, model and outcome",
+                               ["role", "model", "outcome"])
+MODEL_CALL_SECONDS = registry.histogram("tinker_model_call_seconds", "Latency of model calls",
+                                        ["role", "model"], MODEL_BUCKETS)
+MODEL_FIRST_TOKEN_SECONDS = registry.histogram("tinker_model_first_token_seconds",
+                                               "Time to the first streamed token", ["role", "model"], MODEL_BUCKETS)
+MODEL_TOKENS = registry.counter("tinker_model_tokens_total", "Tokens by role, model and type (input, output)",
+                                ["role", "model", "type"])
+MODEL_RETRIES = registry.counter("tinker_model_retries_total", "Model calls retried after a 429/529 or transient API error",
+                                 ["model", "status"])
+RATE_LIMIT_WAIT_SECONDS = registry.histogram("tinker_rate_limit_wait_seconds",
+                                             "Time model calls waited for the shared rate limiter", ["model"],
+                                             FAST_BUCKETS + (30.0, 60.0))
+SUMMARIZATIONS = registry.counter("tinker_summarizations_total", "Conversation segments summarized", ["outcome"])
+SUMMARIZATION_SECONDS = registry.histogram("tinker_summarization_seconds",
+                                           "Time to summarize one segment (including merges)", (), MODEL_BUCKETS)
+TOOL_CALLS = registry.counter("tinker_tool_calls_total", "Tool executions by tool, program and outcome",
+                              ["tool", "program", "outcome"])
+TOOL_SECONDS = registry.histogram("tinker_tool_exec_seconds", "Tool execution latency by tool and program",
+                                  ["tool", "program"], COMMAND_BUCKETS)
+CONTAINER_EXEC_SECONDS = registry.histogram("tinker_container_exec_seconds", "Commands run in the container",
+                                            ["mode"], COMMAND_BUCKETS)
+CONTAINER_EXEC_FAILURES = registry.counter("tinker_container_exec_failures_total",
+                                           "Container commands that timed out, exited non-zero or errored",
+                                           ["mode", "reason"])
+CHECKPOINT_DB_BYTES = registry.gauge("tinker_checkpoint_db_bytes", "Size of conversations.db including its WAL",
+                                     collect=_database_bytes)
+
+
+@contextmanager
+def track(histogram: Histogram, counter: Counter, **labels: str) -> Iterator[None]:
+    """Observe the block's duration and count it as completed, error or cancelled"""
+    if not registry.enabled:
+        yield
+        return
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "completed"
+    except (GeneratorExit, asyncio.CancelledError):
+        outcome = "cancelled"
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+        counter.inc(outcome=outcome, **labels)
+
+
+def command_program(command: str) -> str:
+    """Program name of a shell command, a bounded label (e.g. "git", "pytest")"""
+    for word in command.split():
+        if "=" in word and not word.startswith("="):
+            # Leading VAR=value assignments
+            continue
+        return os.path.basename(word)[:32]
+    return ""
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the chat
+        pass
+
+
+def start_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics from a daemon thread; None when metrics are disabled"""
+    if port <= 0:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="tinker-metrics", daemon=True).start()
+    return server
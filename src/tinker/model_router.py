@@ -0,0 +1,288 @@
+"""
+Tinker Model Router
+Per-role model selection (reasoning, summarization, conversation), a cheap
+chit-chat classifier for routing user turns, and per-role usage statistics
+"""
+
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_anthropic import ChatAnthropic
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import LLMResult
+
+from . import metrics
+from . import tracing
+from .constants import (
+    CONVERSATION_MODEL,
+    LLM_CACHE_MODE,
+    MODEL_ROUTING_ENABLED,
+    RATE_LIMIT_ENABLED,
+    REASONING_MODEL,
+    SUMMARIZATION_MODEL,
+)
+from .rate_limiter import RateLimitedChatModel, SharedRateLimiter
+from .response_cache import CACHE_HIT_KEY, MODE_PASSTHROUGH, MODES, CachedChatModel, ResponseCache
+
+ROLE_REASONING = "reasoning"
+ROLE_SUMMARIZATION = "summarization"
+ROLE_CONVERSATION = "conversation"
+ROLES = (ROLE_REASONING, ROLE_SUMMARIZATION, ROLE_CONVERSATION)
+
+# Turns longer than this always go to the reasoning model
+CHIT_CHAT_MAX_WORDS = 20
+
+# Anything that smells like work in the container or on the codebase
+_TASK_WORDS = re.compile(
+    r"\b(run|check|fix|build|test|tests|install|create|make|write|read|open|edit|update|change|"
+    r"delete|remove|commit|push|pull|merge|deploy|debug|list|show|find|search|look|clone|"
+    r"summari[sz]e|analy[sz]e|review|refactor|implement|add|rename|move|copy|download|upload|"
+    r"email|send|execute|start|stop|restart|kill|repo|repository|file|files|directory|folder|"
+    r"readme|code|script|docker|container|git|github|branch|pr|issue|error|bug|log|logs|"
+    r"package|server|command|shell|pixel|tinker)\b",
+    re.IGNORECASE,
+)
+# Paths, file names, code, URLs and shell syntax
+_CODE_MARKERS = re.compile(r"[`/\\{}<>=$|]|\b\w+\.\w{1,4}\b|https?:|\w\(\)")
+# Replies that continue the previous task ("yes", "go ahead", "try again")
+_FOLLOW_UP = re.compile(
+    r"^\W*(yes|yeah|yep|ok|okay|sure|go|continue|proceed|do|try|retry|again|next|and|also|now|then|"
+    r"instead|what about|how about)\b",
+    re.IGNORECASE,
+)
+
+
+def is_chit_chat(text: str) -> bool:
+    """Cheap first-pass check for turns that need no tools and no deep reasoning
+
+    Errs towards the reasoning model: only short messages without task verbs,
+    code, paths or follow-up phrasing count as chit-chat.
+    """
+    text = text.strip()
+    if not text or len(text.split()) > CHIT_CHAT_MAX_WORDS or "\n" in text:
+        return False
+    return not (_TASK_WORDS.search(text) or _CODE_MARKERS.search(text) or _FOLLOW_UP.search(text))
+
+
+class ModelStats:
+    """Thread-safe call, latency and token totals per role"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._roles: Dict[str, Dict[str, float]] = {}
+
+    def record(self, role: str, latency: float, first_token_latency: Optional[float],
+               input_tokens: int, output_tokens: int, error: bool = False) -> None:
+        with self._lock:
+            stats = self._roles.setdefault(role, {
+                "calls": 0, "errors": 0, "latency": 0.0, "first_token_latency": 0.0,
+                "streamed_calls": 0, "input_tokens": 0, "output_tokens": 0,
+            })
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["latency"] += latency
+            if first_token_latency is not None:
+                stats["streamed_calls"] += 1
+                stats["first_token_latency"] += first_token_latency
+            stats["input_tokens"] += input_tokens
+            stats["output_tokens"] += output_tokens
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Totals per role, plus average latencies in seconds"""
+        with self._lock:
+            roles = {role: dict(stats) for role, stats in self._roles.items()}
+        for stats in roles.values():
+            stats["avg_latency"] = stats["latency"] / stats["calls"]
+            stats["avg_first_token_latency"] = (
+                stats["first_token_latency"] / stats["streamed_calls"] if stats["streamed_calls"] else None
+            )
+        return roles
+
+
+class RoleUsageCallback(BaseCallbackHandler):
+    """Times every call of one role's model and records its token usage (in stats and metrics)"""
+
+    run_inline = True
+
+    def __init__(self, role: str, stats: ModelStats, model: str = ""):
+        self.role = role
+        self.stats = stats
+        self.model = model
+        self._runs: Dict[UUID, Dict[str, Optional[float]]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *,
+                            run_id: UUID, **kwargs: Any) -> None:
+        self._runs[run_id] = {"started": time.perf_counter(), "first_token": None}
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.get(run_id)
+        if run is not None and run["first_token"] is None:
+            run["first_token"] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        self._record(run, input_tokens, output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            self._record(run, 0, 0, error=True)
+
+    def _record(self, run: Dict[str, Optional[float]], input_tokens: int, output_tokens: int,
+                error: bool = False) -> None:
+        first_token = run["first_token"] - run["started"] if run["first_token"] is not None else None
+        latency = time.perf_counter() - run["started"]
+        self.stats.record(self.role, latency, first_token, input_tokens, output_tokens, error=error)
+        labels = {"role": self.role, "model": self.model}
+        metrics.MODEL_CALLS.inc(outcome="error" if error else "completed", **labels)
+        metrics.MODEL_CALL_SECONDS.observe(latency, **labels)
+        if first_token is not None:
+            metrics.MODEL_FIRST_TOKEN_SECONDS.observe(first_token, **labels)
+        metrics.MODEL_TOKENS.inc(input_tokens, type="input", **labels)
+        metrics.MODEL_TOKENS.inc(output_tokens, type="output", **labels)
+
+
+class ModelCallTracer(BaseCallbackHandler):
+    """Records each call of one role's model as a "model.call" span under the current span"""
+
+    run_inline = True
+
+    def __init__(self, role: str, model: str):
+        self.role = role
+        self.model = model
+        self._spans: Dict[UUID, Any] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *,
+                            run_id: UUID, **kwargs: Any) -> None:
+        self._spans[run_id] = tracing.tracer.start(
+            "model.call", "llm", role=self.role, model=self.model, messages=sum(len(batch) for batch in messages)
+        )
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.get(run_id)
+        if isinstance(span, tracing.Span) and "first_token_ms" not in span.attrs:
+            span.set(first_token_ms=span.elapsed() * 1000)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                details = usage.get("input_token_details") or {}
+                span.count("input_tokens", usage.get("input_tokens", 0))
+                span.count("output_tokens", usage.get("output_tokens", 0))
+                span.count("cache_read_tokens", details.get("cache_read", 0))
+                if generation.message.response_metadata.get(CACHE_HIT_KEY):
+                    span.set(cached=True)
+        tracing.tracer.end(span)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            tracing.tracer.end(span, error)
+
+
+class ModelRouter:
+    """Creates the model for each role and picks the agent model for a user turn
+
+    Roles:
+        reasoning     - the ReAct agent working on tasks (flagship model)
+        summarization - the conversation memory hook (fast model)
+        conversation  - short chit-chat turns (fast model)
+    Every model is created with callbacks that record per-role latency and
+    token usage in self.stats and trace each call. With rate_limit, API
+    calls go through a RateLimitedChatModel sharing one SharedRateLimiter
+    (with every other Tinker process); unless cache_mode is passthrough,
+    a CachedChatModel around that answers repeated requests first.
+    """
+
+    def __init__(self, reasoning_model: str = REASONING_MODEL, summarization_model: str = SUMMARIZATION_MODEL,
+                 conversation_model: str = CONVERSATION_MODEL, enabled: bool = MODEL_ROUTING_ENABLED,
+                 cache_mode: str = LLM_CACHE_MODE, rate_limit: bool = RATE_LIMIT_ENABLED):
+        if cache_mode not in MODES:
+            raise ValueError(f"Unknown model cache mode '{cache_mode}' (expected one of {', '.join(MODES)})")
+        self.model_names = {
+            ROLE_REASONING: reasoning_model,
+            ROLE_SUMMARIZATION: summarization_model,
+            ROLE_CONVERSATION: conversation_model,
+        }
+        # Routing to the same model would only compile a second identical agent
+        self.enabled = enabled and conversation_model != reasoning_model
+        self.stats = ModelStats()
+        self.cache_mode = cache_mode
+        self.response_cache = ResponseCache() if cache_mode != MODE_PASSTHROUGH else None
+        self.rate_limiter = SharedRateLimiter() if rate_limit else None
+
+    @property
+    def agent_roles(self) -> List[str]:
+        """Roles that get their own compiled agent"""
+        return [ROLE_REASONING, ROLE_CONVERSATION] if self.enabled else [ROLE_REASONING]
+
+    def chat_model(self, role: str, **kwargs: Any) -> BaseChatModel:
+        """A ChatAnthropic client for role, with usage recording and tracing attached"""
+        callbacks = [
+            RoleUsageCallback(role, self.stats, self.model_names[role]),
+            ModelCallTracer(role, self.model_names[role]),
+        ]
+        name = self.model_names[role]
+        if self.rate_limiter is not None:
+            # Retries go through the limiter instead of the client's own backoff
+            kwargs.setdefault("max_retries", 0)
+        model: BaseChatModel = ChatAnthropic(model=name, **kwargs)
+        if self.rate_limiter is not None:
+            model = RateLimitedChatModel(model=model, limiter=self.rate_limiter, bucket=name)
+        if self.response_cache is not None:
+            # Outside the limiter: a cached response costs no rate limit budget
+            model = CachedChatModel(model=model, response_cache=self.response_cache, mode=self.cache_mode)
+        # Callbacks go on the outermost model, so cached responses are recorded and traced
+        # too, and a call's latency includes its time waiting for the rate limiter
+        model.callbacks = callbacks
+        return model
+
+    def close(self) -> None:
+        if self.response_cache is not None:
+            self.response_cache.close()
+        if self.rate_limiter is not None:
+            self.rate_limiter.close()
+
+    def route(self, text: str) -> str:
+        """Role of the agent that should answer a user turn"""
+        if self.enabled and is_chit_chat(text):
+            return ROLE_CONVERSATION
+        return ROLE_REASONING
+
+    def format_stats(self) -> List[str]:
+        """One terminal line per role that has made calls"""
+        lines = []
+        for role, stats in self.stats.snapshot().items():
+            line = (
+                f"⏱️  {role:<13} {self.model_names[role]}: {stats['calls']} calls · "
+                f"avg {stats['avg_latency']:.2f}s"
+            )
+            if stats["avg_first_token_latency"] is not None:
+                line += f" (first token {stats['avg_first_token_latency']:.2f}s)"
+            line += f" · {stats['input_tokens']:,} in / {stats['output_tokens']:,} out tokens"
+            if stats["errors"]:
+                line += f" · {stats['errors']} errors"
+            lines.append(line)
+        if self.response_cache is not None and lines:
+            cache = self.response_cache.stats()
+            lines.append(
+                f"💾 response cache ({self.cache_mode}): {cache['hits']} hits · {cache['misses']} misses · "
+                f"{cache['entries']} stored"
+            )
+        return lines
@@ -0,0 +1,147 @@
+"""
+Tinker Parallel Tool Node
+Runs independent tool calls from one model turn concurrently while keeping
+anything that mutates the workspace strictly ordered
+"""
+
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from langchain_core.messages import ToolCall, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import get_config_list, get_executor_for_config
+from langgraph.prebuilt import ToolNode
+from langgraph.store.base import BaseStore
+
+from . import tracing
+
+# True while a tool call runs alongside others from the same wave
+_concurrent_wave: ContextVar[bool] = ContextVar("tinker_concurrent_wave", default=False)
+
+
+def in_concurrent_wave() -> bool:
+    """Whether the current tool call shares its wave with other calls
+
+    Tools use this to pick a path that is safe to overlap (e.g. a one-shot
+    exec instead of the serializing shell session) only when they actually
+    run concurrently.
+    """
+    return _concurrent_wave.get()
+
+
+def plan_waves(tool_calls: List[ToolCall], is_parallel_safe: Callable[[ToolCall], bool]) -> List[List[int]]:
+    """Group tool call indexes into waves that may run concurrently
+
+    Consecutive parallel-safe calls share a wave; every other call gets a
+    wave of its own, so mutations happen in the order the model issued them
+    and never overlap with reads.
+    """
+    waves: List[List[int]] = []
+    previous_safe = False
+    for index, call in enumerate(tool_calls):
+        safe = is_parallel_safe(call)
+        if safe and previous_safe:
+            waves[-1].append(index)
+        else:
+            waves.append([index])
+        previous_safe = safe
+    return waves
+
+
+class ParallelToolNode(ToolNode):
+    """ToolNode that only overlaps tool calls known to be independent
+
+    The stock ToolNode runs every call of a turn concurrently. Shell
+    commands share one session per conversation, so mutating commands would
+    then race for it in arbitrary order. Here a tool declares itself safe
+    through its metadata: metadata["parallel_safe"] is either a bool or a
+    callable taking the call's args (e.g. a read-only command classifier).
+    Results are always returned in the original call order, and every call
+    is traced as a "tool.<name>" span.
+    """
+
+    def _call_parallel_safe(self, call: ToolCall) -> bool:
+        tool = self.tools_by_name.get(call["name"])
+        if tool is None:
+            return False
+        flag = (tool.metadata or {}).get("parallel_safe", False)
+        if callable(flag):
+            try:
+                return bool(flag(call.get("args") or {}))
+            except Exception:
+                return False
+        return bool(flag)
+
+    def _run_one(self, call: ToolCall, input_type: str, config: RunnableConfig) -> Any:
+        with tracing.span(f"tool.{call['name']}", "tool", call_id=call.get("id")) as span:
+            output = super()._run_one(call, input_type, config)
+            span.set(bytes=_output_bytes(output))
+            return output
+
+    async def _arun_one(self, call: ToolCall, input_type: str, config: RunnableConfig) -> Any:
+        with tracing.span(f"tool.{call['name']}", "tool", call_id=call.get("id")) as span:
+            output = await super()._arun_one(call, input_type, config)
+            span.set(bytes=_output_bytes(output))
+            return output
+
+    def _func(
+        self,
+        input: Union[List[Any], Dict[str, Any], Any],
+        config: RunnableConfig,
+        *,
+        store: Optional[BaseStore],
+    ) -> Any:
+        tool_calls, input_type = self._parse_input(input, store)
+        config_list = get_config_list(config, len(tool_calls))
+        outputs: List[Any] = [None] * len(tool_calls)
+        with get_executor_for_config(config) as executor:
+            for wave in plan_waves(tool_calls, self._call_parallel_safe):
+                if len(wave) == 1:
+                    index = wave[0]
+                    outputs[index] = self._run_one(tool_calls[index], input_type, config_list[index])
+                    continue
+                # The executor copies the context when map is called
+                token = _concurrent_wave.set(True)
+                try:
+                    results = executor.map(
+                        self._run_one,
+                        [tool_calls[index] for index in wave],
+                        [input_type] * len(wave),
+                        [config_list[index] for index in wave],
+                    )
+                finally:
+                    _concurrent_wave.reset(token)
+                for index, output in zip(wave, results):
+                    outputs[index] = output
+        return self._combine_tool_outputs(outputs, input_type)
+
+    async def _afunc(
+        self,
+        input: Union[List[Any], Dict[str, Any], Any],
+        config: RunnableConfig,
+        *,
+        store: Optional[BaseStore],
+    ) -> Any:
+        tool_calls, input_type = self._parse_input(input, store)
+        outputs: List[Any] = [None] * len(tool_calls)
+        for wave in plan_waves(tool_calls, self._call_parallel_safe):
+            # gather's tasks copy the context when they are created
+            token = _concurrent_wave.set(len(wave) > 1)
+            try:
+                results = await asyncio.gather(
+                    *(self._arun_one(tool_calls[index], input_type, config) for index in wave)
+                )
+            finally:
+                _concurrent_wave.reset(token)
+            for index, output in zip(wave, results):
+                outputs[index] = output
+        return self._combine_tool_outputs(outputs, input_type)
+
+
+def _output_bytes(output: Any) -> int:
+    """Size of a tool result as it enters the conversation"""
+    if isinstance(output, ToolMessage):
+        content = output.content if isinstance(output.content, str) else str(output.content)
+        return len(content.encode())
+    return 0
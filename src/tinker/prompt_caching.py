@@ -0,0 +1,79 @@
+"""
+Tinker Prompt Caching
+Anthropic cache_control breakpoints for the system prompt, tool schemas and conversation prefix
+See docs/third-party/anthropic/prompts-caching.md
+"""
+
+from typing import Any, Callable, Dict, List, Sequence
+
+from langchain_anthropic.chat_models import convert_to_anthropic_tool
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _with_cache_control(content: Any) -> List[Any]:
+    """Return message content as blocks with a breakpoint on the last block"""
+    if isinstance(content, str):
+        return [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+    blocks = [
+        {"type": "text", "text": block} if isinstance(block, str) else dict(block)
+        for block in content
+    ]
+    if blocks:
+        blocks[-1]["cache_control"] = CACHE_CONTROL
+    return blocks
+
+
+def cache_tool_schemas(tools: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Convert tools to Anthropic schemas with a breakpoint after the last one
+
+    Tools are rendered before the system prompt, so one breakpoint here
+    caches the whole tool block.
+    """
+    schemas = [dict(convert_to_anthropic_tool(tool)) for tool in tools]
+    if schemas:
+        schemas[-1]["cache_control"] = CACHE_CONTROL
+    return schemas
+
+
+def with_rolling_breakpoint(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """Mark the newest non-empty message so the next step reuses the prefix
+
+    Every ReAct step extends the conversation, so caching up to the latest
+    message lets the following call read everything before it from cache.
+    """
+    messages = list(messages)
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if isinstance(message, AIMessage) or not message.content:
+            continue
+        messages[index] = message.model_copy(
+            update={"content": _with_cache_control(message.content)}
+        )
+        break
+    return messages
+
+
+def build_cached_prompt(system_prompt: str) -> Callable[[Dict[str, Any]], List[BaseMessage]]:
+    """Create a create_react_agent prompt callable with cache breakpoints
+
+    Leading system messages in the state (e.g. a running conversation
+    summary from the pre-model hook) are folded into the system prompt
+    after the cached block, so they never invalidate it.
+    """
+    def prompt(state: Dict[str, Any]) -> List[BaseMessage]:
+        messages = list(state["messages"])
+        system_blocks = _with_cache_control(system_prompt)
+        while messages and isinstance(messages[0], SystemMessage):
+            extra = messages.pop(0).content
+            if isinstance(extra, str):
+                system_blocks.append({"type": "text", "text": extra})
+            else:
+                system_blocks.extend(
+                    {"type": "text", "text": block} if isinstance(block, str) else block
+                    for block in extra
+                )
+        return [SystemMessage(content=system_blocks)] + with_rolling_breakpoint(messages)
+
+    return prompt
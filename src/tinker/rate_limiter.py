@@ -0,0 +1,423 @@
+"""
+Tinker Rate Limiter
+Requests and input/output tokens per minute, tracked in token buckets that
+every Tinker process on the machine shares through SQLite, a first come
+first served queue for calls waiting on them, and retries of 429/529,
+other transient API errors and dropped connections after retry-after with
+jittered backoff
+"""
+
+import asyncio
+import contextlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from anthropic import APIConnectionError
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from . import metrics
+from .constants import (
+    RATE_LIMIT_DB_PATH,
+    RATE_LIMIT_INPUT_TPM,
+    RATE_LIMIT_MAX_RETRIES,
+    RATE_LIMIT_OUTPUT_TPM,
+    RATE_LIMIT_RPM,
+)
+from .token_accounting import MessageTokenCounter
+
+# Bucket names, each refilled at its per-minute limit
+REQUESTS = "requests"
+INPUT_TOKENS = "input_tokens"
+OUTPUT_TOKENS = "output_tokens"
+
+# Responses worth retrying: rate limited, overloaded
+RETRY_STATUSES = (429, 529)
+# Other transient failures the Anthropic client would retry itself: request
+# and lock timeouts, and every 5xx
+TRANSIENT_STATUSES = (408, 409)
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Seconds between checks while waiting in the queue (behind another call, or for tokens)
+QUEUE_POLL = 0.1
+MAX_POLL = 1.0
+# A ticket not refreshed for this long belongs to a process that died
+TICKET_TTL = 30.0
+
+_counter = MessageTokenCounter()
+
+
+class ModelRateLimitError(RuntimeError):
+    """The API kept answering 429/529 after every retry"""
+
+    def __init__(self, status: int, attempts: int):
+        reason = "rate limited" if status == 429 else "overloaded"
+        super().__init__(f"The model API is {reason} (HTTP {status}); gave up after {attempts} attempts")
+        self.status = status
+        self.attempts = attempts
+
+
+def _status(error: BaseException) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def retry_reason(error: BaseException) -> Optional[str]:
+    """Metric label for a retryable API error, or None when it should be raised
+
+    Follows the Anthropic client's own retry rules: an x-should-retry
+    header wins, then 408, 409, 429 and 5xx, and failed or timed out
+    connections.
+    """
+    if isinstance(error, APIConnectionError):
+        return "connection"
+    status = _status(error)
+    if status is None:
+        return None
+    response = getattr(error, "response", None)
+    should_retry = getattr(response, "headers", {}).get("x-should-retry") if response is not None else None
+    if should_retry in ("true", "false"):
+        return str(status) if should_retry == "true" else None
+    if status in RETRY_STATUSES or status in TRANSIENT_STATUSES or status >= 500:
+        return str(status)
+    return None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds from the retry-after header of an API error, if it has one"""
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        # An HTTP date; fall back to backoff
+        return None
+
+
+def backoff_delay(attempt: int, server_delay: Optional[float] = None) -> float:
+    """Delay before retry number attempt (from 0)
+
+    With a retry-after, wait that long plus up to 25% so callers released
+    together do not retry in lockstep; otherwise exponential backoff with
+    full jitter.
+    """
+    if server_delay is not None:
+        return server_delay * (1.0 + random.uniform(0.0, 0.25))
+    return random.uniform(0.0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class SharedRateLimiter:
+    """Token buckets and a wait queue per model, in a SQLite file shared by processes
+
+    Each bucket holds up to its per-minute limit and refills continuously.
+    A call takes a ticket and waits until it is the oldest live ticket of
+    its model, then until one request and its estimated input tokens are
+    available (and the output bucket is not in debt). After the response,
+    settle() corrects the input estimate and charges the output tokens.
+    A 429 pauses the model for every process until its retry-after.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_DB_PATH, requests_per_minute: int = RATE_LIMIT_RPM,
+                 input_tokens_per_minute: int = RATE_LIMIT_INPUT_TPM,
+                 output_tokens_per_minute: int = RATE_LIMIT_OUTPUT_TPM):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.limits = {
+            name: float(limit) for name, limit in (
+                (REQUESTS, requests_per_minute),
+                (INPUT_TOKENS, input_tokens_per_minute),
+                (OUTPUT_TOKENS, output_tokens_per_minute),
+            ) if limit > 0
+        }
+        self._lock = threading.Lock()
+        # Autocommit; transactions are opened explicitly with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self._transaction():
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (model TEXT NOT NULL, name TEXT NOT NULL, "
+                "tokens REAL NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (model, name))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS tickets (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "model TEXT NOT NULL, heartbeat REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS pauses (model TEXT PRIMARY KEY, until REAL NOT NULL)")
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[None]:
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def _paused_for(self, model: str, now: float) -> float:
+        row = self.conn.execute("SELECT until FROM pauses WHERE model = ?", (model,)).fetchone()
+        return row[0] - now if row and row[0] > now else 0.0
+
+    def _pause_remaining(self, model: str) -> float:
+        with self._lock:
+            return self._paused_for(model, time.time())
+
+    def _take_ticket(self, model: str) -> int:
+        with self._transaction():
+            return self.conn.execute(
+                "INSERT INTO tickets (model, heartbeat) VALUES (?, ?)", (model, time.time())
+            ).lastrowid
+
+    def _release(self, ticket: int) -> None:
+        with self._transaction():
+            self.conn.execute("DELETE FROM tickets WHERE id = ?", (ticket,))
+
+    def _try_acquire(self, model: str, ticket: int, input_tokens: int) -> float:
+        """Take the tokens for one call if it is this ticket's turn; else seconds to wait"""
+        with self._transaction():
+            now = time.time()
+            self.conn.execute("UPDATE tickets SET heartbeat = ? WHERE id = ?", (now, ticket))
+            self.conn.execute("DELETE FROM tickets WHERE heartbeat < ?", (now - TICKET_TTL,))
+            head = self.conn.execute("SELECT MIN(id) FROM tickets WHERE model = ?", (model,)).fetchone()[0]
+            if head != ticket:
+                return QUEUE_POLL
+            paused = self._paused_for(model, now)
+            if paused > 0:
+                return min(paused, MAX_POLL)
+
+            needed = {REQUESTS: 1.0, INPUT_TOKENS: float(input_tokens), OUTPUT_TOKENS: 1.0}
+            levels = {}
+            wait = 0.0
+            for name, limit in self.limits.items():
+                row = self.conn.execute(
+                    "SELECT tokens, updated_at FROM buckets WHERE model = ? AND name = ?", (model, name)
+                ).fetchone()
+                tokens = limit if row is None else min(limit, row[0] + (now - row[1]) * limit / 60.0)
+                # A request larger than a whole minute's budget goes through once the bucket is full
+                need = min(needed[name], limit)
+                if tokens < need:
+                    wait = max(wait, (need - tokens) * 60.0 / limit)
+                levels[name] = tokens
+            if wait > 0:
+                return min(wait, MAX_POLL)
+            for name, tokens in levels.items():
+                # Output tokens are charged in settle(), once they are known
+                if name != OUTPUT_TOKENS:
+                    tokens -= min(needed[name], self.limits[name])
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO buckets (model, name, tokens, updated_at) VALUES (?, ?, ?, ?)",
+                    (model, name, tokens, now),
+                )
+            return 0.0
+
+    def _waits(self, model: str, input_tokens: int) -> Iterator[float]:
+        """Seconds to sleep between attempts, until the call may go ahead"""
+        if not self.limits:
+            # Nothing to queue for; only honour a pause after a 429
+            paused = self._pause_remaining(model)
+            if paused > 0:
+                yield paused
+            return
+        ticket = self._take_ticket(model)
+        try:
+            while True:
+                wait = self._try_acquire(model, ticket, input_tokens)
+                if wait <= 0:
+                    return
+                yield wait
+        finally:
+            self._release(ticket)
+
+    def acquire(self, model: str, input_tokens: int) -> float:
+        """Block until a call with input_tokens may be sent; returns the seconds waited"""
+        started = time.monotonic()
+        with contextlib.closing(self._waits(model, input_tokens)) as waits:
+            for wait in waits:
+                time.sleep(wait)
+        return time.monotonic() - started
+
+    async def aacquire(self, model: str, input_tokens: int) -> float:
+        """asyncio version of acquire
+
+        The SQLite transactions (which may wait on other processes' locks)
+        run in a worker thread, so the event loop keeps serving other calls.
+        """
+        started = time.monotonic()
+        if not self.limits:
+            paused = await asyncio.to_thread(self._pause_remaining, model)
+            if paused > 0:
+                await asyncio.sleep(paused)
+            return time.monotonic() - started
+        ticket = await asyncio.to_thread(self._take_ticket, model)
+        try:
+            while (wait := await asyncio.to_thread(self._try_acquire, model, ticket, input_tokens)) > 0:
+                await asyncio.sleep(wait)
+        finally:
+            await asyncio.to_thread(self._release, ticket)
+        return time.monotonic() - started
+
+    def input_charge(self, input_tokens: int) -> int:
+        """Input tokens acquire() takes for a call estimated at input_tokens"""
+        limit = self.limits.get(INPUT_TOKENS)
+        return input_tokens if limit is None else int(min(input_tokens, limit))
+
+    def settle(self, model: str, charged_input: int, usage: Optional[Dict[str, Any]]) -> None:
+        """Replace the input charged by acquire() with the reported count and charge the output tokens"""
+        if not usage or not self.limits:
+            return
+        details = usage.get("input_token_details") or {}
+        # Cache reads do not count towards the input tokens per minute limit
+        charges = {
+            INPUT_TOKENS: usage.get("input_tokens", 0) - details.get("cache_read", 0) - charged_input,
+            OUTPUT_TOKENS: usage.get("output_tokens", 0),
+        }
+        with self._transaction():
+            for name, amount in charges.items():
+                if name in self.limits and amount:
+                    self.conn.execute(
+                        "UPDATE buckets SET tokens = tokens - ? WHERE model = ? AND name = ?", (amount, model, name)
+                    )
+
+    def pause(self, model: str, seconds: float) -> None:
+        """Hold back every process's calls to model for seconds (after a 429)"""
+        until = time.time() + seconds
+        with self._transaction():
+            self.conn.execute(
+                "INSERT INTO pauses (model, until) VALUES (?, ?) "
+                "ON CONFLICT(model) DO UPDATE SET until = MAX(until, excluded.until)",
+                (model, until),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+class RateLimitedChatModel(BaseChatModel):
+    """Chat model wrapper that waits for the shared rate limiter and retries errors
+
+    Give the wrapped model max_retries=0, so every retry goes through the
+    limiter: 429/529 as well as the transient errors the client would
+    otherwise retry itself (see retry_reason). A streamed call is only
+    retried before its first chunk.
+    """
+
+    model: BaseChatModel
+    limiter: Any = None
+    # Model name the limits are tracked under
+    bucket: str = ""
+    max_retries: int = RATE_LIMIT_MAX_RETRIES
+
+    @property
+    def _llm_type(self) -> str:
+        return self.model._llm_type
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self.model._identifying_params
+
+    def bind_tools(self, tools, **kwargs):
+        binding = self.model.bind_tools(tools, **kwargs)
+        return self.bind(**binding.kwargs)
+
+    def _estimate(self, messages: List[BaseMessage]) -> int:
+        return _counter(messages)
+
+    def _settle(self, estimate: int, usage: Optional[Dict[str, Any]]) -> None:
+        self.limiter.settle(self.bucket, self.limiter.input_charge(estimate), usage)
+
+    def _retry_delay(self, error: BaseException, attempt: int) -> float:
+        """Seconds to wait before retrying error, or raise when it is not retryable"""
+        reason = retry_reason(error)
+        if reason is None:
+            raise error
+        metrics.MODEL_RETRIES.inc(model=self.bucket, status=reason)
+        status = _status(error)
+        if attempt >= self.max_retries:
+            if status in RETRY_STATUSES:
+                raise ModelRateLimitError(status, attempt + 1) from error
+            raise error
+        server_delay = retry_after(error)
+        if status == 429 and server_delay:
+            self.limiter.pause(self.bucket, server_delay)
+        return backoff_delay(attempt, server_delay)
+
+    def _acquire(self, estimate: int) -> None:
+        waited = self.limiter.acquire(self.bucket, estimate)
+        metrics.RATE_LIMIT_WAIT_SECONDS.observe(waited, model=self.bucket)
+
+    async def _aacquire(self, estimate: int) -> None:
+        waited = await self.limiter.aacquire(self.bucket, estimate)
+        metrics.RATE_LIMIT_WAIT_SECONDS.observe(waited, model=self.bucket)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        estimate = self._estimate(messages)
+        for attempt in range(self.max_retries + 1):
+            self._acquire(estimate)
+            try:
+                result = self.model._generate(messages, stop=stop, **kwargs)
+            except Exception as e:
+                time.sleep(self._retry_delay(e, attempt))
+                continue
+            self._settle(estimate, result.generations[0].message.usage_metadata)
+            return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        estimate = self._estimate(messages)
+        for attempt in range(self.max_retries + 1):
+            await self._aacquire(estimate)
+            try:
+                result = await self.model._agenerate(messages, stop=stop, **kwargs)
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                continue
+            await asyncio.to_thread(self._settle, estimate, result.generations[0].message.usage_metadata)
+            return result
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        estimate = self._estimate(messages)
+        for attempt in range(self.max_retries + 1):
+            self._acquire(estimate)
+            merged = None
+            try:
+                for chunk in self.model._stream(messages, stop=stop, **kwargs):
+                    merged = chunk if merged is None else merged + chunk
+                    yield chunk
+            except Exception as e:
+                if merged is not None:
+                    raise
+                time.sleep(self._retry_delay(e, attempt))
+                continue
+            if merged is not None:
+                self._settle(estimate, merged.message.usage_metadata)
+            return
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        estimate = self._estimate(messages)
+        for attempt in range(self.max_retries + 1):
+            await self._aacquire(estimate)
+            merged = None
+            try:
+                async for chunk in self.model._astream(messages, stop=stop, **kwargs):
+                    merged = chunk if merged is None else merged + chunk
+                    yield chunk
+            except Exception as e:
+                if merged is not None:
+                    raise
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                continue
+            if merged is not None:
+                await asyncio.to_thread(self._settle, estimate, merged.message.usage_metadata)
+            return
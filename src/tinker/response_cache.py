@@ -0,0 +1,276 @@
+"""
+Tinker Response Cache
+Record/replay cache of chat model responses, keyed by a canonical hash of
+the request (model parameters, system prompt, tools and messages) and kept
+in a size-bounded SQLite file with least-recently-used eviction
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    message_chunk_to_message,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .constants import CHECKPOINT_COMPRESSION_LEVEL, LLM_CACHE_MAX_MB, LLM_CACHE_MODE, LLM_CACHE_PATH
+
+MODE_PASSTHROUGH = "passthrough"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+MODES = (MODE_PASSTHROUGH, MODE_RECORD, MODE_REPLAY)
+
+# Set in response_metadata of a response served from the cache
+CACHE_HIT_KEY = "tinker_cache_hit"
+
+# Client settings that never change the response
+_IGNORED_PARAMS = {"streaming", "max_retries", "default_request_timeout", "default_headers"}
+
+
+class ResponseCacheMiss(LookupError):
+    """A request with no recorded response in replay mode"""
+
+
+def _canonical_message(message: BaseMessage) -> Dict[str, Any]:
+    """The parts of a message the API sees (IDs, usage and metadata vary between runs)"""
+    entry: Dict[str, Any] = {"type": message.type, "content": message.content}
+    if message.name:
+        entry["name"] = message.name
+    if isinstance(message, AIMessage) and message.tool_calls:
+        entry["tool_calls"] = [
+            {"name": call["name"], "args": call["args"], "id": call.get("id")} for call in message.tool_calls
+        ]
+    tool_call_id = getattr(message, "tool_call_id", None)
+    if tool_call_id:
+        entry["tool_call_id"] = tool_call_id
+    return entry
+
+
+def request_key(params: Dict[str, Any], messages: Sequence[BaseMessage], stop: Optional[List[str]] = None,
+                **kwargs: Any) -> str:
+    """SHA-256 of a canonical JSON form of one model request
+
+    params are the model's identifying parameters (model name, temperature,
+    max_tokens, ...); kwargs are the call options, tools and tool_choice
+    among them. The system prompt is the first message.
+    """
+    request = {
+        "params": {key: value for key, value in params.items() if key not in _IGNORED_PARAMS},
+        "messages": [_canonical_message(message) for message in messages],
+        "stop": stop,
+        "options": kwargs,
+    }
+    data = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Model responses on disk, one zlib-compressed row per request key
+
+    Reads refresh a row's last-used time; once the stored bytes pass
+    max_bytes, the least recently used rows are evicted. One file may be
+    shared by several processes (WAL, busy timeout).
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_MB * 1024 * 1024):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+                """
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used_at)")
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return messages_from_dict([json.loads(zlib.decompress(row[0]))])[0]
+
+    def put(self, key: str, message: AIMessage, model: str = "") -> None:
+        # Without the ID, each replay gets a fresh run ID like a real response
+        message = message.model_copy(update={"id": None})
+        data = zlib.compress(json.dumps(message_to_dict(message), default=str).encode("utf-8"),
+                             CHECKPOINT_COMPRESSION_LEVEL)
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, data, len(data), now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop the oldest rows until a tenth of the budget is free, so eviction stays rare
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        stale = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used_at"):
+            stale.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> int:
+        with self._lock, self.conn:
+            return self.conn.execute("DELETE FROM responses").rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+def _as_chunk(message: AIMessage) -> ChatGenerationChunk:
+    """A whole cached response as a single stream chunk"""
+    chunk = AIMessageChunk(
+        content=message.content,
+        additional_kwargs=message.additional_kwargs,
+        response_metadata=message.response_metadata,
+        usage_metadata=message.usage_metadata,
+        tool_call_chunks=[
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call.get("id"), "index": index}
+            for index, call in enumerate(message.tool_calls)
+        ],
+    )
+    return ChatGenerationChunk(message=chunk)
+
+
+class CachedChatModel(BaseChatModel):
+    """Chat model wrapper that records responses to, or replays them from, a ResponseCache
+
+    Modes:
+        passthrough - every call goes to the wrapped model; nothing is stored
+        record      - cached responses are served, misses call the model and are stored
+        replay      - only cached responses are served; a miss raises ResponseCacheMiss,
+                      so a replayed run never reaches the network
+    Give callbacks to the wrapper rather than the wrapped model: cached calls
+    report through them like real ones, with CACHE_HIT_KEY in response_metadata.
+    """
+
+    model: BaseChatModel
+    # Not "cache": BaseChatModel uses that field for LangChain's own global LLM cache
+    response_cache: Any = None
+    mode: str = LLM_CACHE_MODE
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cached-{self.model._llm_type}"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self.model._identifying_params
+
+    def bind_tools(self, tools, **kwargs):
+        # Let the wrapped model format the tools, then bind the same options here
+        binding = self.model.bind_tools(tools, **kwargs)
+        return self.bind(**binding.kwargs)
+
+    def _key(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any]) -> str:
+        return request_key(self._identifying_params, messages, stop, **kwargs)
+
+    def _lookup(self, key: str) -> Optional[AIMessage]:
+        if self.mode == MODE_PASSTHROUGH:
+            return None
+        message = self.response_cache.get(key)
+        if message is None and self.mode == MODE_REPLAY:
+            raise ResponseCacheMiss(f"No recorded response for request {key[:16]} (TINKER_LLM_CACHE=replay)")
+        if message is not None:
+            message.response_metadata[CACHE_HIT_KEY] = True
+        return message
+
+    def _store(self, key: str, message: BaseMessage) -> None:
+        if self.mode == MODE_RECORD:
+            self.response_cache.put(key, message, self._identifying_params.get("model", ""))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        key = self._key(messages, stop, kwargs)
+        message = self._lookup(key)
+        if message is None:
+            result = self.model._generate(messages, stop=stop, **kwargs)
+            self._store(key, result.generations[0].message)
+            return result
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        key = self._key(messages, stop, kwargs)
+        message = self._lookup(key)
+        if message is None:
+            result = await self.model._agenerate(messages, stop=stop, **kwargs)
+            self._store(key, result.generations[0].message)
+            return result
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        key = self._key(messages, stop, kwargs)
+        message = self._lookup(key)
+        if message is not None:
+            yield _as_chunk(message)
+            return
+        # Token callbacks are emitted by BaseChatModel for the chunks yielded here
+        merged = None
+        for chunk in self.model._stream(messages, stop=stop, **kwargs):
+            merged = chunk if merged is None else merged + chunk
+            yield chunk
+        if merged is not None:
+            self._store(key, message_chunk_to_message(merged.message))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        key = self._key(messages, stop, kwargs)
+        message = self._lookup(key)
+        if message is not None:
+            yield _as_chunk(message)
+            return
+        merged = None
+        async for chunk in self.model._astream(messages, stop=stop, **kwargs):
+            merged = chunk if merged is None else merged + chunk
+            yield chunk
+        if merged is not None:
+            self._store(key, message_chunk_to_message(merged.message))
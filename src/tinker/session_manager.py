@@ -0,0 +1,147 @@
+"""
+Tinker Session Manager
+Conversation sessions, each with its own checkpoint thread in conversations.db
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from .checkpoint_store import delete_thread
+
+# Thread used by every conversation before sessions existed
+LEGACY_THREAD_ID = "main"
+
+SESSION_TITLE_LENGTH = 60
+
+
+class SessionNotFoundError(KeyError):
+    """Raised when a session ID (or prefix) matches no session"""
+
+
+def new_thread_id() -> str:
+    """Sortable, human-typeable thread ID, e.g. 20250101-120000-1a2b"""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:4]}"
+
+
+class SessionManager:
+    """Index of conversation sessions stored next to the LangGraph checkpoints
+
+    Each session maps to one checkpoint thread, so history stays bounded per
+    conversation instead of accumulating in a single shared thread.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self._lock = threading.Lock()
+        self._setup()
+
+    def _setup(self) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tinker_sessions (
+                    thread_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    turns INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            # Keep history written to the shared thread reachable as a session
+            if self._thread_has_checkpoints(LEGACY_THREAD_ID):
+                now = time.time()
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO tinker_sessions (thread_id, title, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (LEGACY_THREAD_ID, "Shared history from earlier versions", now, now),
+                )
+
+    def _thread_has_checkpoints(self, thread_id: str) -> bool:
+        try:
+            row = self.conn.execute(
+                "SELECT 1 FROM checkpoints WHERE thread_id = ? LIMIT 1", (thread_id,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # Checkpoint tables are created lazily on the first saved turn
+            return False
+        return row is not None
+
+    @staticmethod
+    def _row_to_session(row) -> Dict[str, Any]:
+        thread_id, title, created_at, updated_at, turns = row
+        return {
+            "thread_id": thread_id,
+            "title": title,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "turns": turns,
+        }
+
+    def create(self, title: str = "") -> Dict[str, Any]:
+        """Register a new session with a fresh thread ID"""
+        now = time.time()
+        thread_id = new_thread_id()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO tinker_sessions (thread_id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (thread_id, title[:SESSION_TITLE_LENGTH], now, now),
+            )
+        return {"thread_id": thread_id, "title": title, "created_at": now, "updated_at": now, "turns": 0}
+
+    def get(self, thread_id: str) -> Dict[str, Any]:
+        """Find a session by thread ID or unique prefix"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT thread_id, title, created_at, updated_at, turns FROM tinker_sessions "
+                "WHERE thread_id = ? OR thread_id LIKE ? ORDER BY thread_id = ? DESC",
+                (thread_id, thread_id.replace("%", "").replace("_", "") + "%", thread_id),
+            ).fetchall()
+        if not rows:
+            raise SessionNotFoundError(f"No session matches '{thread_id}'")
+        if rows[0][0] != thread_id and len(rows) > 1:
+            raise SessionNotFoundError(f"'{thread_id}' matches {len(rows)} sessions; use more characters")
+        return self._row_to_session(rows[0])
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Most recently used session, if any"""
+        sessions = self.list(limit=1)
+        return sessions[0] if sessions else None
+
+    def list(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Sessions, most recently used first"""
+        query = "SELECT thread_id, title, created_at, updated_at, turns FROM tinker_sessions ORDER BY updated_at DESC"
+        params: tuple = ()
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (limit,)
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [self._row_to_session(row) for row in rows]
+
+    def record_turn(self, thread_id: str, user_input: str) -> None:
+        """Bump a session's turn count; the first message becomes its title"""
+        title = " ".join(user_input.split())[:SESSION_TITLE_LENGTH]
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE tinker_sessions SET turns = turns + 1, updated_at = ?, "
+                "title = CASE WHEN title = '' THEN ? ELSE title END WHERE thread_id = ?",
+                (time.time(), title, thread_id),
+            )
+
+    def delete(self, thread_id: str) -> None:
+        """Delete a session together with its checkpoints and pending writes"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM tinker_sessions WHERE thread_id = ?", (thread_id,))
+            delete_thread(self.conn, thread_id)
+
+
+def format_session(session: Dict[str, Any], current: bool = False) -> str:
+    """One line describing a session for /sessions and `tinker sessions`"""
+    marker = "▶" if current else " "
+    updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(session["updated_at"]))
+    title = session["title"] or "(empty)"
+    return f"{marker} {session['thread_id']}  {updated}  {session['turns']:>3} turns  {title}"
@@ -0,0 +1,454 @@
+"""
+Tinker Shell Session
+Long-lived bash session inside the sandbox container, one per conversation thread
+"""
+
+import asyncio
+import atexit
+import base64
+import queue
+import subprocess
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional, Tuple
+
+from . import docker_manager
+from . import metrics
+from . import tracing
+from .command_output import CommandResult, OutputRingBuffer
+from .constants import COMMAND_KILL_GRACE
+
+
+class ShellSessionError(RuntimeError):
+    """Raised when the shell session dies while a command is running"""
+
+
+class ShellSessionTimeout(ShellSessionError):
+    """Raised when a command outlived its timeout and the session was killed to stop it"""
+
+
+class _FrameScanner:
+    """Finds the end-of-command marker in a byte stream
+
+    Output is released as soon as it can no longer be part of the marker,
+    so callers see data incrementally even though the marker may be split
+    across reads.
+    """
+
+    def __init__(self, marker: bytes):
+        self.marker = b"\n" + marker
+        self.done = False
+        self.trailer = b""
+        self._pending = b""
+
+    def feed(self, data: bytes) -> bytes:
+        """Consume data and return the bytes that belong to the command output"""
+        if self.done:
+            return b""
+        self._pending += data
+        index = self._pending.find(self.marker)
+        if index >= 0:
+            end = self._pending.find(b"\n", index + len(self.marker))
+            output = self._pending[:index]
+            if end < 0:
+                # Marker seen but the trailer line is not complete yet
+                self._pending = self._pending[index:]
+                return output
+            self.trailer = self._pending[index + len(self.marker):end].strip()
+            self._pending = b""
+            self.done = True
+            return output
+        keep = len(self.marker) - 1
+        if len(self._pending) > keep:
+            output = self._pending[:-keep]
+            self._pending = self._pending[-keep:]
+            return output
+        return b""
+
+
+def _session_command(container: str, cwd: Optional[str]):
+    """docker CLI arguments that start the session shell"""
+    cmd = ["docker", "exec", "-i"]
+    if cwd:
+        cmd += ["-w", cwd]
+    return cmd + [container, "bash", "--noprofile", "--norc"]
+
+
+def _frame_script(command: str, marker: str) -> str:
+    """Shell input that runs command and then prints the end-of-command markers"""
+    encoded = base64.b64encode(command.encode()).decode()
+    # eval keeps the command in the session shell (so cd/export persist);
+    # stdin is detached so the command cannot swallow the framing script.
+    return (
+        f"eval \"$(printf '%s' '{encoded}' | base64 -d)\" < /dev/null\n"
+        f"__tinker_rc=$?\n"
+        f"printf '\\n%s %d %s\\n' '{marker}' \"$__tinker_rc\" \"$PWD\"\n"
+        f"printf '\\n%s\\n' '{marker}' >&2\n"
+    )
+
+
+def _kill_tree_script(shell_pid: int, signal: str) -> str:
+    """Shell snippet that signals every descendant of the session shell"""
+    return (
+        'kill_tree() { local child; for child in $(pgrep -P "$1"); do kill_tree "$child" "$2"; done; '
+        'kill -"$2" "$1" 2>/dev/null; }; '
+        f'for child in $(pgrep -P {shell_pid}); do kill_tree "$child" {signal}; done'
+    )
+
+
+def _parse_trailer(trailer: bytes) -> Tuple[int, str]:
+    """Split the stdout marker trailer into (exit code, working directory)"""
+    returncode, _, cwd = trailer.decode(errors="replace").partition(" ")
+    return int(returncode), cwd
+
+
+def _session_died(command: str, returncode: int, reason: Exception) -> CommandResult:
+    stderr = OutputRingBuffer()
+    stderr.write(f"Shell session terminated unexpectedly ({reason}); "
+                 f"it will be restarted on the next command".encode())
+    return CommandResult(command, returncode, OutputRingBuffer(), stderr,
+                         timed_out=isinstance(reason, ShellSessionTimeout))
+
+
+# Steps taken each time a command's deadline passes: SIGTERM, SIGKILL, kill the shell
+_ESCALATION = ("TERM", "KILL", "SESSION")
+
+
+class ShellSession:
+    """A single `docker exec -i bash` process reused for many commands
+
+    Commands run in the session's own shell, so `cd`, `export` and shell
+    variables carry over between calls. Each command is framed with a
+    unique marker carrying its exit code and the resulting working
+    directory. If the shell exits (e.g. the command ran `exit`), the
+    session is respawned on the next call.
+
+    On timeout the command's process tree (every descendant of the session
+    shell) gets SIGTERM, then SIGKILL; if the shell itself is stuck in a
+    builtin loop, the whole session is killed and respawned.
+    """
+
+    def __init__(self, container: str = docker_manager.CONTAINER_NAME, workdir: Optional[str] = None):
+        self.container = container
+        self.workdir = workdir
+        self.cwd: Optional[str] = workdir
+        self.shell_pid: Optional[int] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._output: "queue.Queue[Tuple[str, Optional[bytes]]]" = queue.Queue()
+        self._lock = threading.Lock()
+
+    def is_alive(self) -> bool:
+        """Check whether the underlying bash process is still running"""
+        return self._process is not None and self._process.poll() is None
+
+    def _spawn(self) -> None:
+        """Start the bash process and its output reader threads"""
+        self._process = subprocess.Popen(
+            _session_command(self.container, self.cwd),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+        # Fresh queue so late output from a dead process cannot leak in
+        self._output = queue.Queue()
+        for name, stream in (("stdout", self._process.stdout), ("stderr", self._process.stderr)):
+            reader = threading.Thread(
+                target=docker_manager.read_pipe_chunks, args=(name, stream, self._output), daemon=True
+            )
+            reader.start()
+        self.shell_pid = int(self._run_framed("echo $$", timeout=30).stdout.strip())
+
+    def _ensure_started(self) -> None:
+        if not self.is_alive():
+            self.close()
+            self._spawn()
+
+    def _signal_command_tree(self, signal: str) -> None:
+        """Signal every descendant of the session shell inside the container"""
+        docker_manager.exec_in_container(["bash", "-c", _kill_tree_script(self.shell_pid, signal)])
+
+    def run(self, command: str, timeout: Optional[float] = None,
+            on_output: Optional[Callable[[str, bytes], None]] = None) -> CommandResult:
+        """Run a command in the session and return its result
+
+        on_output, if given, is called with (stream_name, chunk) as output arrives.
+        """
+        with tracing.span("shell.run", "exec", command=command[:200]) as span:
+            try:
+                result = self._run_locked(command, timeout, on_output)
+            except Exception:
+                metrics.CONTAINER_EXEC_FAILURES.inc(mode="session", reason="error")
+                raise
+            docker_manager.observe_command_result(span, result, "session")
+            return result
+
+    def _run_locked(self, command: str, timeout: Optional[float],
+                    on_output: Optional[Callable[[str, bytes], None]]) -> CommandResult:
+        with self._lock:
+            try:
+                self._ensure_started()
+                return self._run_framed(command, timeout=timeout, on_output=on_output)
+            except (BrokenPipeError, ShellSessionError) as e:
+                # The shell died before or during the command; report it and
+                # let the next call respawn a fresh session.
+                returncode = self._process.wait() if self._process else -1
+                self.close()
+                return _session_died(command, returncode, e)
+
+    def _run_framed(self, command: str, timeout: Optional[float] = None,
+                    on_output: Optional[Callable[[str, bytes], None]] = None) -> CommandResult:
+        started = time.monotonic()
+        marker = f"__TINKER_{uuid.uuid4().hex}__"
+        self._process.stdin.write(_frame_script(command, marker).encode())
+        self._process.stdin.flush()
+
+        scanners = {"stdout": _FrameScanner(marker.encode()), "stderr": _FrameScanner(marker.encode())}
+        buffers = {"stdout": OutputRingBuffer(), "stderr": OutputRingBuffer()}
+        escalation = list(_ESCALATION)
+        deadline = started + timeout if timeout else None
+        timed_out = False
+        while not all(scanner.done for scanner in scanners.values()):
+            wait = max(0.0, deadline - time.monotonic()) if deadline else None
+            try:
+                name, data = self._output.get(timeout=wait)
+            except queue.Empty:
+                timed_out = True
+                step = escalation.pop(0)
+                if step == "SESSION":
+                    docker_manager.exec_in_container(["kill", "-KILL", str(self.shell_pid)])
+                    raise ShellSessionTimeout(f"command did not stop within {timeout}s")
+                self._signal_command_tree(step)
+                deadline = time.monotonic() + COMMAND_KILL_GRACE
+                continue
+            if data is None:
+                raise ShellSessionError(f"{name} closed while running command")
+            output = scanners[name].feed(data)
+            if output:
+                buffers[name].write(output)
+                if on_output:
+                    on_output(name, output)
+
+        returncode, cwd = _parse_trailer(scanners["stdout"].trailer)
+        if cwd:
+            self.cwd = cwd
+        return CommandResult(
+            command, returncode, buffers["stdout"], buffers["stderr"],
+            timed_out=timed_out, duration=time.monotonic() - started
+        )
+
+    def close(self) -> None:
+        """Terminate the bash process"""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            if process.poll() is None:
+                process.stdin.close()
+                process.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+
+
+class AsyncShellSession:
+    """asyncio version of ShellSession for the async agent engine"""
+
+    def __init__(self, container: str = docker_manager.CONTAINER_NAME, workdir: Optional[str] = None):
+        self.container = container
+        self.workdir = workdir
+        self.cwd: Optional[str] = workdir
+        self.shell_pid: Optional[int] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._output: Optional[asyncio.Queue] = None
+        self._readers = []
+        self._lock = asyncio.Lock()
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def _spawn(self) -> None:
+        self._process = await asyncio.create_subprocess_exec(
+            *_session_command(self.container, self.cwd),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._output = asyncio.Queue()
+        self._readers = [
+            asyncio.create_task(self._pump(name, stream, self._output))
+            for name, stream in (("stdout", self._process.stdout), ("stderr", self._process.stderr))
+        ]
+        result = await self._run_framed("echo $$", timeout=30)
+        self.shell_pid = int(result.stdout.strip())
+
+    @staticmethod
+    async def _pump(name: str, stream: asyncio.StreamReader, output: asyncio.Queue) -> None:
+        while True:
+            data = await stream.read(65536)
+            if not data:
+                break
+            await output.put((name, data))
+        await output.put((name, None))
+
+    async def _signal_command_tree(self, signal: str) -> None:
+        await docker_manager.async_run_in_container(["bash", "-c", _kill_tree_script(self.shell_pid, signal)])
+
+    async def run(self, command: str, timeout: Optional[float] = None,
+                  on_output: Optional[Callable[[str, bytes], None]] = None) -> CommandResult:
+        """Run a command in the session and return its result"""
+        with tracing.span("shell.run", "exec", command=command[:200]) as span:
+            try:
+                result = await self._run_locked(command, timeout, on_output)
+            except Exception:
+                metrics.CONTAINER_EXEC_FAILURES.inc(mode="session", reason="error")
+                raise
+            docker_manager.observe_command_result(span, result, "session")
+            return result
+
+    async def _run_locked(self, command: str, timeout: Optional[float],
+                          on_output: Optional[Callable[[str, bytes], None]]) -> CommandResult:
+        async with self._lock:
+            try:
+                if not self.is_alive():
+                    await self.close()
+                    await self._spawn()
+                return await self._run_framed(command, timeout=timeout, on_output=on_output)
+            except (BrokenPipeError, ConnectionResetError, ShellSessionError) as e:
+                returncode = await self._process.wait() if self._process else -1
+                await self.close()
+                return _session_died(command, returncode, e)
+
+    async def _run_framed(self, command: str, timeout: Optional[float] = None,
+                          on_output: Optional[Callable[[str, bytes], None]] = None) -> CommandResult:
+        started = time.monotonic()
+        marker = f"__TINKER_{uuid.uuid4().hex}__"
+        self._process.stdin.write(_frame_script(command, marker).encode())
+        await self._process.stdin.drain()
+
+        scanners = {"stdout": _FrameScanner(marker.encode()), "stderr": _FrameScanner(marker.encode())}
+        buffers = {"stdout": OutputRingBuffer(), "stderr": OutputRingBuffer()}
+        escalation = list(_ESCALATION)
+        deadline = started + timeout if timeout else None
+        timed_out = False
+        while not all(scanner.done for scanner in scanners.values()):
+            wait = max(0.0, deadline - time.monotonic()) if deadline else None
+            try:
+                name, data = await asyncio.wait_for(self._output.get(), wait)
+            except asyncio.TimeoutError:
+                timed_out = True
+                step = escalation.pop(0)
+                if step == "SESSION":
+                    await docker_manager.async_run_in_container(["kill", "-KILL", str(self.shell_pid)])
+                    raise ShellSessionTimeout(f"command did not stop within {timeout}s")
+                await self._signal_command_tree(step)
+                deadline = time.monotonic() + COMMAND_KILL_GRACE
+                continue
+            if data is None:
+                raise ShellSessionError(f"{name} closed while running command")
+            output = scanners[name].feed(data)
+            if output:
+                buffers[name].write(output)
+                if on_output:
+                    on_output(name, output)
+
+        returncode, cwd = _parse_trailer(scanners["stdout"].trailer)
+        if cwd:
+            self.cwd = cwd
+        return CommandResult(
+            command, returncode, buffers["stdout"], buffers["stderr"],
+            timed_out=timed_out, duration=time.monotonic() - started
+        )
+
+    async def close(self) -> None:
+        """Terminate the bash process"""
+        process, self._process = self._process, None
+        for reader in self._readers:
+            reader.cancel()
+        self._readers = []
+        if process is None or process.returncode is not None:
+            return
+        try:
+            process.stdin.close()
+            await asyncio.wait_for(process.wait(), 2)
+        except (OSError, asyncio.TimeoutError):
+            process.kill()
+            await process.wait()
+
+
+_sessions: Dict[str, ShellSession] = {}
+_sessions_lock = threading.Lock()
+
+# Starting directory of a thread's shell (e.g. a batch task's own workspace);
+# threads without one start in the container's working directory
+_workdirs: Dict[str, str] = {}
+
+
+def assign_workdir(thread_id: str, workdir: Optional[str]) -> None:
+    """Set (or with None, clear) the directory new shells of a thread start in"""
+    if workdir:
+        _workdirs[thread_id] = workdir
+    else:
+        _workdirs.pop(thread_id, None)
+
+
+def thread_workdir(thread_id: str) -> Optional[str]:
+    return _workdirs.get(thread_id)
+
+
+def get_session(thread_id: str) -> ShellSession:
+    """Get (or create) the shell session for a conversation thread"""
+    with _sessions_lock:
+        session = _sessions.get(thread_id)
+        if session is None:
+            session = ShellSession(workdir=_workdirs.get(thread_id))
+            _sessions[thread_id] = session
+        return session
+
+
+def close_session(thread_id: str) -> None:
+    """Close the shell session for a conversation thread, if any"""
+    with _sessions_lock:
+        session = _sessions.pop(thread_id, None)
+    if session:
+        session.close()
+
+
+def close_all_sessions() -> None:
+    """Close every open shell session"""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+atexit.register(close_all_sessions)
+
+
+_async_sessions: Dict[str, AsyncShellSession] = {}
+
+
+def get_async_session(thread_id: str) -> AsyncShellSession:
+    """Get (or create) the async shell session for a conversation thread"""
+    session = _async_sessions.get(thread_id)
+    if session is None:
+        session = AsyncShellSession(workdir=_workdirs.get(thread_id))
+        _async_sessions[thread_id] = session
+    return session
+
+
+async def aclose_session(thread_id: str) -> None:
+    """Close the async shell session for a conversation thread, if any"""
+    session = _async_sessions.pop(thread_id, None)
+    if session:
+        await session.close()
+
+
+async def aclose_all_sessions() -> None:
+    """Close every open async shell session"""
+    sessions = list(_async_sessions.values())
+    _async_sessions.clear()
+    for session in sessions:
+        await session.close()
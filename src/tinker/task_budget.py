@@ -0,0 +1,178 @@
+"""
+Tinker Task Budget
+Per-task limits on model calls, input/output tokens, wall time and tool
+executions, checked against the agent's stream of updates, and the
+messages that close a task stopped by one
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from .constants import (
+    TASK_MAX_INPUT_TOKENS,
+    TASK_MAX_MODEL_CALLS,
+    TASK_MAX_OUTPUT_TOKENS,
+    TASK_MAX_SECONDS,
+    TASK_MAX_TOOL_CALLS,
+)
+
+# Graph steps per agent iteration: pre-model hook, model, tools
+STEPS_PER_MODEL_CALL = 3
+MIN_RECURSION_LIMIT = 100
+# With no model call limit the other limits end the task; this only guards against a runaway loop
+UNLIMITED_RECURSION_LIMIT = 10_000
+
+SKIPPED_TOOL_CALL = "Not run: the task budget ({reason}) was used up before this tool call could execute."
+SUMMARY_REQUEST = (
+    "The task budget is used up ({reason}), so the task stops here and no more tools can be run. "
+    "Without calling any tools, summarize for the user: what you did, what you found, what is still "
+    "left to do, and how to continue."
+)
+
+
+class TaskBudget:
+    """Limits for one task; 0 or None means unlimited"""
+
+    def __init__(self, max_model_calls: Optional[int] = TASK_MAX_MODEL_CALLS,
+                 max_input_tokens: Optional[int] = TASK_MAX_INPUT_TOKENS,
+                 max_output_tokens: Optional[int] = TASK_MAX_OUTPUT_TOKENS,
+                 max_seconds: Optional[float] = TASK_MAX_SECONDS,
+                 max_tool_calls: Optional[int] = TASK_MAX_TOOL_CALLS):
+        self.max_model_calls = max_model_calls or None
+        self.max_input_tokens = max_input_tokens or None
+        self.max_output_tokens = max_output_tokens or None
+        self.max_seconds = max_seconds or None
+        self.max_tool_calls = max_tool_calls or None
+
+    @property
+    def recursion_limit(self) -> int:
+        """Graph recursion limit that lets max_model_calls be reached first
+
+        The prebuilt agent answers "need more steps" instead of calling tools
+        near this limit, so it must never be the limit a task runs into.
+        """
+        if self.max_model_calls is None:
+            return UNLIMITED_RECURSION_LIMIT
+        return max(MIN_RECURSION_LIMIT, STEPS_PER_MODEL_CALL * self.max_model_calls + STEPS_PER_MODEL_CALL)
+
+    def limits(self) -> Dict[str, Any]:
+        return {
+            "model_calls": self.max_model_calls,
+            "input_tokens": self.max_input_tokens,
+            "output_tokens": self.max_output_tokens,
+            "seconds": self.max_seconds,
+            "tool_calls": self.max_tool_calls,
+        }
+
+
+class BudgetTracker:
+    """Usage of one running task, fed with its "updates" stream items
+
+    Limits are checked before the next step: once the model has made its
+    last allowed call, or asked for tools that would pass the tool or
+    token limits, exceeded is set and the task should stop without
+    running them.
+    """
+
+    def __init__(self, budget: TaskBudget):
+        self.budget = budget
+        self.started = time.monotonic()
+        self.model_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.tool_calls = 0
+        self.exceeded: Optional[str] = None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def observe(self, chunk: Dict[str, Any]) -> Optional[str]:
+        """Account one "updates" item; returns the reason once a limit is reached"""
+        final_answer = False
+        for node, update in chunk.items():
+            if not isinstance(update, dict):
+                continue
+            for message in update.get("messages", []):
+                if node == "agent" and isinstance(message, AIMessage):
+                    self._observe_model_call(message)
+                    final_answer = not message.tool_calls
+                elif node == "tools" and isinstance(message, ToolMessage):
+                    self.tool_calls += 1
+        if final_answer:
+            # The task ends here anyway
+            return self.exceeded
+        if self.exceeded is None and self.budget.max_seconds and self.elapsed() >= self.budget.max_seconds:
+            self.exceeded = f"wall time {self.elapsed():.0f}s of {self.budget.max_seconds:g}s"
+        return self.exceeded
+
+    def _observe_model_call(self, message: AIMessage) -> None:
+        self.model_calls += 1
+        usage = message.usage_metadata or {}
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.output_tokens += usage.get("output_tokens", 0)
+        requested = len(message.tool_calls)
+        if not requested or self.exceeded is not None:
+            return
+        budget = self.budget
+        if budget.max_model_calls and self.model_calls >= budget.max_model_calls:
+            self.exceeded = f"{self.model_calls} of {budget.max_model_calls} model calls"
+        elif budget.max_input_tokens and self.input_tokens >= budget.max_input_tokens:
+            self.exceeded = f"{self.input_tokens:,} of {budget.max_input_tokens:,} input tokens"
+        elif budget.max_output_tokens and self.output_tokens >= budget.max_output_tokens:
+            self.exceeded = f"{self.output_tokens:,} of {budget.max_output_tokens:,} output tokens"
+        elif budget.max_tool_calls and self.tool_calls + requested > budget.max_tool_calls:
+            self.exceeded = (
+                f"{self.tool_calls} of {budget.max_tool_calls} tool executions, {requested} more requested"
+            )
+
+    def report(self) -> Dict[str, Any]:
+        """Usage against the limits, for the task result"""
+        return {
+            "limits": self.budget.limits(),
+            "wall_time": self.elapsed(),
+            "tool_calls": self.tool_calls,
+            "stopped": self.exceeded,
+        }
+
+
+def unanswered_tool_calls(messages: Sequence[BaseMessage]) -> List[Dict[str, Any]]:
+    """Tool calls of the last AI message that have no ToolMessage yet"""
+    answered = set()
+    for message in reversed(messages):
+        if isinstance(message, ToolMessage):
+            answered.add(message.tool_call_id)
+        elif isinstance(message, AIMessage):
+            return [call for call in message.tool_calls if call.get("id") not in answered]
+    return []
+
+
+def skipped_tool_messages(calls: Sequence[Dict[str, Any]], reason: str) -> List[ToolMessage]:
+    """Results for tool calls that will never run, so the history stays valid for the API"""
+    return [
+        ToolMessage(content=SKIPPED_TOOL_CALL.format(reason=reason), tool_call_id=call["id"], name=call["name"],
+                    status="error")
+        for call in calls
+    ]
+
+
+def summary_request(reason: str) -> HumanMessage:
+    """Sent (not stored) after the history to get the closing summary"""
+    return HumanMessage(content=SUMMARY_REQUEST.format(reason=reason))
+
+
+def summary_text(message: AIMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(
+        block.get("text", "") for block in message.content if isinstance(block, dict) and block.get("type") == "text"
+    )
+
+
+def format_budget(report: Dict[str, Any]) -> str:
+    """One-line tool and wall time summary for the terminal"""
+    line = f"🧮 {report['tool_calls']} tool executions · {report['wall_time']:.1f}s"
+    if report["stopped"]:
+        line += f" · stopped at {report['stopped']}"
+    return line
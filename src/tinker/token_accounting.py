@@ -0,0 +1,134 @@
+"""
+Tinker Token Accounting
+Memoized per-message token estimates, a running per-thread total, and
+calibration against the exact input token counts reported by the API
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+# Per-message estimates kept in memory (shared by all threads of a process)
+TOKEN_CACHE_SIZE = 16384
+
+# Weight of the newest observation in the calibration moving average
+CALIBRATION_SMOOTHING = 0.5
+# Ignore implausible ratios (e.g. a prompt estimate from an older schema)
+CALIBRATION_BOUNDS = (0.25, 4.0)
+
+
+def _fingerprint(message: BaseMessage) -> Optional[Tuple[Any, ...]]:
+    """Cache key: the message ID plus cheap signals that change when it is edited in place"""
+    if not message.id:
+        return None
+    content = message.content
+    size = len(content) if isinstance(content, str) else sum(len(str(block)) for block in content)
+    return (message.id, message.type, size, len(getattr(message, "tool_calls", None) or []))
+
+
+class MessageTokenCounter:
+    """count_tokens_approximately, memoized per message
+
+    Usable anywhere a token_counter(messages) -> int is expected. Counting a
+    history the counter has seen before costs one dict lookup per message.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[Any, ...], int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count_message(self, message: BaseMessage) -> int:
+        key = _fingerprint(message)
+        if key is not None:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    return cached
+        tokens = count_tokens_approximately([message])
+        if key is not None:
+            with self._lock:
+                self._cache[key] = tokens
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return tokens
+
+    def __call__(self, messages: Sequence[BaseMessage]) -> int:
+        return sum(self.count_message(message) for message in messages)
+
+
+def update_accounting(messages: Sequence[BaseMessage], accounting: Optional[Dict[str, Any]],
+                      counter: MessageTokenCounter) -> Dict[str, Any]:
+    """Advance the running token total of a thread to cover messages
+
+    accounting is the dict kept in state["context"]["token_accounting"]:
+        message_count / last_message_id - how much of the history is counted
+        estimated_tokens   - approximate tokens of the whole message history
+        unsummarized_tokens / unsummarized_from - approximate tokens of
+                               messages[unsummarized_from:], the part not yet
+                               covered by summaries (see move_unsummarized_start)
+        calibration        - smoothed ratio of API input tokens to our estimate
+        last_prompt_estimate - estimate of the previous model input, used to
+                               calibrate against the next AI message's usage
+    Messages are only ever appended between model calls, so normally just the
+    new tail is counted; if the history was rewritten it is recounted.
+    """
+    accounting = dict(accounting or {})
+    counted = accounting.get("message_count", 0)
+    if 0 < counted <= len(messages) and messages[counted - 1].id == accounting.get("last_message_id"):
+        new_messages = messages[counted:]
+        added = counter(new_messages)
+        total = accounting.get("estimated_tokens", 0) + added
+        if "unsummarized_tokens" in accounting:
+            accounting["unsummarized_tokens"] += added
+        else:
+            accounting.update(unsummarized_tokens=total, unsummarized_from=0)
+    else:
+        new_messages = messages
+        total = counter(messages)
+        accounting.update(unsummarized_tokens=total, unsummarized_from=0)
+
+    calibration = accounting.get("calibration", 1.0)
+    prompt_estimate = accounting.get("last_prompt_estimate")
+    if prompt_estimate:
+        for message in reversed(new_messages):
+            usage = getattr(message, "usage_metadata", None) if isinstance(message, AIMessage) else None
+            if usage and usage.get("input_tokens"):
+                ratio = usage["input_tokens"] / prompt_estimate
+                if CALIBRATION_BOUNDS[0] <= ratio <= CALIBRATION_BOUNDS[1]:
+                    calibration += CALIBRATION_SMOOTHING * (ratio - calibration)
+                break
+
+    accounting.update({
+        "message_count": len(messages),
+        "last_message_id": messages[-1].id if messages else None,
+        "estimated_tokens": total,
+        "calibration": calibration,
+    })
+    return accounting
+
+
+def move_unsummarized_start(accounting: Dict[str, Any], messages: Sequence[BaseMessage], position: int,
+                            counter: MessageTokenCounter) -> int:
+    """Make unsummarized_tokens cover messages[position:] and return it
+
+    Only the messages between the old and the new start are counted: a
+    segment when it is summarized, or the whole history once after the
+    summaries were reset.
+    """
+    start = accounting.get("unsummarized_from", 0)
+    if position > start:
+        accounting["unsummarized_tokens"] -= counter(messages[start:position])
+    elif position < start:
+        accounting["unsummarized_tokens"] += counter(messages[position:start])
+    accounting["unsummarized_from"] = position
+    return accounting["unsummarized_tokens"]
+
+
+def calibrated_tokens(accounting: Dict[str, Any]) -> int:
+    """Running history total corrected by the observed estimate/actual ratio"""
+    return int(accounting.get("estimated_tokens", 0) * accounting.get("calibration", 1.0))
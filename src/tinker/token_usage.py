@@ -0,0 +1,50 @@
+"""
+Tinker Token Usage
+Aggregates model usage metadata (including prompt cache reads/writes) per turn
+"""
+
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+
+def current_turn_messages(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """Messages from the latest user message onwards"""
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return list(messages[index:])
+    return list(messages)
+
+
+def collect_usage(messages: Sequence[BaseMessage]) -> Dict[str, int]:
+    """Sum usage_metadata over the AI messages in a list"""
+    usage = {
+        "model_calls": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_read_tokens": 0,
+        "cache_creation_tokens": 0,
+    }
+    for message in messages:
+        if not isinstance(message, AIMessage):
+            continue
+        usage["model_calls"] += 1
+        metadata: Dict[str, Any] = message.usage_metadata or {}
+        usage["input_tokens"] += metadata.get("input_tokens", 0)
+        usage["output_tokens"] += metadata.get("output_tokens", 0)
+        details = metadata.get("input_token_details") or {}
+        usage["cache_read_tokens"] += details.get("cache_read", 0) or 0
+        usage["cache_creation_tokens"] += details.get("cache_creation", 0) or 0
+    return usage
+
+
+def format_usage(usage: Dict[str, int]) -> str:
+    """One-line usage summary for the terminal"""
+    line = (
+        f"📊 {usage['model_calls']} model calls · "
+        f"{usage['input_tokens']:,} in / {usage['output_tokens']:,} out tokens · "
+        f"cache read {usage['cache_read_tokens']:,}, write {usage['cache_creation_tokens']:,}"
+    )
+    if usage["input_tokens"]:
+        line += f" ({usage['cache_read_tokens'] / usage['input_tokens']:.0%} of input from cache)"
+    return line
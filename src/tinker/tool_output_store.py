@@ -0,0 +1,272 @@
+"""
+Tinker Tool Output Store
+Content-addressed store for tool outputs moved out of the conversation
+history, the compaction step that moves them, and line-range recall
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+
+from .constants import (
+    CHARS_PER_TOKEN,
+    CHECKPOINT_COMPRESSION_LEVEL,
+    TOOL_OUTPUT_KEEP_TURNS,
+    TOOL_OUTPUT_OFFLOAD_MIN_TOKENS,
+    TOOL_OUTPUT_STORE_DIR,
+    TOOL_RESULT_MAX_TOKENS,
+)
+from .token_accounting import MessageTokenCounter
+
+# Set in ToolMessage.additional_kwargs of a stub, holding the blob ID
+OFFLOADED_KEY = "tinker_offloaded_output"
+
+# Hex digits of a blob ID (64 bits: short enough for the model to copy)
+BLOB_ID_LENGTH = 16
+_BLOB_ID = re.compile(rf"[0-9a-f]{{{BLOB_ID_LENGTH}}}")
+
+# Characters of the output shown in a stub
+STUB_PREVIEW_CHARS = 300
+# Lines returned by recall when no range is given
+DEFAULT_RECALL_LINES = 200
+
+
+class ToolOutputNotFoundError(KeyError):
+    """No stored tool output with the given blob ID"""
+
+
+class ToolOutputStore:
+    """Tool outputs stored once per distinct content, zlib-compressed
+
+    Blobs live in <root>/<first two hex digits>/<blob_id>.z. Storing or
+    reading a blob refreshes its modification time, which prune() uses as
+    the last-used time.
+    """
+
+    def __init__(self, root: str = TOOL_OUTPUT_STORE_DIR):
+        self.root = root
+
+    def _path(self, blob_id: str) -> str:
+        return os.path.join(self.root, blob_id[:2], f"{blob_id}.z")
+
+    def put(self, content: str) -> str:
+        """Store content and return its blob ID"""
+        data = content.encode("utf-8")
+        blob_id = hashlib.blake2b(data, digest_size=BLOB_ID_LENGTH // 2).hexdigest()
+        path = self._path(blob_id)
+        try:
+            os.utime(path)
+            return blob_id
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(zlib.compress(data, CHECKPOINT_COMPRESSION_LEVEL))
+        os.replace(tmp_path, path)
+        return blob_id
+
+    def get(self, blob_id: str) -> str:
+        blob_id = blob_id.strip().lower()
+        if not _BLOB_ID.fullmatch(blob_id):
+            raise ToolOutputNotFoundError(f"Invalid blob ID '{blob_id}'")
+        path = self._path(blob_id)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            raise ToolOutputNotFoundError(f"No stored tool output '{blob_id}'") from None
+        return zlib.decompress(data).decode("utf-8")
+
+    def _blobs(self):
+        if not os.path.isdir(self.root):
+            return
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                path = os.path.join(shard_dir, name)
+                try:
+                    yield path, os.stat(path)
+                except OSError:
+                    # Removed by a concurrent prune
+                    continue
+
+    def prune(self, older_than_days: float, dry_run: bool = False) -> int:
+        """Delete blobs not stored or recalled for older_than_days; returns how many"""
+        if older_than_days <= 0:
+            return 0
+        cutoff = time.time() - older_than_days * 86400
+        removed = 0
+        for path, stat in list(self._blobs()):
+            if stat.st_mtime >= cutoff:
+                continue
+            removed += 1
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        blobs = total = 0
+        for _, stat in self._blobs():
+            blobs += 1
+            total += stat.st_size
+        return {"blobs": blobs, "bytes": total}
+
+
+def render_tool_output(content: str) -> str:
+    """Tool output as plain text lines; JSON tool results are unpacked field by field"""
+    try:
+        value = json.loads(content)
+    except ValueError:
+        return content
+    if not isinstance(value, dict):
+        return content
+    parts = []
+    for key, field in value.items():
+        if isinstance(field, str) and "\n" in field:
+            parts.append(f"{key}:\n{field.rstrip(chr(10))}")
+        else:
+            parts.append(f"{key}: {field if isinstance(field, str) else json.dumps(field)}")
+    return "\n".join(parts)
+
+
+def _parse_line_range(line_range: str) -> Tuple[int, Optional[int]]:
+    """'120-240' -> (120, 240), '120-' or '120' -> (120, None)"""
+    match = re.fullmatch(r"\s*(\d+)\s*(?:-\s*(\d*)\s*)?", line_range or "1")
+    if not match:
+        raise ValueError(f"Invalid line range '{line_range}', expected 'start-end' such as '1-200'")
+    start = max(1, int(match.group(1)))
+    end = int(match.group(2)) if match.group(2) else None
+    return start, end
+
+
+def recall_tool_output(store: ToolOutputStore, blob_id: str, line_range: str = "",
+                       max_tokens: int = TOOL_RESULT_MAX_TOKENS) -> Dict[str, Any]:
+    """A range of lines of a stored tool output, capped at max_tokens"""
+    try:
+        start, end = _parse_line_range(line_range)
+        lines = render_tool_output(store.get(blob_id)).splitlines()
+    except (ValueError, ToolOutputNotFoundError) as e:
+        return {"success": False, "error": e.args[0]}
+
+    total = len(lines)
+    if start > total:
+        return {"success": False, "error": f"Output has only {total} lines"}
+    end = min(total, max(start, end) if end is not None else start + DEFAULT_RECALL_LINES - 1)
+    budget = int(max_tokens * CHARS_PER_TOKEN)
+    selected: List[str] = []
+    used = 0
+    for number in range(start, end + 1):
+        line = lines[number - 1]
+        if selected and used + len(line) > budget:
+            end = number - 1
+            break
+        selected.append(line[:budget])
+        used += len(line) + 1
+    result = {
+        "success": True,
+        "blob_id": blob_id,
+        "lines": f"{start}-{end}",
+        "total_lines": total,
+        "content": "\n".join(selected),
+    }
+    if end < total:
+        result["next_range"] = f"{end + 1}-{min(total, end + DEFAULT_RECALL_LINES)}"
+    return result
+
+
+class ToolOutputOffloader:
+    """Moves tool outputs older than keep_turns user turns into a ToolOutputStore
+
+    The replacement keeps the message ID, tool_call_id and status, so it
+    overwrites the original in the checkpointed history (add_messages
+    replaces by ID) and the tool call/result pairing stays valid.
+    """
+
+    def __init__(self, store: ToolOutputStore, keep_turns: int = TOOL_OUTPUT_KEEP_TURNS,
+                 min_tokens: int = TOOL_OUTPUT_OFFLOAD_MIN_TOKENS,
+                 counter: Optional[MessageTokenCounter] = None):
+        self.store = store
+        self.keep_turns = keep_turns
+        self.min_tokens = min_tokens
+        self.counter = counter or MessageTokenCounter()
+
+    def _boundary(self, messages: Sequence[BaseMessage], progress: Dict[str, Any]) -> Optional[int]:
+        """Index of the user message opening the oldest turn kept verbatim
+
+        progress["turn_starts"] holds the indexes of the latest keep_turns
+        user messages among the first progress["scanned"] messages, so only
+        the messages added since the last call are scanned.
+        """
+        scanned = progress.get("scanned", 0)
+        starts = progress.get("turn_starts")
+        if starts is None or scanned > len(messages) or (
+                scanned and messages[scanned - 1].id != progress.get("scanned_id")):
+            # First call, or the history was rewritten
+            scanned, starts = 0, []
+        starts = list(starts)
+        starts.extend(index for index in range(scanned, len(messages)) if isinstance(messages[index], HumanMessage))
+        starts = starts[-self.keep_turns:]
+        progress.update(scanned=len(messages), scanned_id=messages[-1].id if messages else None, turn_starts=starts)
+        return starts[0] if len(starts) == self.keep_turns else None
+
+    def stub(self, message: ToolMessage) -> ToolMessage:
+        """Store the output and return the message with a stub as its content"""
+        blob_id = self.store.put(message.content)
+        text = render_tool_output(message.content)
+        preview = text[:STUB_PREVIEW_CHARS]
+        content = (
+            f"[Tool output moved out of the conversation to save context: {len(text):,} characters, "
+            f"{text.count(chr(10)) + 1} lines, blob {blob_id}. For the exact output call "
+            f"recall_tool_output(blob_id=\"{blob_id}\", line_range=\"1-{DEFAULT_RECALL_LINES}\").]\n"
+            f"Preview:\n{preview}{'...' if len(text) > len(preview) else ''}"
+        )
+        return message.model_copy(update={
+            "content": content,
+            "additional_kwargs": {**message.additional_kwargs, OFFLOADED_KEY: blob_id},
+        })
+
+    def compact(self, messages: Sequence[BaseMessage], progress: Dict[str, Any]) -> List[ToolMessage]:
+        """Stubs for the outputs that aged out since the last call
+
+        progress is kept by the caller between calls (it is updated in
+        place): through_id is the last message already considered, so each
+        call only looks at the messages that crossed the turn boundary since
+        the last one.
+        """
+        if self.keep_turns <= 0:
+            return []
+        boundary = self._boundary(messages, progress)
+        if not boundary:
+            return []
+        through_id = progress.get("through_id")
+        start = 0
+        if through_id is not None:
+            for index in range(boundary - 1, -1, -1):
+                if messages[index].id == through_id:
+                    start = index + 1
+                    break
+        stubs = [
+            self.stub(message)
+            for message in messages[start:boundary]
+            if isinstance(message, ToolMessage)
+            and isinstance(message.content, str)
+            and OFFLOADED_KEY not in message.additional_kwargs
+            and self.counter.count_message(message) >= self.min_tokens
+        ]
+        progress["through_id"] = messages[boundary - 1].id
+        return stubs
@@ -0,0 +1,212 @@
+"""
+Tinker Tool Result Compactor
+Caps shell tool results at a token budget and spills full output to the workspace
+"""
+
+import hashlib
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from .command_output import CommandResult
+from .constants import CHARS_PER_TOKEN, DEFAULT_COMMAND_TIMEOUT, MAX_TOOL_OUTPUT_FILES, TOOL_RESULT_MAX_TOKENS
+from .docker_manager import TINKER_DIR
+
+# Host directory and the same directory as seen from inside the container
+TOOL_OUTPUT_DIR = os.path.join(TINKER_DIR, "workspace", ".tool-output")
+CONTAINER_TOOL_OUTPUT_DIR = "~/.tool-output"
+
+
+# Hex digits of the content hash in a saved output's file name
+OUTPUT_ID_LENGTH = 16
+# A partial output not written for this long belongs to a command that ended
+# without saving or discarding it (e.g. a crashed process); well past the
+# default timeout, so a quiet but still running command keeps its file
+PARTIAL_OUTPUT_MAX_AGE = 2 * DEFAULT_COMMAND_TIMEOUT
+PARTIAL_SUFFIX = ".partial"
+
+
+class OutputSpool:
+    """Collects one output stream in memory and moves it to a file once it grows
+
+    Memory use stays below the threshold; anything larger streams straight
+    to disk so the complete output is available for paging later. Saved
+    outputs are named by a hash of their content, so the same output always
+    gets the same path (and the tool result, the same text).
+    """
+
+    def __init__(self, stream: str, threshold: int):
+        self.stream = stream
+        self.threshold = threshold
+        self._memory = bytearray()
+        self._file = None
+        self._hash = hashlib.sha256()
+        self._finished = False
+        # Hidden while the command runs, so pruning only removes it once stale
+        self._partial = f".{uuid.uuid4().hex}.{stream}{PARTIAL_SUFFIX}"
+
+    @property
+    def path(self) -> str:
+        return os.path.join(TOOL_OUTPUT_DIR, self._partial)
+
+    def write(self, data: bytes) -> None:
+        self._hash.update(data)
+        if self._file is None and len(self._memory) + len(data) <= self.threshold:
+            self._memory += data
+            return
+        if self._file is None:
+            os.makedirs(TOOL_OUTPUT_DIR, exist_ok=True)
+            self._file = open(self.path, "wb")
+            self._file.write(self._memory)
+            self._memory = bytearray()
+        self._file.write(data)
+
+    def save(self) -> str:
+        """Make sure the full output is on disk and return its container path"""
+        if self._file is None:
+            os.makedirs(TOOL_OUTPUT_DIR, exist_ok=True)
+            with open(self.path, "wb") as f:
+                f.write(self._memory)
+            self._memory = bytearray()
+        else:
+            self._file.close()
+        self._finished = True
+        filename = f"{self._hash.hexdigest()[:OUTPUT_ID_LENGTH]}.{self.stream}.log"
+        # Replacing an identical earlier output also makes it the newest for pruning
+        os.replace(self.path, os.path.join(TOOL_OUTPUT_DIR, filename))
+        return f"{CONTAINER_TOOL_OUTPUT_DIR}/{filename}"
+
+    def discard(self) -> None:
+        """Drop the captured output (no-op once saved or discarded)"""
+        self._memory = bytearray()
+        if self._finished:
+            return
+        self._finished = True
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class ToolOutputCapture:
+    """on_output sink that spools stdout and stderr of one command"""
+
+    def __init__(self, threshold: int):
+        self.spools = {
+            "stdout": OutputSpool("stdout", threshold),
+            "stderr": OutputSpool("stderr", threshold),
+        }
+
+    def write(self, name: str, data: bytes) -> None:
+        self.spools[name].write(data)
+
+    def discard(self) -> None:
+        """Drop whatever compact() did not save; call it once the command is over"""
+        for spool in self.spools.values():
+            spool.discard()
+
+
+class ToolResultCompactor:
+    """Keeps shell tool results within a token budget
+
+    Streams that do not fit keep their head and tail, plus line/byte counts
+    and the path of the full output inside the container, so the agent can
+    page through it with a follow-up command instead of carrying it in
+    every later model request.
+    """
+
+    def __init__(self, max_tokens: int = TOOL_RESULT_MAX_TOKENS):
+        self.max_tokens = max_tokens
+        self.max_chars = int(max_tokens * CHARS_PER_TOKEN)
+
+    def capture(self) -> ToolOutputCapture:
+        """Create an output sink to pass as on_output while the command runs"""
+        return ToolOutputCapture(threshold=self.max_chars)
+
+    def _allocate(self, stdout_chars: int, stderr_chars: int) -> Dict[str, int]:
+        """Split the character budget between stdout and stderr"""
+        total = self.max_chars
+        if stdout_chars + stderr_chars <= total:
+            return {"stdout": stdout_chars, "stderr": stderr_chars}
+        if stderr_chars <= total // 4:
+            return {"stdout": total - stderr_chars, "stderr": stderr_chars}
+        if stdout_chars <= total * 3 // 4:
+            return {"stdout": stdout_chars, "stderr": total - stdout_chars}
+        return {"stdout": total * 3 // 4, "stderr": total // 4}
+
+    @staticmethod
+    def _head_tail(text: str, budget: int):
+        """Cut text to roughly budget characters on line boundaries"""
+        head = text[:int(budget * 0.6)]
+        if "\n" in head:
+            head = head[:head.rindex("\n") + 1]
+        tail = text[len(text) - int(budget * 0.4):] if budget > 0 else ""
+        if "\n" in tail:
+            tail = tail[tail.index("\n") + 1:]
+        return head, tail
+
+    def compact(self, tool_result: Dict[str, Any], result: CommandResult,
+                capture: Optional[ToolOutputCapture] = None) -> Dict[str, Any]:
+        """Trim stdout/stderr in tool_result in place and return it"""
+        buffers = {"stdout": result.stdout_buffer, "stderr": result.stderr_buffer}
+        texts = {name: tool_result.get(name) or "" for name in buffers}
+        allocation = self._allocate(len(texts["stdout"]), len(texts["stderr"]))
+
+        for name, buffer in buffers.items():
+            spool = capture.spools[name] if capture else None
+            text = texts[name]
+            if len(text) <= allocation[name] and not buffer.truncated:
+                if spool:
+                    spool.discard()
+                continue
+
+            head, tail = self._head_tail(text, allocation[name])
+            omitted_lines = max(0, buffer.line_count - head.count("\n") - tail.count("\n"))
+            note = f"[{omitted_lines} lines omitted; {name} had {buffer.line_count} lines, {buffer.total_bytes} bytes"
+            if spool:
+                path = spool.save()
+                tool_result[f"{name}_file"] = path
+                note += f". Full output: {path} (page with e.g. `sed -n '1,200p' {path}`)"
+            note += "]"
+            separator = "" if not head or head.endswith("\n") else "\n"
+            tool_result[name] = f"{head}{separator}... {note} ...\n{tail}"
+            tool_result[f"{name}_lines"] = buffer.line_count
+            tool_result[f"{name}_bytes"] = buffer.total_bytes
+
+        self._prune_old_outputs()
+        return tool_result
+
+    @staticmethod
+    def _prune_old_outputs() -> None:
+        """Keep only the most recent MAX_TOOL_OUTPUT_FILES spilled outputs
+
+        Partial outputs are left to their running commands until they go
+        stale (PARTIAL_OUTPUT_MAX_AGE).
+        """
+        if not os.path.isdir(TOOL_OUTPUT_DIR):
+            return
+        stale_before = time.time() - PARTIAL_OUTPUT_MAX_AGE
+        entries = []
+        for name in os.listdir(TOOL_OUTPUT_DIR):
+            path = os.path.join(TOOL_OUTPUT_DIR, name)
+            try:
+                modified = os.path.getmtime(path)
+                if name.startswith("."):
+                    if name.endswith(PARTIAL_SUFFIX) and modified < stale_before:
+                        os.remove(path)
+                    continue
+            except OSError:
+                # Removed by a concurrent tool call pruning at the same time
+                continue
+            entries.append((modified, path))
+        if len(entries) <= MAX_TOOL_OUTPUT_FILES:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - MAX_TOOL_OUTPUT_FILES]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,336 @@
+"""
+Tinker Tracing
+Nested spans with durations, token usage and byte counts: task → model
+calls, pre-model hook and tool calls → container execs, plus checkpoint
+writes. The current span follows the call stack through a contextvar (and
+into threads and asyncio tasks that copy the context); finished spans are
+appended to one JSONL file per conversation thread and rendered by
+`tinker trace` as a waterfall with aggregate hot spots.
+"""
+
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .constants import TRACE_DIR, TRACING_ENABLED
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("tinker_span", default=None)
+
+# Attributes shown on a waterfall line, in this order
+_SHOWN_ATTRS = ("role", "model", "goal", "command", "messages", "segments", "memories", "stored", "writes",
+                "input_tokens", "output_tokens", "cache_read_tokens", "first_token_ms", "bytes", "returncode",
+                "timed_out", "cached")
+# Shown as "<key> <value>"
+_COUNT_ATTRS = {"messages", "segments", "memories", "stored", "writes", "returncode"}
+
+
+class Span:
+    """One timed operation; attrs carries its details (model, tokens, bytes, command, ...)"""
+
+    __slots__ = ("name", "kind", "span_id", "parent_id", "trace_id", "thread_id",
+                 "started_at", "_started", "duration", "attrs", "error")
+
+    def __init__(self, name: str, kind: str, thread_id: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.thread_id = thread_id
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def count(self, key: str, amount: float) -> None:
+        """Add to a numeric attribute (e.g. bytes written by several calls)"""
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def elapsed(self) -> float:
+        """Seconds since the span started"""
+        return time.perf_counter() - self._started
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = {
+            "trace": self.trace_id,
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": round(self.started_at, 6),
+            "duration": round(self.duration or 0.0, 6),
+            "attrs": self.attrs,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class _NoopSpan:
+    """Returned when tracing is off or an operation belongs to no conversation thread"""
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def count(self, key: str, amount: float) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+AnySpan = Union[Span, _NoopSpan]
+
+
+class Tracer:
+    """Creates spans and appends finished ones to <directory>/<thread_id>.jsonl
+
+    Only operations that can be attributed to a thread are recorded: a span
+    needs an explicit thread_id or a current parent span. Writing never
+    raises; a trace is diagnostics and must not fail a task.
+    """
+
+    def __init__(self, directory: str = TRACE_DIR, enabled: bool = TRACING_ENABLED):
+        self.directory = directory
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._directory_ready = False
+
+    def path(self, thread_id: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9._-]", "_", thread_id) + ".jsonl")
+
+    def start(self, name: str, kind: str = "internal", thread_id: Optional[str] = None, **attrs: Any) -> AnySpan:
+        """Open a span under the current one, without making it current; close it with end()
+
+        For operations that start and finish in callbacks (model calls).
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = _current_span.get()
+        if thread_id is None:
+            if parent is None:
+                return NOOP_SPAN
+            thread_id = parent.thread_id
+        elif parent is not None and parent.thread_id != thread_id:
+            parent = None
+        return Span(name, kind, thread_id, parent, attrs)
+
+    def end(self, span: AnySpan, error: Optional[BaseException] = None) -> None:
+        if not isinstance(span, Span):
+            return
+        span.duration = span.elapsed()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        try:
+            with self._lock:
+                if not self._directory_ready:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._directory_ready = True
+                with open(self.path(span.thread_id), "a", encoding="utf-8") as f:
+                    f.write(line)
+        except OSError:
+            pass
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", thread_id: Optional[str] = None,
+             **attrs: Any) -> Iterator[AnySpan]:
+        """Time the with-block as a span; it is the current span inside the block"""
+        span = self.start(name, kind, thread_id, **attrs)
+        if not isinstance(span, Span):
+            yield span
+            return
+        token = _current_span.set(span)
+        error = None
+        try:
+            yield span
+        except GeneratorExit:
+            # The consumer stopped iterating a generator that holds this span
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Closed from another context (a generator finalized elsewhere)
+                pass
+            self.end(span, error)
+
+    def prune(self, older_than_days: float, dry_run: bool = False) -> int:
+        """Delete trace files not written to for older_than_days; returns how many"""
+        if older_than_days <= 0 or not os.path.isdir(self.directory):
+            return 0
+        cutoff = time.time() - older_than_days * 86400
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".jsonl") and entry.stat().st_mtime < cutoff:
+                if not dry_run:
+                    os.remove(entry.path)
+                removed += 1
+        return removed
+
+
+tracer = Tracer()
+span = tracer.span
+
+
+def current_span() -> AnySpan:
+    return _current_span.get() or NOOP_SPAN
+
+
+# -- reading traces --
+
+def load_traces(path: str) -> List[List[Dict[str, Any]]]:
+    """Spans of a trace file grouped by trace (one per task), oldest first"""
+    traces: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash
+                continue
+            traces[record["trace"]].append(record)
+    return sorted(traces.values(), key=lambda spans: min(s["start"] for s in spans))
+
+
+def _tree(spans: List[Dict[str, Any]]) -> List[Tuple[int, Dict[str, Any]]]:
+    """(depth, span) in depth-first order, children sorted by start time"""
+    ids = {s["id"] for s in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = defaultdict(list)
+    for s in spans:
+        children[s["parent"] if s["parent"] in ids else None].append(s)
+    ordered: List[Tuple[int, Dict[str, Any]]] = []
+    stack = [(0, s) for s in sorted(children[None], key=lambda s: s["start"], reverse=True)]
+    while stack:
+        depth, s = stack.pop()
+        ordered.append((depth, s))
+        stack.extend((depth + 1, c) for c in sorted(children[s["id"]], key=lambda c: c["start"], reverse=True))
+    return ordered
+
+
+def _self_times(spans: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Duration minus time spent in children (clamped at 0 when children overlap)"""
+    child_time: Dict[str, float] = defaultdict(float)
+    for s in spans:
+        if s["parent"]:
+            child_time[s["parent"]] += s["duration"]
+    return {s["id"]: max(0.0, s["duration"] - child_time[s["id"]]) for s in spans}
+
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def _format_duration(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    return f"{int(seconds // 60)}m{seconds % 60:04.1f}s"
+
+
+def _describe(s: Dict[str, Any]) -> str:
+    attrs = s.get("attrs") or {}
+    parts = []
+    for key in _SHOWN_ATTRS:
+        value = attrs.get(key)
+        if value is None or value is False:
+            continue
+        if value is True:
+            parts.append(key.replace("_", " "))
+        elif key == "bytes":
+            parts.append(_format_size(value))
+        elif key.endswith("_tokens"):
+            parts.append(f"{value:,} {key[:-len('_tokens')].replace('_', ' ')}")
+        elif key == "first_token_ms":
+            parts.append(f"first token {value:.0f}ms")
+        elif key in ("goal", "command"):
+            parts.append(" ".join(str(value).split())[:60])
+        else:
+            parts.append(f"{key} {value}" if key in _COUNT_ATTRS else str(value))
+    if s.get("error"):
+        parts.append(f"❌ {s['error'][:80]}")
+    return " · ".join(parts)
+
+
+def format_waterfall(spans: List[Dict[str, Any]], width: int = 40, limit: int = 200,
+                     min_ms: float = 0.0) -> List[str]:
+    """One line per span: offset, a bar on the trace's timeline, duration, name and details"""
+    begin = min(s["start"] for s in spans)
+    end = max(s["start"] + s["duration"] for s in spans)
+    total = max(end - begin, 1e-9)
+    lines = []
+    shown = hidden = 0
+    for depth, s in _tree(spans):
+        if depth and (s["duration"] * 1000 < min_ms or shown >= limit):
+            hidden += 1
+            continue
+        offset = int((s["start"] - begin) / total * width)
+        length = max(1, round(s["duration"] / total * width))
+        bar = (" " * offset + "█" * length)[:width].ljust(width)
+        details = _describe(s)
+        lines.append(f"{s['start'] - begin:>7.2f}s {bar} {_format_duration(s['duration']):>8}  "
+                     f"{'  ' * depth}{s['name']}" + (f"  \033[90m{details}\033[0m" if details else ""))
+        shown += 1
+    if hidden:
+        lines.append(f"         ... {hidden} more spans (raise --limit or lower --min-ms)")
+    return lines
+
+
+def hot_spots(traces: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Totals per span name across traces, largest self time first"""
+    rows: Dict[str, Dict[str, Any]] = {}
+    for spans in traces:
+        self_times = _self_times(spans)
+        for s in spans:
+            row = rows.setdefault(s["name"], {
+                "name": s["name"], "count": 0, "total": 0.0, "self": 0.0, "max": 0.0,
+                "input_tokens": 0, "output_tokens": 0, "bytes": 0, "errors": 0,
+            })
+            attrs = s.get("attrs") or {}
+            row["count"] += 1
+            row["total"] += s["duration"]
+            row["self"] += self_times[s["id"]]
+            row["max"] = max(row["max"], s["duration"])
+            for key in ("input_tokens", "output_tokens", "bytes"):
+                row[key] += attrs.get(key) or 0
+            row["errors"] += bool(s.get("error"))
+    return sorted(rows.values(), key=lambda row: row["self"], reverse=True)
+
+
+def format_hot_spots(traces: List[List[Dict[str, Any]]]) -> List[str]:
+    """Hot-spot table; self time is a span's duration minus its children's"""
+    wall = sum(
+        max(s["start"] + s["duration"] for s in spans) - min(s["start"] for s in spans) for spans in traces
+    ) or 1e-9
+    lines = [f"{'span':<28} {'calls':>6} {'self':>9} {'%':>5} {'total':>9} {'avg':>8} {'max':>8}  details"]
+    for row in hot_spots(traces):
+        details = []
+        if row["input_tokens"] or row["output_tokens"]:
+            details.append(f"{row['input_tokens']:,} in / {row['output_tokens']:,} out tokens")
+        if row["bytes"]:
+            details.append(_format_size(row["bytes"]))
+        if row["errors"]:
+            details.append(f"{row['errors']} errors")
+        lines.append(
+            f"{row['name']:<28} {row['count']:>6} {_format_duration(row['self']):>9} "
+            f"{row['self'] / wall:>5.0%} {_format_duration(row['total']):>9} "
+            f"{_format_duration(row['total'] / row['count']):>8} {_format_duration(row['max']):>8}  "
+            f"{' · '.join(details)}"
+        )
+    return lines
@@ -0,0 +1,58 @@
+"""
+Shared fixtures for the Tinker test suite
+Keeps every database under a temporary HOME, turns off the features that
+reach outside the process, and swaps the Docker Engine and model clients
+for the offline stand-ins in benchmarks/fakes.py
+"""
+
+import os
+import sys
+import tempfile
+
+# Set before tinker is imported: constants are read at import time
+os.environ["HOME"] = tempfile.mkdtemp(prefix="tinker-tests-")
+os.environ.setdefault("ANTHROPIC_API_KEY", "sk-ant-tests")
+os.environ["TINKER_SHELL_SESSIONS"] = "0"
+os.environ["TINKER_LONG_TERM_MEMORY"] = "0"
+os.environ["TINKER_RATE_LIMIT"] = "0"
+os.environ["TINKER_LLM_CACHE"] = "passthrough"
+os.environ["TINKER_METRICS_PORT"] = "0"
+os.environ["TINKER_DOCKER_BACKEND"] = "auto"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import pytest  # noqa: E402
+
+from fakes import ScriptedChatModel, install_fake_docker  # noqa: E402
+
+
+@pytest.fixture
+def fake_docker():
+    return install_fake_docker()
+
+
+@pytest.fixture
+def offline_workflow(fake_docker):
+    """Build a ContinuousAgentWorkflow whose models are ScriptedChatModel instances"""
+    from tinker.continuous_agent_workflow import ContinuousAgentWorkflow
+    from tinker.model_router import ROLE_REASONING
+
+    workflows = []
+
+    def build(enable_memory: bool = True, tool_steps: int = 3, calls_per_step: int = 1):
+        workflow = ContinuousAgentWorkflow(enable_memory=enable_memory)
+        checkpointer = workflow.agent.checkpointer
+        workflow.models = {
+            role: ScriptedChatModel(tool_steps=tool_steps, calls_per_step=calls_per_step)
+            for role in workflow.models
+        }
+        if workflow.memory_hook is not None:
+            workflow.memory_hook.model = ScriptedChatModel(tool_steps=0, reply="Summary of earlier work.")
+        workflow.agents = {role: workflow._build_agent(checkpointer, role) for role in workflow.models}
+        workflow.agent = workflow.agents[ROLE_REASONING]
+        workflows.append(workflow)
+        return workflow
+
+    yield build
+    for workflow in workflows:
+        workflow.close()
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from tinker import anthropic_tools_manager, docker_manager, shell_session
+from tinker.anthropic_tools_manager import AnthropicToolsManager
+from tinker.command_output import CommandResult, OutputRingBuffer
+from tinker.parallel_tool_node import _concurrent_wave
+
+
+def _result(command):
+    stdout = OutputRingBuffer()
+    stdout.write(b"ok\n")
+    return CommandResult(command, 0, stdout, OutputRingBuffer())
+
+
+@pytest.fixture
+def exec_paths(monkeypatch):
+    """Record whether commands went through the session or a one-shot exec"""
+    calls = []
+
+    class Session:
+        cwd = "/workspace"
+
+        def run(self, command, timeout=None, on_output=None):
+            calls.append(("session", command))
+            return _result(command)
+
+    class AsyncSession(Session):
+        async def run(self, command, timeout=None, on_output=None):
+            calls.append(("session", command))
+            return _result(command)
+
+    def one_shot(cmd, timeout=None, on_output=None):
+        calls.append(("exec", cmd[-1]))
+        return _result(cmd)
+
+    async def async_one_shot(cmd, timeout=None, on_output=None):
+        return one_shot(cmd, timeout, on_output)
+
+    monkeypatch.setattr(anthropic_tools_manager, "SHELL_SESSIONS_ENABLED", True)
+    monkeypatch.setattr(shell_session, "get_session", lambda thread_id: Session())
+    monkeypatch.setattr(shell_session, "get_async_session", lambda thread_id: AsyncSession())
+    monkeypatch.setattr(docker_manager, "run_in_container", one_shot)
+    monkeypatch.setattr(docker_manager, "async_run_in_container", async_one_shot)
+    return calls
+
+
+def _run(command, concurrent, use_async=False):
+    manager = AnthropicToolsManager(thread_id="t")
+    token = _concurrent_wave.set(concurrent)
+    try:
+        args = {"command": command, "reason": "test"}
+        if use_async:
+            return asyncio.run(manager.aexecute_tool("execute_shell_command", args))
+        return manager.execute_tool("execute_shell_command", args)
+    finally:
+        _concurrent_wave.reset(token)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_lone_read_only_call_uses_the_session(exec_paths, use_async):
+    assert _run("ls", concurrent=False, use_async=use_async)["success"]
+    assert exec_paths == [("session", "ls")]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_read_only_call_in_a_wave_uses_a_one_shot_exec(exec_paths, use_async):
+    assert _run("ls", concurrent=True, use_async=use_async)["success"]
+    assert exec_paths == [("exec", "cd /workspace && ls")]
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import pytest
+
+from tinker.batch_runner import (
+    STATUS_COMPLETED,
+    STATUS_FAILED,
+    BatchFileError,
+    BatchRunner,
+    finished_task_ids,
+    load_tasks,
+)
+
+TASKS = [
+    '"List the files in ~/pixel"',
+    '{"id": "build", "task": "Run the build"}',
+    "# Checked last",
+    '"Check the disk usage"',
+    '"Summarize the README"',
+]
+
+
+def _write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+
+def test_task_ids_are_stable_line_numbers(tmp_path):
+    tasks_path = tmp_path / "tasks.jsonl"
+    _write_lines(tasks_path, TASKS)
+    assert [task["id"] for task in load_tasks(str(tasks_path))] == ["task-1", "build", "task-4", "task-5"]
+
+
+@pytest.mark.parametrize("line, error", [
+    ('{"task": ', "invalid JSON"),
+    ('{"id": "x"}', 'a "task" string'),
+    ('{"id": "build", "task": "Again"}', "duplicate task id 'build'"),
+])
+def test_malformed_task_files_are_rejected(tmp_path, line, error):
+    tasks_path = tmp_path / "tasks.jsonl"
+    _write_lines(tasks_path, TASKS + [line])
+    with pytest.raises(BatchFileError, match=error):
+        load_tasks(str(tasks_path))
+
+
+def test_finished_tasks_of_an_interrupted_run(tmp_path):
+    results_path = tmp_path / "tasks.results.jsonl"
+    assert finished_task_ids(str(results_path)) == set()
+    results_path.write_text(
+        json.dumps({"id": "task-1", "status": STATUS_COMPLETED}) + "\n"
+        + json.dumps({"id": "build", "status": STATUS_FAILED}) + "\n"
+        + '{"id": "task-4", "sta',
+        encoding="utf-8",
+    )
+    assert finished_task_ids(str(results_path)) == {"task-1", "build"}
+    assert finished_task_ids(str(results_path), retry_failed=True) == {"task-1"}
+
+
+def test_rerun_resumes_an_interrupted_batch(offline_workflow, tmp_path):
+    tasks_path, results_path = tmp_path / "tasks.jsonl", tmp_path / "tasks.results.jsonl"
+    _write_lines(tasks_path, TASKS)
+    # The first run finished one task, failed another and was cut off while writing a third
+    results_path.write_text(
+        json.dumps({"id": "task-1", "status": STATUS_COMPLETED}) + "\n"
+        + json.dumps({"id": "build", "status": STATUS_FAILED}) + "\n"
+        + '{"id": "task-4", "sta',
+        encoding="utf-8",
+    )
+    tasks = load_tasks(str(tasks_path))
+    finished = finished_task_ids(str(results_path), retry_failed=True)
+    pending = [task for task in tasks if task["id"] not in finished]
+    assert [task["id"] for task in pending] == ["build", "task-4", "task-5"]
+
+    workflow = offline_workflow(enable_memory=False, tool_steps=1)
+
+    async def run():
+        try:
+            return await BatchRunner(workflow, str(results_path), workers=2).run(pending)
+        finally:
+            await workflow.aclose()
+
+    assert asyncio.run(run()) == {"completed": 3, "failed": 0, "timeout": 0}
+    assert finished_task_ids(str(results_path), retry_failed=True) == {task["id"] for task in tasks}
+    # The cut-off line stays on its own, so no new result is lost to it
+    lines = results_path.read_text(encoding="utf-8").splitlines()
+    assert lines[2] == '{"id": "task-4", "sta'
+    rerun = [json.loads(line) for line in lines[3:]]
+    assert sorted(result["id"] for result in rerun) == ["build", "task-4", "task-5"]
+    assert len({result["thread_id"] for result in rerun}) == 3
+    assert all(result["final_response"] and result["tool_calls"] for result in rerun)
@@ -0,0 +1,123 @@
+import sqlite3
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+
+from fakes import tool_exchange
+from tinker import checkpoint_serializer
+from tinker.checkpoint_serializer import (
+    BLOB_GC_GRACE_SECONDS,
+    BLOB_TABLE,
+    DELTA_PREFIX,
+    MESSAGE_REFS_KEY,
+    DeltaCheckpointSerializer,
+    referenced_blob_ids,
+)
+
+
+def _checkpoint(messages):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"messages": list(messages), "context": {"memory": None}}
+    checkpoint["channel_versions"] = {"messages": 1}
+    return checkpoint
+
+
+def _messages(exchanges: int = 3):
+    messages = [HumanMessage(content="Fix the build", id="human-0")]
+    for index in range(exchanges):
+        messages.extend(tool_exchange(index))
+    return messages
+
+
+def test_round_trip_stores_each_message_once(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    serde = DeltaCheckpointSerializer(path)
+    messages = _messages()
+    first = serde.dumps_typed(_checkpoint(messages))
+    messages.append(AIMessage(content="Done.", id="ai-final"))
+    second = serde.dumps_typed(_checkpoint(messages))
+    assert second[0].startswith(DELTA_PREFIX)
+    assert len(referenced_blob_ids([first, second])) == len(messages)
+
+    # A new instance has nothing cached and reads the blob table
+    restored = DeltaCheckpointSerializer(path).loads_typed(second)
+    assert restored["channel_values"]["messages"] == messages
+    assert restored["channel_values"]["context"] == {"memory": None}
+    rows = sqlite3.connect(path).execute(f"SELECT COUNT(*) FROM {BLOB_TABLE}").fetchone()[0]
+    assert rows == len(messages)
+
+
+def test_round_trip_of_other_values(tmp_path):
+    serde = DeltaCheckpointSerializer(str(tmp_path / "conversations.db"))
+    value = {"step": 3, "writes": ["a", "b"]}
+    type_, data = serde.dumps_typed(value)
+    assert not type_.startswith(DELTA_PREFIX)
+    assert serde.loads_typed((type_, data)) == value
+
+
+def test_rereferenced_blob_survives_collection(tmp_path, monkeypatch):
+    path = str(tmp_path / "conversations.db")
+    serde = DeltaCheckpointSerializer(path)
+    messages = _messages()
+    serde.dumps_typed(_checkpoint(messages))
+
+    # Much later, after the thread's checkpoints were pruned, the blobs are collected ...
+    later = checkpoint_serializer.time.time() + 2 * BLOB_GC_GRACE_SECONDS
+    monkeypatch.setattr(checkpoint_serializer.time, "time", lambda: later)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(f"DELETE FROM {BLOB_TABLE}")
+
+    # ... and a checkpoint referencing the same messages must store them again
+    checkpoint = serde.dumps_typed(_checkpoint(messages))
+    restored = DeltaCheckpointSerializer(path).loads_typed(checkpoint)
+    assert restored["channel_values"]["messages"] == messages
+    created = {row[0] for row in conn.execute(f"SELECT created_at FROM {BLOB_TABLE}")}
+    assert created == {later}
+
+
+def test_checkpoint_refreshes_existing_blobs(tmp_path, monkeypatch):
+    path = str(tmp_path / "conversations.db")
+    messages = _messages()
+    DeltaCheckpointSerializer(path).dumps_typed(_checkpoint(messages))
+
+    later = checkpoint_serializer.time.time() + 2 * BLOB_GC_GRACE_SECONDS
+    monkeypatch.setattr(checkpoint_serializer.time, "time", lambda: later)
+    # Another process re-references the stored blobs: their grace period restarts
+    checkpoint = DeltaCheckpointSerializer(path).dumps_typed(_checkpoint(messages))
+    created = {row[0] for row in sqlite3.connect(path).execute(f"SELECT created_at FROM {BLOB_TABLE}")}
+    assert created == {later}
+    assert MESSAGE_REFS_KEY not in str(DeltaCheckpointSerializer(path).loads_typed(checkpoint))
+
+
+def test_unchanged_messages_are_not_serialized_again(tmp_path, monkeypatch):
+    serde = DeltaCheckpointSerializer(str(tmp_path / "conversations.db"))
+    messages = _messages()
+    first = serde.dumps_typed(_checkpoint(messages))
+
+    serialized = []
+    dumps_typed = serde.inner.dumps_typed
+    monkeypatch.setattr(serde.inner, "dumps_typed", lambda obj: serialized.append(obj) or dumps_typed(obj))
+    messages.append(AIMessage(content="Done.", id="ai-final"))
+    # An edit keeps the message ID but changes its content
+    messages[2] = messages[2].model_copy(update={"content": "[output moved out of the conversation]"})
+    second = serde.dumps_typed(_checkpoint(messages))
+
+    # The two changed messages, then the manifest
+    assert [getattr(obj, "id", None) for obj in serialized] == [messages[2].id, "ai-final", None]
+    assert len(referenced_blob_ids([first, second])) == len(messages) + 1
+    restored = DeltaCheckpointSerializer(str(tmp_path / "conversations.db")).loads_typed(second)
+    assert restored["channel_values"]["messages"] == messages
+
+
+def test_loaded_messages_are_not_serialized_again(tmp_path, monkeypatch):
+    path = str(tmp_path / "conversations.db")
+    checkpoint = DeltaCheckpointSerializer(path).dumps_typed(_checkpoint(_messages()))
+    serde = DeltaCheckpointSerializer(path)
+    messages = serde.loads_typed(checkpoint)["channel_values"]["messages"]
+
+    serialized = []
+    dumps_typed = serde.inner.dumps_typed
+    monkeypatch.setattr(serde.inner, "dumps_typed", lambda obj: serialized.append(obj) or dumps_typed(obj))
+    serde.dumps_typed(_checkpoint(messages))
+    assert len(serialized) == 1
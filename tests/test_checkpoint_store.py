@@ -0,0 +1,108 @@
+import time
+
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from tinker import checkpoint_store
+from tinker.checkpoint_store import (
+    _UUID6_EPOCH_OFFSET,
+    BLOB_GC_INTERVAL_SECONDS,
+    checkpoint_timestamp,
+    connect_conversations_db,
+    prune_checkpoints,
+    prune_threads,
+    run_maintenance,
+    vacuum,
+)
+from tinker.session_manager import SessionManager
+
+DAY = 86400
+
+
+def _checkpoint_id(timestamp: float, sequence: int = 0) -> str:
+    """A uuid6 checkpoint ID for a given Unix time"""
+    ticks = int(timestamp * 1e7) + _UUID6_EPOCH_OFFSET
+    digits = f"{ticks >> 12:012x}6{ticks & 0xfff:03x}{0x8000 | sequence:04x}{sequence:012x}"
+    return f"{digits[:8]}-{digits[8:12]}-{digits[12:16]}-{digits[16:20]}-{digits[20:]}"
+
+
+def _write_thread(saver: SqliteSaver, thread_id: str, timestamps, payload: str = "") -> None:
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    for step, timestamp in enumerate(timestamps):
+        checkpoint = empty_checkpoint()
+        checkpoint["id"] = _checkpoint_id(timestamp, step)
+        checkpoint["channel_values"] = {"notes": payload}
+        checkpoint["channel_versions"] = {"notes": step + 1}
+        config = saver.put(config, checkpoint, {"step": step}, {"notes": step + 1})
+        saver.put_writes(config, [("notes", payload)], task_id=f"task-{step}")
+
+
+def _checkpoint_counts(conn):
+    return dict(conn.execute("SELECT thread_id, COUNT(*) FROM checkpoints GROUP BY thread_id"))
+
+
+def test_checkpoint_ids_decode_to_their_time():
+    assert abs(checkpoint_timestamp(_checkpoint_id(1_700_000_000.5)) - 1_700_000_000.5) < 1e-6
+    assert checkpoint_timestamp("not-a-uuid6") is None
+
+
+def test_prune_checkpoints_keeps_the_newest_per_thread(tmp_path):
+    conn = connect_conversations_db(str(tmp_path / "conversations.db"))
+    saver = SqliteSaver(conn)
+    now = time.time()
+    _write_thread(saver, "a", [now - 50 + step for step in range(6)])
+    _write_thread(saver, "b", [now - 10, now - 5])
+    assert prune_checkpoints(conn, keep_last=3, dry_run=True) == 3
+    assert _checkpoint_counts(conn) == {"a": 6, "b": 2}
+
+    assert prune_checkpoints(conn, keep_last=3) == 3
+    assert _checkpoint_counts(conn) == {"a": 3, "b": 2}
+    # The newest checkpoint is still the one a resumed thread starts from
+    latest = saver.get_tuple({"configurable": {"thread_id": "a", "checkpoint_ns": ""}})
+    assert latest.checkpoint["id"] == _checkpoint_id(now - 45, 5)
+    # Pending writes of removed checkpoints go with them
+    assert conn.execute("SELECT COUNT(*) FROM writes WHERE thread_id = 'a'").fetchone()[0] == 3
+
+
+def test_prune_threads_drops_idle_threads_and_their_sessions(tmp_path):
+    conn = connect_conversations_db(str(tmp_path / "conversations.db"))
+    saver = SqliteSaver(conn)
+    sessions = SessionManager(conn)
+    idle, active = sessions.create()["thread_id"], sessions.create()["thread_id"]
+    now = time.time()
+    _write_thread(saver, idle, [now - 40 * DAY, now - 31 * DAY])
+    _write_thread(saver, active, [now - 40 * DAY, now - DAY])
+    assert prune_threads(conn, older_than_days=30, dry_run=True) == [idle]
+    assert prune_threads(conn, older_than_days=30) == [idle]
+    assert _checkpoint_counts(conn) == {active: 2}
+    assert [session["thread_id"] for session in sessions.list()] == [active]
+    assert prune_threads(conn, older_than_days=0) == []
+
+
+def test_vacuum_returns_freed_pages(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    conn = connect_conversations_db(path)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    saver = SqliteSaver(conn)
+    now = time.time()
+    _write_thread(saver, "big", [now - 100 + step for step in range(20)], payload="x" * 100_000)
+    prune_checkpoints(conn, keep_last=1)
+    result = vacuum(conn)
+    assert result["after"] < result["before"] / 4
+    assert vacuum(conn, full=True)["after"] <= result["after"]
+
+
+def test_blob_collection_runs_at_most_once_per_interval(tmp_path, monkeypatch):
+    conn = connect_conversations_db(str(tmp_path / "conversations.db"))
+    collections = []
+    monkeypatch.setattr(checkpoint_store, "collect_blob_garbage", lambda conn: collections.append(1))
+    run_maintenance(conn)
+    run_maintenance(conn)
+    assert len(collections) == 1
+
+    later = checkpoint_store.time.time() + BLOB_GC_INTERVAL_SECONDS + 1
+    monkeypatch.setattr(checkpoint_store.time, "time", lambda: later)
+    run_maintenance(conn)
+    # The clock is shared through the database, so a new connection sees the last run
+    run_maintenance(connect_conversations_db(str(tmp_path / "conversations.db")))
+    assert len(collections) == 2
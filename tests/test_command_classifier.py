@@ -0,0 +1,64 @@
+import pytest
+
+from tinker.command_classifier import is_read_only_command, shell_call_parallel_safe
+
+
+@pytest.mark.parametrize("command", [
+    "ls -la",
+    "cat src/main.py",
+    "grep -rn TODO src | head -20",
+    "git status",
+    "git log --oneline -5",
+    "git diff HEAD~1 && git show --stat",
+    "sed -n '1,200p' build.log",
+    "find . -name '*.py'",
+    "sort names.txt | uniq -c",
+    "ls x || echo missing",
+])
+def test_read_only_commands(command):
+    assert is_read_only_command(command)
+
+
+@pytest.mark.parametrize("command", [
+    "",
+    "rm -rf build",
+    "python setup.py test",
+    "git commit -m wip",
+    "git reflog expire --all",
+    "sed -i s/a/b/ file.txt",
+    "find . -name '*.pyc' -delete",
+    "find . -exec rm {} +",
+    "sort -o sorted.txt names.txt",
+    "cat 'unterminated",
+    "ls | xargs rm",
+])
+def test_mutating_or_unknown_commands(command):
+    assert not is_read_only_command(command)
+
+
+@pytest.mark.parametrize("metacharacter_command", [
+    "cat < input.txt",
+    "echo hi > out.txt",
+    "echo `whoami`",
+    "echo $HOME",
+    "ls &",
+    "ls; rm -rf build",
+    "ls\nrm -rf build",
+    "(cd src && ls)",
+    "echo $(rm -rf build)",
+])
+def test_shell_metacharacters_are_never_read_only(metacharacter_command):
+    assert not is_read_only_command(metacharacter_command)
+
+
+def test_explicit_parallel_safe_flag_wins():
+    assert shell_call_parallel_safe({"command": "make build", "parallel_safe": True})
+    assert not shell_call_parallel_safe({"command": "ls", "parallel_safe": False})
+    assert shell_call_parallel_safe({"command": "ls"})
+    assert not shell_call_parallel_safe({})
+
+
+@pytest.mark.parametrize("command", ["printenv PATH", "which python", "type build"])
+def test_session_dependent_commands_are_not_read_only(command):
+    # Their answer depends on exports, PATH edits and functions in the session
+    assert not is_read_only_command(command)
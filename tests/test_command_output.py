@@ -0,0 +1,42 @@
+from tinker.command_output import CommandResult, OutputRingBuffer
+
+
+def test_small_output_is_kept_whole():
+    buffer = OutputRingBuffer(head_bytes=100, tail_bytes=100)
+    buffer.write(b"one\ntwo\n")
+    buffer.write(b"three")
+    assert buffer.getvalue() == b"one\ntwo\nthree"
+    assert not buffer.truncated
+    assert buffer.line_count == 3
+    assert buffer.total_bytes == 13
+
+
+def test_large_output_keeps_head_and_tail():
+    buffer = OutputRingBuffer(head_bytes=10, tail_bytes=10)
+    data = b"".join(f"{index:04d}\n".encode() for index in range(1000))
+    for start in range(0, len(data), 37):
+        buffer.write(data[start:start + 37])
+    assert buffer.total_bytes == len(data)
+    assert buffer.line_count == 1000
+    assert buffer.truncated and buffer.omitted_bytes == len(data) - 20
+    value = buffer.getvalue()
+    assert value.startswith(data[:10])
+    assert value.endswith(data[-10:])
+    assert f"[{len(data) - 20} bytes omitted]".encode() in value
+
+
+def test_memory_stays_bounded():
+    buffer = OutputRingBuffer(head_bytes=16, tail_bytes=64)
+    for _ in range(10000):
+        buffer.write(b"x" * 50)
+    assert buffer._tail_size - len(buffer._tail[0]) < 64
+    assert len(buffer.getvalue().split(b"\n... [")[0]) == 16
+
+
+def test_command_result_exposes_buffers():
+    stdout, stderr = OutputRingBuffer(), OutputRingBuffer()
+    stdout.write(b"ok\n")
+    stderr.write(b"warning\n")
+    result = CommandResult(["ls"], 0, stdout, stderr, duration=0.5)
+    assert (result.stdout, result.stderr) == ("ok\n", "warning\n")
+    assert not result.truncated and not result.timed_out
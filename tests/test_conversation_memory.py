@@ -0,0 +1,93 @@
+from langchain_core.messages import HumanMessage
+
+from fakes import ScriptedChatModel, tool_exchange
+from tinker.conversation_memory import BackgroundSummarizer, ConversationMemoryHook, memory_position
+from tinker.token_accounting import MessageTokenCounter
+
+CONFIG = {"configurable": {"thread_id": "memory-test"}}
+
+
+class RecordingCounter(MessageTokenCounter):
+    """MessageTokenCounter that records the IDs of the messages it is asked about"""
+
+    def __init__(self):
+        super().__init__()
+        self.seen = []
+
+    def count_message(self, message):
+        self.seen.append(message.id)
+        return super().count_message(message)
+
+
+def _hook(max_tokens: int, counter: MessageTokenCounter) -> ConversationMemoryHook:
+    return ConversationMemoryHook(
+        model=ScriptedChatModel(tool_steps=0, reply="Summary of earlier work."),
+        max_tokens_before_summary=max_tokens,
+        segment_tokens=1000,
+        chunk_summary_tokens=200,
+        fanout=4,
+        prompt_overhead_tokens=500,
+        counter=counter,
+        prefetch_ratio=0,
+    )
+
+
+def _apply(messages, update):
+    replaced = {message.id: message for message in update.get("messages", [])}
+    return [replaced.get(message.id, message) for message in messages]
+
+
+def _history(exchanges: int):
+    messages = [HumanMessage(content="Fix the failing build", id="human-0")]
+    for index in range(exchanges):
+        messages.extend(tool_exchange(index, output_lines=10))
+    return messages
+
+
+def test_hook_counts_only_new_messages():
+    messages = _history(40)
+    update = _hook(3000, MessageTokenCounter())({"messages": messages, "context": {}}, CONFIG)
+    memory = update["context"]["memory"]
+    assert memory["through_id"] is not None
+
+    # A fresh counter has no cached estimates, so every message it needs shows up in seen
+    counter = RecordingCounter()
+    hook = _hook(10 ** 6, counter)
+    new = tool_exchange(40, output_lines=10)
+    messages = _apply(messages, update) + new
+    update = hook({"messages": messages, "context": update["context"]}, CONFIG)
+
+    assert {seen for seen in counter.seen if seen is not None} == {message.id for message in new}
+    accounting = update["context"]["token_accounting"]
+    position = memory_position(update["context"]["memory"], messages)
+    assert accounting["unsummarized_tokens"] == MessageTokenCounter()(messages[position:])
+    assert accounting["last_prompt_estimate"] == MessageTokenCounter()(update["llm_input_messages"]) + 500
+
+
+def test_memory_position_found_after_history_rewrite():
+    messages = _history(40)
+    update = _hook(3000, MessageTokenCounter())({"messages": messages, "context": {}}, CONFIG)
+    memory = update["context"]["memory"]
+    position = memory_position(memory, messages)
+    assert messages[position - 1].id == memory["through_id"]
+    # An earlier message removed: the stored position is stale, the ID still matches
+    assert memory_position(memory, messages[1:]) == position - 1
+
+
+def test_background_summarizer_replaces_stale_prepared_update():
+    background = BackgroundSummarizer(max_workers=1)
+    try:
+        background.start("thread", "msg-1", lambda: {"through_id": "msg-5"})
+        background._pending["thread"][1].result()
+        # Memory moved past msg-1 inline; the finished prefetch must not block the next one
+        background.start("thread", "msg-5", lambda: {"through_id": "msg-9"})
+        background._pending["thread"][1].result()
+        assert background.take("thread", "msg-5") == {"through_id": "msg-9"}
+
+        background.start("thread", "msg-9", lambda: {"through_id": "msg-12"})
+        background._pending["thread"][1].result()
+        background.start("thread", "msg-9", lambda: {"through_id": "other"})
+        # A current prepared update is kept
+        assert background.take("thread", "msg-9") == {"through_id": "msg-12"}
+    finally:
+        background.close()
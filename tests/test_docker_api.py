@@ -0,0 +1,65 @@
+import asyncio
+import io
+import struct
+
+import pytest
+
+from tinker.docker_api import STDERR, STDOUT, AsyncDockerAPIClient, iter_multiplexed
+
+
+def _frame(stream_type: int, payload: bytes) -> bytes:
+    return struct.pack(">BxxxL", stream_type, len(payload)) + payload
+
+
+class _TrickleReader(io.BytesIO):
+    """Returns at most 3 bytes per read, like a socket delivering small packets"""
+
+    def read(self, size=-1):
+        return super().read(min(size, 3) if size >= 0 else 3)
+
+
+STREAM = (_frame(STDOUT, b"building\n") + _frame(STDERR, b"warning: x\n")
+          + _frame(STDOUT, b"") + _frame(STDOUT, b"done\n"))
+FRAMES = [(STDOUT, b"building\n"), (STDERR, b"warning: x\n"), (STDOUT, b"done\n")]
+
+
+def test_frames_are_demultiplexed_across_short_reads():
+    assert list(iter_multiplexed(_TrickleReader(STREAM).read)) == FRAMES
+
+
+def test_empty_frame_does_not_end_the_stream():
+    stream = _frame(STDOUT, b"") + _frame(STDERR, b"") + _frame(STDOUT, b"after\n")
+    assert list(iter_multiplexed(io.BytesIO(stream).read)) == [(STDOUT, b"after\n")]
+
+
+def test_truncated_stream_keeps_what_arrived():
+    stream = _frame(STDOUT, b"complete\n") + _frame(STDOUT, b"cut short")[:-4]
+    assert list(iter_multiplexed(io.BytesIO(stream).read)) == [(STDOUT, b"complete\n"), (STDOUT, b"cut s")]
+    # A partial header is not a frame
+    assert list(iter_multiplexed(io.BytesIO(_frame(STDOUT, b"x") + b"\x01\x00").read)) == [(STDOUT, b"x")]
+
+
+@pytest.mark.parametrize("data,expected", [
+    (STREAM, FRAMES),
+    (_frame(STDOUT, b"complete\n") + _frame(STDERR, b"cut short")[:-4],
+     [(STDOUT, b"complete\n"), (STDERR, b"cut s")]),
+], ids=["frames", "truncated"])
+def test_async_exec_start_demultiplexes(data, expected, monkeypatch):
+    client = AsyncDockerAPIClient(socket_path="/nonexistent/docker.sock")
+
+    class Writer:
+        def close(self):
+            pass
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+
+        async def fake_open(method, path, body=None):
+            return 101, {}, reader, Writer()
+
+        monkeypatch.setattr(client, "_open", fake_open)
+        return [frame async for frame in client.exec_start("exec-id")]
+
+    assert asyncio.run(run()) == expected
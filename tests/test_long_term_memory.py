@@ -0,0 +1,84 @@
+import numpy as np
+
+from tinker.long_term_memory import BLOCK_ROWS, LongTermMemory, VectorMatrix
+
+
+def _memory(tmp_path):
+    return LongTermMemory(str(tmp_path / "conversations.db"), directory=str(tmp_path / "memory"))
+
+
+def test_search_ranks_the_matching_memory_first(tmp_path):
+    memory = _memory(tmp_path)
+    try:
+        memory.add("Pixel's CI runs pytest on Python 3.11")
+        memory.add("The user prefers short answers")
+        memory.add("Deploys go through docker compose on the staging server")
+        hits = memory.search("which python does pixel ci use")
+        assert hits[0]["text"] == "Pixel's CI runs pytest on Python 3.11"
+        assert hits == sorted(hits, key=lambda hit: -hit["score"])
+    finally:
+        memory.close()
+
+
+def test_near_duplicates_are_not_stored(tmp_path):
+    memory = _memory(tmp_path)
+    try:
+        assert memory.add("The user prefers short answers") is not None
+        assert memory.add("the user prefers short answers.") is None
+        assert memory.count() == 1
+    finally:
+        memory.close()
+
+
+def test_forget_removes_the_memory_and_its_document_frequencies(tmp_path):
+    memory = _memory(tmp_path)
+    try:
+        keep = memory.add("Pixel's CI runs pytest on Python 3.11")
+        gone = memory.add("Docker builds need the buildx plugin")
+        memory.search("pytest")
+        df_before = memory._df.copy()
+        assert memory.forget(gone)
+        assert not memory.forget(gone)
+        # The same as if the forgotten memory had never been counted
+        fresh = _memory(tmp_path)
+        try:
+            fresh.search("pytest")
+            assert np.array_equal(memory._df, fresh._df)
+            assert memory._df_docs == fresh._df_docs == 1
+        finally:
+            fresh.close()
+        assert not np.array_equal(memory._df, df_before)
+        assert [hit["row"] for hit in memory.search("docker buildx plugin")] == []
+        assert memory.search("pytest python")[0]["row"] == keep
+    finally:
+        memory.close()
+
+
+def test_reindex_rebuilds_a_lost_vector_file(tmp_path):
+    memory = _memory(tmp_path)
+    memory.add("Pixel's CI runs pytest on Python 3.11")
+    path = memory.vectors.path
+    memory.close()
+    open(path, "wb").close()
+    memory = _memory(tmp_path)
+    try:
+        assert memory.search("pixel pytest")[0]["text"] == "Pixel's CI runs pytest on Python 3.11"
+    finally:
+        memory.close()
+
+
+def test_column_blocks_match_a_dense_product(tmp_path):
+    rng = np.random.default_rng(3)
+    count = BLOCK_ROWS * 2 + 17
+    dense = rng.random((count, 8), dtype=np.float32)
+    dense[dense < 0.7] = 0
+    matrix = VectorMatrix(str(tmp_path / "vectors.f32"), 8)
+    for row, vector in enumerate(dense):
+        matrix.set(row, vector)
+    query = np.array([0, 1, 0, 0, 0.5, 0, 0, 2], dtype=np.float32)
+    assert np.allclose(matrix.scores(query, count), dense @ query)
+    assert np.array_equal(matrix.get(count - 1), dense[-1])
+    columns = np.concatenate(list(matrix.column_blocks(5, count)), axis=1)
+    assert np.array_equal(columns, dense[5:].T)
+    # A second mapping of the same file sees the rows the first one wrote
+    assert np.allclose(VectorMatrix(matrix.path, 8).scores(query, count), dense @ query)
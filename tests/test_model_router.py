@@ -0,0 +1,98 @@
+import pytest
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from tinker.model_router import (
+    CHIT_CHAT_MAX_WORDS,
+    ROLE_CONVERSATION,
+    ROLE_REASONING,
+    ROLE_SUMMARIZATION,
+    ModelRouter,
+    ModelStats,
+    RoleUsageCallback,
+    is_chit_chat,
+)
+from tinker.rate_limiter import RateLimitedChatModel
+from tinker.response_cache import CachedChatModel
+
+
+@pytest.mark.parametrize("text", ["hi there!", "Thanks, that's great", "How are you today?", "good morning :)"])
+def test_small_talk_is_chit_chat(text):
+    assert is_chit_chat(text)
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "fix the failing test",
+    "what is in setup.py?",
+    "cat ~/notes",
+    "yes please",
+    "try again",
+    "thanks\nand one more thing",
+    " ".join(["nice"] * (CHIT_CHAT_MAX_WORDS + 1)),
+])
+def test_work_goes_to_the_reasoning_model(text):
+    assert not is_chit_chat(text)
+
+
+def test_route_picks_the_conversation_model_only_when_enabled():
+    router = ModelRouter(reasoning_model="big", conversation_model="small", enabled=True, rate_limit=False,
+                         cache_mode="passthrough")
+    assert router.agent_roles == [ROLE_REASONING, ROLE_CONVERSATION]
+    assert router.route("hello!") == ROLE_CONVERSATION
+    assert router.route("run the tests") == ROLE_REASONING
+
+    disabled = ModelRouter(reasoning_model="big", conversation_model="small", enabled=False, rate_limit=False,
+                           cache_mode="passthrough")
+    assert disabled.agent_roles == [ROLE_REASONING]
+    assert disabled.route("hello!") == ROLE_REASONING
+
+
+def test_routing_to_the_same_model_is_disabled():
+    router = ModelRouter(reasoning_model="big", conversation_model="big", enabled=True, rate_limit=False,
+                         cache_mode="passthrough")
+    assert not router.enabled
+    assert router.route("hello!") == ROLE_REASONING
+
+
+def test_unknown_cache_mode_is_rejected():
+    with pytest.raises(ValueError, match="Unknown model cache mode"):
+        ModelRouter(cache_mode="sometimes", rate_limit=False)
+
+
+def test_chat_model_layers():
+    plain = ModelRouter(rate_limit=False, cache_mode="passthrough").chat_model(ROLE_SUMMARIZATION)
+    assert isinstance(plain, ChatAnthropic)
+    assert plain.model == ModelRouter().model_names[ROLE_SUMMARIZATION]
+
+    router = ModelRouter(rate_limit=True, cache_mode="record")
+    model = router.chat_model(ROLE_REASONING)
+    try:
+        # Cache, then rate limiter, then the client, which leaves retries to the limiter
+        assert isinstance(model, CachedChatModel)
+        assert model.response_cache is router.response_cache
+        assert isinstance(model.model, RateLimitedChatModel)
+        assert model.model.model.max_retries == 0
+        assert [type(callback) for callback in model.callbacks][0] is RoleUsageCallback
+    finally:
+        router.close()
+
+
+def test_usage_is_recorded_per_role():
+    stats = ModelStats()
+    callback = RoleUsageCallback(ROLE_REASONING, stats, "big")
+    message = AIMessage(content="ok", usage_metadata={"input_tokens": 100, "output_tokens": 20, "total_tokens": 120})
+    for run_id in ("00000000-0000-0000-0000-000000000001", "00000000-0000-0000-0000-000000000002"):
+        callback.on_chat_model_start({}, [[]], run_id=run_id)
+        callback.on_llm_new_token("o", run_id=run_id)
+        callback.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=run_id)
+    callback.on_chat_model_start({}, [[]], run_id="00000000-0000-0000-0000-000000000003")
+    callback.on_llm_error(RuntimeError("overloaded"), run_id="00000000-0000-0000-0000-000000000003")
+
+    snapshot = stats.snapshot()[ROLE_REASONING]
+    assert snapshot["calls"] == 3
+    assert snapshot["errors"] == 1
+    assert snapshot["streamed_calls"] == 2
+    assert (snapshot["input_tokens"], snapshot["output_tokens"]) == (200, 40)
+    assert snapshot["avg_first_token_latency"] is not None
@@ -0,0 +1,64 @@
+import asyncio
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from tinker.parallel_tool_node import ParallelToolNode, in_concurrent_wave, plan_waves
+
+
+def _calls(*commands):
+    return [{"name": "execute_shell_command", "args": {"command": command}, "id": f"toolu_{index}"}
+            for index, command in enumerate(commands)]
+
+
+def _safe(call):
+    return call["args"]["command"].startswith("cat")
+
+
+def test_consecutive_safe_calls_share_a_wave():
+    calls = _calls("cat a", "cat b", "make", "cat c", "cat d", "cat e")
+    assert plan_waves(calls, _safe) == [[0, 1], [2], [3, 4, 5]]
+
+
+def test_unsafe_calls_run_alone_in_order():
+    calls = _calls("make", "make install", "cat log")
+    assert plan_waves(calls, _safe) == [[0], [1], [2]]
+
+
+def test_no_calls():
+    assert plan_waves([], _safe) == []
+
+
+def _wave_recorder():
+    seen = {}
+
+    def record(command: str) -> str:
+        """Record whether this call overlapped with others"""
+        seen[command] = in_concurrent_wave()
+        return command
+
+    async def arecord(command: str) -> str:
+        return record(command)
+
+    tool = StructuredTool.from_function(
+        func=record, coroutine=arecord, name="execute_shell_command",
+        metadata={"parallel_safe": lambda args: args["command"].startswith("cat")},
+    )
+    return ParallelToolNode([tool]), seen
+
+
+def _turn(*commands):
+    return {"messages": [AIMessage(content="", tool_calls=_calls(*commands))]}
+
+
+def test_only_calls_sharing_a_wave_run_concurrently():
+    node, seen = _wave_recorder()
+    node.invoke(_turn("cat a", "cat b", "make", "cat c"))
+    assert seen == {"cat a": True, "cat b": True, "make": False, "cat c": False}
+    assert not in_concurrent_wave()
+
+
+def test_only_calls_sharing_a_wave_run_concurrently_async():
+    node, seen = _wave_recorder()
+    asyncio.run(node.ainvoke(_turn("cat a", "cat b", "make", "cat c")))
+    assert seen == {"cat a": True, "cat b": True, "make": False, "cat c": False}
@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import time
+
+import anthropic
+import httpx
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from tinker import rate_limiter
+from tinker.rate_limiter import (
+    INPUT_TOKENS,
+    OUTPUT_TOKENS,
+    QUEUE_POLL,
+    TICKET_TTL,
+    ModelRateLimitError,
+    RateLimitedChatModel,
+    SharedRateLimiter,
+)
+
+
+def _limiter(tmp_path, rpm=0, input_tpm=0, output_tpm=0):
+    return SharedRateLimiter(str(tmp_path / "limits.db"), requests_per_minute=rpm,
+                             input_tokens_per_minute=input_tpm, output_tokens_per_minute=output_tpm)
+
+
+def test_aacquire_keeps_event_loop_running(tmp_path):
+    limiter = _limiter(tmp_path, rpm=600)
+    ticks = []
+
+    async def ticker():
+        for _ in range(10):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.02)
+
+    async def run():
+        # Another user of the connection holds it for a while
+        limiter._lock.acquire()
+        threading.Timer(0.2, limiter._lock.release).start()
+        ticking = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        waited = await limiter.aacquire("model", 10)
+        await ticking
+        return waited
+
+    try:
+        waited = asyncio.run(run())
+    finally:
+        limiter.close()
+    assert waited >= 0.15
+    # The loop never stalled while aacquire waited for the connection
+    assert max(later - earlier for earlier, later in zip(ticks, ticks[1:])) < 0.1
+
+
+def _bucket(limiter, name, model="model"):
+    return limiter.conn.execute(
+        "SELECT tokens FROM buckets WHERE model = ? AND name = ?", (model, name)
+    ).fetchone()[0]
+
+
+def test_settle_charges_what_acquire_did_not(tmp_path):
+    limiter = _limiter(tmp_path, input_tpm=1000, output_tpm=1000)
+    try:
+        # Larger than a minute's budget: acquire takes the whole bucket, settle the rest
+        limiter.acquire("model", 5000)
+        limiter.settle("model", limiter.input_charge(5000), {"input_tokens": 5000, "output_tokens": 200})
+        assert round(_bucket(limiter, INPUT_TOKENS)) == -4000
+        assert round(_bucket(limiter, OUTPUT_TOKENS)) == 800
+    finally:
+        limiter.close()
+
+
+def test_full_bucket_then_refill_rate(tmp_path):
+    limiter = _limiter(tmp_path, input_tpm=600)
+    try:
+        assert limiter.acquire("model", 600) < 0.1
+        # Empty now; 5 tokens refill in half a second at 10 tokens per second
+        waited = limiter.acquire("model", 5)
+        assert 0.4 <= waited < 1.5
+    finally:
+        limiter.close()
+
+
+def test_calls_are_served_in_ticket_order_across_processes(tmp_path):
+    first, second = _limiter(tmp_path, rpm=600), _limiter(tmp_path, rpm=600)
+    try:
+        ticket1 = first._take_ticket("model")
+        ticket2 = second._take_ticket("model")
+        assert second._try_acquire("model", ticket2, 1) == QUEUE_POLL
+        assert first._try_acquire("model", ticket1, 1) == 0
+        first._release(ticket1)
+        assert second._try_acquire("model", ticket2, 1) == 0
+        second._release(ticket2)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_ticket_of_dead_process_expires(tmp_path):
+    first, second = _limiter(tmp_path, rpm=600), _limiter(tmp_path, rpm=600)
+    try:
+        abandoned = first._take_ticket("model")
+        first.conn.execute("UPDATE tickets SET heartbeat = heartbeat - ? WHERE id = ?", (TICKET_TTL + 1, abandoned))
+        ticket = second._take_ticket("model")
+        assert second._try_acquire("model", ticket, 1) == 0
+    finally:
+        first.close()
+        second.close()
+
+
+def test_pause_holds_back_other_processes(tmp_path):
+    first, second = _limiter(tmp_path), _limiter(tmp_path)
+    try:
+        first.pause("model", 0.3)
+        assert second.acquire("model", 10) >= 0.25
+        assert second.acquire("other-model", 10) < 0.1
+    finally:
+        first.close()
+        second.close()
+
+
+class _FlakyModel(BaseChatModel):
+    """Raises the queued errors, one per call, then answers"""
+
+    errors: list = []
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "flaky"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+
+_REQUEST = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+
+
+def _status_error(status, headers=None):
+    response = httpx.Response(status, request=_REQUEST, headers=headers)
+    return anthropic.APIStatusError(f"HTTP {status}", response=response, body=None)
+
+
+def _wrapped(tmp_path, monkeypatch, errors):
+    monkeypatch.setattr(rate_limiter, "backoff_delay", lambda attempt, server_delay=None: 0.0)
+    model = _FlakyModel(errors=errors)
+    return model, RateLimitedChatModel(model=model, limiter=_limiter(tmp_path), bucket="model", max_retries=2)
+
+
+@pytest.mark.parametrize("error", [
+    anthropic.APIConnectionError(request=_REQUEST),
+    anthropic.APITimeoutError(request=_REQUEST),
+    _status_error(408),
+    _status_error(409),
+    _status_error(500),
+    _status_error(503),
+    _status_error(529),
+    _status_error(400, {"x-should-retry": "true"}),
+])
+def test_transient_errors_are_retried(tmp_path, monkeypatch, error):
+    model, wrapped = _wrapped(tmp_path, monkeypatch, [error])
+    try:
+        assert wrapped.invoke("hi").content == "ok"
+        assert model.calls == 2
+    finally:
+        wrapped.limiter.close()
+
+
+@pytest.mark.parametrize("error", [
+    _status_error(400),
+    _status_error(401),
+    _status_error(500, {"x-should-retry": "false"}),
+    ValueError("bad input"),
+])
+def test_other_errors_are_raised_at_once(tmp_path, monkeypatch, error):
+    model, wrapped = _wrapped(tmp_path, monkeypatch, [error])
+    try:
+        with pytest.raises(type(error)):
+            wrapped.invoke("hi")
+        assert model.calls == 1
+    finally:
+        wrapped.limiter.close()
+
+
+def test_gives_up_after_max_retries(tmp_path, monkeypatch):
+    model, wrapped = _wrapped(tmp_path, monkeypatch, [_status_error(502) for _ in range(3)])
+    try:
+        with pytest.raises(anthropic.APIStatusError):
+            wrapped.invoke("hi")
+        assert model.calls == 3
+    finally:
+        wrapped.limiter.close()
+    model, wrapped = _wrapped(tmp_path, monkeypatch, [_status_error(529) for _ in range(3)])
+    try:
+        with pytest.raises(ModelRateLimitError):
+            wrapped.invoke("hi")
+    finally:
+        wrapped.limiter.close()
@@ -0,0 +1,108 @@
+import itertools
+import os
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from fakes import ScriptedChatModel
+from tinker import response_cache
+from tinker.response_cache import (
+    CACHE_HIT_KEY,
+    MODE_RECORD,
+    MODE_REPLAY,
+    CachedChatModel,
+    ResponseCache,
+    ResponseCacheMiss,
+    request_key,
+)
+
+PARAMS = {"model": "claude-test", "temperature": 0.0, "max_tokens": 1024}
+TOOLS = [{"name": "execute_shell_command", "input_schema": {"type": "object"}}]
+
+
+def _conversation(**ids):
+    return [
+        SystemMessage(content="You are Tinker."),
+        HumanMessage(content="List the files", id=ids.get("human")),
+        AIMessage(
+            content="",
+            id=ids.get("ai"),
+            tool_calls=[{"name": "execute_shell_command", "id": "toolu_1", "args": {"command": "ls", "reason": "look"}}],
+            usage_metadata=ids.get("usage"),
+        ),
+        ToolMessage(content='{"stdout": "README.md"}', tool_call_id="toolu_1", id=ids.get("tool")),
+    ]
+
+
+def test_request_key_ignores_what_the_api_never_sees():
+    key = request_key(PARAMS, _conversation(), tools=TOOLS)
+    rerun = _conversation(human="run-2-human", ai="run-2-ai", tool="run-2-tool",
+                          usage={"input_tokens": 10, "output_tokens": 3, "total_tokens": 13})
+    client_settings = {**PARAMS, "streaming": True, "max_retries": 0, "default_request_timeout": 30}
+    assert request_key(dict(reversed(client_settings.items())), rerun, tools=TOOLS) == key
+
+    # Tool call arguments are compared as data, not as text
+    reordered = _conversation()
+    reordered[2].tool_calls[0]["args"] = {"reason": "look", "command": "ls"}
+    assert request_key(PARAMS, reordered, tools=TOOLS) == key
+
+
+def test_request_key_changes_with_the_request():
+    key = request_key(PARAMS, _conversation(), tools=TOOLS)
+    edited = _conversation()
+    edited[-1] = ToolMessage(content='{"stdout": "setup.py"}', tool_call_id="toolu_1")
+    variants = [
+        request_key(PARAMS, edited, tools=TOOLS),
+        request_key({**PARAMS, "model": "claude-other"}, _conversation(), tools=TOOLS),
+        request_key({**PARAMS, "temperature": 1.0}, _conversation(), tools=TOOLS),
+        request_key(PARAMS, _conversation(), stop=["\n"], tools=TOOLS),
+        request_key(PARAMS, _conversation()),
+        request_key(PARAMS, _conversation()[1:], tools=TOOLS),
+    ]
+    assert len({key, *variants}) == len(variants) + 1
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1_700_000_000)
+    monkeypatch.setattr(response_cache.time, "time", lambda: next(clock))
+    cache = ResponseCache(str(tmp_path / "cache" / "responses.db"), max_bytes=1 << 30)
+    # Incompressible content, so every row has about the same size
+    for key in "abc":
+        cache.put(key, AIMessage(content=os.urandom(2000).hex()))
+    cache.max_bytes = cache.stats()["bytes"]
+
+    assert cache.get("a") is not None
+    cache.put("d", AIMessage(content=os.urandom(2000).hex()))
+    # Eviction frees a tenth of the budget on top, which takes the two least recently used
+    assert [key for key in "abcd" if cache.get(key) is not None] == ["a", "d"]
+    assert cache.stats()["bytes"] <= cache.max_bytes
+    cache.close()
+
+
+def test_stored_response_round_trips_without_its_id(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    message = _conversation(ai="msg_01")[2]
+    cache.put("key", message, model="claude-test")
+    restored = cache.get("key")
+    assert restored.id is None
+    assert restored.tool_calls == message.tool_calls
+    assert cache.get("other") is None
+    assert cache.stats() == {"entries": 1, "bytes": cache.stats()["bytes"], "hits": 1, "misses": 1}
+    assert cache.clear() == 1
+    cache.close()
+
+
+def test_record_then_replay(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    recorder = CachedChatModel(model=ScriptedChatModel(tool_steps=0), response_cache=cache, mode=MODE_RECORD)
+    first = recorder.invoke([HumanMessage(content="hello")])
+    assert CACHE_HIT_KEY not in first.response_metadata
+
+    replayer = CachedChatModel(model=ScriptedChatModel(tool_steps=0, reply="never called"), response_cache=cache,
+                               mode=MODE_REPLAY)
+    replayed = replayer.invoke([HumanMessage(content="hello")])
+    assert replayed.content == first.content
+    assert replayed.response_metadata[CACHE_HIT_KEY]
+    with pytest.raises(ResponseCacheMiss):
+        replayer.invoke([HumanMessage(content="something new")])
+    cache.close()
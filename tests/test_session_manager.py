@@ -0,0 +1,80 @@
+import pytest
+
+from tinker import session_manager
+from tinker.checkpoint_store import connect_conversations_db
+from tinker.session_manager import LEGACY_THREAD_ID, SessionManager, SessionNotFoundError
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect_conversations_db(str(tmp_path / "conversations.db"))
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A time.time that advances one second per call"""
+    now = [1_700_000_000.0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(session_manager.time, "time", tick)
+
+
+def _add_checkpoint(conn, thread_id):
+    with conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS checkpoints (thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS writes (thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT)")
+        conn.execute("INSERT INTO checkpoints VALUES (?, '', 'c1')", (thread_id,))
+        conn.execute("INSERT INTO writes VALUES (?, '', 'c1')", (thread_id,))
+
+
+def test_first_message_becomes_the_title_and_sessions_sort_by_use(conn, clock):
+    sessions = SessionManager(conn)
+    first, second = sessions.create(), sessions.create()
+    sessions.record_turn(first["thread_id"], "  Fix the\nfailing   tests  ")
+    sessions.record_turn(first["thread_id"], "and then deploy")
+    assert sessions.latest()["thread_id"] == first["thread_id"]
+    session = sessions.get(first["thread_id"])
+    assert session["title"] == "Fix the failing tests"
+    assert session["turns"] == 2
+    sessions.record_turn(second["thread_id"], "x" * 200)
+    assert [s["thread_id"] for s in sessions.list()] == [second["thread_id"], first["thread_id"]]
+    assert len(sessions.get(second["thread_id"])["title"]) == session_manager.SESSION_TITLE_LENGTH
+
+
+def test_get_by_unique_prefix(conn):
+    sessions = SessionManager(conn)
+    with conn:
+        for thread_id in ("20250101-120000-aaaa", "20250101-120000-aaab", "20250102-090000-ffff"):
+            conn.execute("INSERT INTO tinker_sessions (thread_id, created_at, updated_at) VALUES (?, 0, 0)",
+                         (thread_id,))
+    assert sessions.get("20250102")["thread_id"] == "20250102-090000-ffff"
+    assert sessions.get("20250101-120000-aaab")["thread_id"] == "20250101-120000-aaab"
+    with pytest.raises(SessionNotFoundError, match="matches 2 sessions"):
+        sessions.get("20250101")
+    with pytest.raises(SessionNotFoundError, match="No session"):
+        sessions.get("2026")
+
+
+def test_delete_removes_checkpoints_of_that_thread_only(conn):
+    sessions = SessionManager(conn)
+    gone, kept = sessions.create(), sessions.create()
+    _add_checkpoint(conn, gone["thread_id"])
+    _add_checkpoint(conn, kept["thread_id"])
+    sessions.delete(gone["thread_id"])
+    for table in ("checkpoints", "writes"):
+        assert [row[0] for row in conn.execute(f"SELECT thread_id FROM {table}")] == [kept["thread_id"]]
+    assert [s["thread_id"] for s in sessions.list()] == [kept["thread_id"]]
+
+
+def test_shared_thread_of_earlier_versions_becomes_a_session(conn):
+    assert SessionManager(conn).list() == []
+    _add_checkpoint(conn, LEGACY_THREAD_ID)
+    sessions = SessionManager(conn)
+    assert [s["thread_id"] for s in sessions.list()] == [LEGACY_THREAD_ID]
+    # Registered once, however often the manager is created
+    assert len(SessionManager(conn).list()) == 1
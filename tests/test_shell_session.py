@@ -0,0 +1,137 @@
+import asyncio
+import subprocess
+import time
+
+import pytest
+
+from tinker import docker_manager, shell_session
+from tinker.shell_session import (
+    AsyncShellSession,
+    ShellSession,
+    ShellSessionError,
+    ShellSessionTimeout,
+    _FrameScanner,
+    _session_died,
+)
+
+MARKER = b"__TINKER_test__"
+
+
+def _feed_all(scanner, chunks):
+    return b"".join(scanner.feed(chunk) for chunk in chunks)
+
+
+def test_output_before_marker_and_trailer():
+    scanner = _FrameScanner(MARKER)
+    output = scanner.feed(b"hello\nworld\n" + MARKER + b" 0 /work\nignored")
+    assert output == b"hello\nworld"
+    assert scanner.done and scanner.trailer == b"0 /work"
+    assert scanner.feed(b"more") == b""
+
+
+def test_marker_split_across_reads():
+    data = b"line one\nline two\n" + MARKER + b" 2 /tmp\n"
+    for size in (1, 3, 7, len(data)):
+        scanner = _FrameScanner(MARKER)
+        output = _feed_all(scanner, [data[start:start + size] for start in range(0, len(data), size)])
+        assert output == b"line one\nline two"
+        assert scanner.done and scanner.trailer == b"2 /tmp"
+
+
+def test_output_released_before_marker_arrives():
+    scanner = _FrameScanner(MARKER)
+    released = scanner.feed(b"x" * 100)
+    # Only the bytes that could start the marker are held back
+    assert released == b"x" * (100 - len(MARKER))
+    assert not scanner.done
+
+
+def test_trailer_waits_for_its_newline():
+    scanner = _FrameScanner(MARKER)
+    assert scanner.feed(b"out\n" + MARKER + b" 0") == b"out"
+    assert not scanner.done
+    assert scanner.feed(b" /home\n") == b""
+    assert scanner.done and scanner.trailer == b"0 /home"
+
+
+@pytest.fixture
+def local_shell(monkeypatch, tmp_path):
+    """Run sessions as a local bash instead of `docker exec -i bash`"""
+
+    def run(cmd):
+        return subprocess.run(cmd, capture_output=True, text=True)
+
+    async def arun(cmd, timeout=None, on_output=None):
+        process = await asyncio.create_subprocess_exec(*cmd)
+        await process.wait()
+
+    monkeypatch.setattr(shell_session, "_session_command",
+                        lambda container, cwd: ["bash", "--noprofile", "--norc"])
+    monkeypatch.setattr(shell_session, "COMMAND_KILL_GRACE", 0.3)
+    monkeypatch.setattr(docker_manager, "exec_in_container", run)
+    monkeypatch.setattr(docker_manager, "async_run_in_container", arun)
+    session = ShellSession(workdir=str(tmp_path))
+    yield session
+    session.close()
+
+
+def test_directory_and_exports_persist(local_shell, tmp_path):
+    local_shell.run(f"cd {tmp_path} && export GREETING=hello && mkdir sub && cd sub")
+    result = local_shell.run("echo $GREETING; pwd")
+    assert result.stdout.split() == ["hello", str(tmp_path / "sub")]
+    assert local_shell.cwd == str(tmp_path / "sub")
+
+
+def test_timeout_terminates_the_command_and_keeps_the_session(local_shell):
+    local_shell.run("export KEPT=yes")
+    shell_pid = local_shell.shell_pid
+    result = local_shell.run("sleep 30", timeout=0.3)
+    assert result.timed_out and result.returncode != 0
+    assert local_shell.shell_pid == shell_pid
+    assert local_shell.run("echo $KEPT").stdout == "yes\n"
+
+
+def test_timeout_escalates_to_sigkill(local_shell):
+    started = time.monotonic()
+    result = local_shell.run("bash -c \"trap '' TERM; sleep 30\"", timeout=0.3)
+    assert result.timed_out
+    assert time.monotonic() - started < 5
+    assert local_shell.run("echo still here").stdout == "still here\n"
+
+
+def test_stuck_shell_is_killed_and_respawned(local_shell):
+    shell_pid = local_shell.shell_pid
+    # A builtin loop runs in the session shell itself, out of reach of the command tree signals
+    result = local_shell.run("while :; do :; done", timeout=0.3)
+    assert result.timed_out
+    assert "terminated unexpectedly" in result.stderr
+    assert not local_shell.is_alive()
+    assert local_shell.run("echo back").stdout == "back\n"
+    assert local_shell.shell_pid != shell_pid
+
+
+def test_exit_reports_the_code_and_respawns(local_shell):
+    local_shell.run("true")
+    result = local_shell.run("exit 3")
+    assert result.returncode == 3 and not result.timed_out
+    assert local_shell.run("echo again").stdout == "again\n"
+
+
+def test_session_timeout_is_reported_by_type():
+    assert _session_died("x", -9, ShellSessionTimeout("took too long")).timed_out
+    assert not _session_died("x", 1, ShellSessionError("stdout closed")).timed_out
+
+
+def test_async_stuck_shell_is_killed_and_respawned(local_shell, tmp_path):
+    async def run():
+        session = AsyncShellSession(workdir=str(tmp_path))
+        try:
+            result = await session.run("while :; do :; done", timeout=0.3)
+            again = await session.run("echo back")
+            return result, again
+        finally:
+            await session.close()
+
+    result, again = asyncio.run(run())
+    assert result.timed_out
+    assert again.stdout == "back\n"
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+
+from tinker.task_budget import BudgetTracker, TaskBudget
+
+GOAL = "Run the test suite in ~/pixel and fix the failing build step"
+
+
+def _assert_stopped(messages, reason):
+    summary = messages[-1]
+    assert isinstance(summary, AIMessage) and not summary.tool_calls
+    answered = {message.tool_call_id for message in messages if isinstance(message, ToolMessage)}
+    requested = {call["id"] for message in messages if isinstance(message, AIMessage) for call in message.tool_calls}
+    assert requested <= answered
+    skipped = [message for message in messages if isinstance(message, ToolMessage) and message.status == "error"]
+    assert skipped and reason in skipped[-1].content
+
+
+@pytest.mark.parametrize("enable_memory", [True, False])
+def test_budget_stop_summarizes(offline_workflow, enable_memory):
+    workflow = offline_workflow(enable_memory=enable_memory)
+    events = list(workflow.stream_continuous_task(GOAL, thread_id="budget", budget=TaskBudget(max_model_calls=2)))
+    kinds = [kind for kind, _ in events]
+    assert "budget_exceeded" in kinds
+    result = events[-1][1]
+    reason = result["budget"]["stopped"]
+    assert reason == "2 of 2 model calls"
+    _assert_stopped(result["messages"], reason)
+    assert events[kinds.index("budget_exceeded") + 1] == ("token", result["messages"][-1].content)
+    if enable_memory:
+        config = {"configurable": {"thread_id": "budget"}}
+        assert workflow.agent.get_state(config).values["messages"] == result["messages"]
+
+
+@pytest.mark.parametrize("enable_memory", [True, False])
+def test_budget_stop_summarizes_async(offline_workflow, enable_memory):
+    workflow = offline_workflow(enable_memory=enable_memory)
+
+    async def run():
+        try:
+            return await workflow.arun_continuous_task(GOAL, thread_id="budget-async",
+                                                       budget=TaskBudget(max_model_calls=2))
+        finally:
+            await workflow.aclose()
+
+    result = asyncio.run(run())
+    _assert_stopped(result["messages"], result["budget"]["stopped"])
+
+
+def test_tracker_stops_before_requested_tools():
+    tracker = BudgetTracker(TaskBudget(max_model_calls=None, max_input_tokens=None, max_output_tokens=None,
+                                       max_seconds=None, max_tool_calls=3))
+    calls = [{"name": "execute_shell_command", "args": {}, "id": f"toolu_{i}"} for i in range(2)]
+    assert tracker.observe({"agent": {"messages": [AIMessage(content="", tool_calls=calls)]}}) is None
+    results = [ToolMessage(content="ok", tool_call_id=call["id"]) for call in calls]
+    assert tracker.observe({"tools": {"messages": results}}) is None
+    assert tracker.tool_calls == 2
+    reason = tracker.observe({"agent": {"messages": [AIMessage(content="", tool_calls=calls)]}})
+    assert reason == "2 of 3 tool executions, 2 more requested"
+
+
+def test_tracker_ignores_limits_on_final_answer():
+    tracker = BudgetTracker(TaskBudget(max_model_calls=1, max_input_tokens=None, max_output_tokens=None,
+                                       max_seconds=None, max_tool_calls=None))
+    assert tracker.observe({"agent": {"messages": [AIMessage(content="Done.")]}}) is None
+    assert tracker.model_calls == 1
+
+
+def test_unlimited_model_calls_outlast_default_recursion_limit(offline_workflow):
+    # 60 tool steps take 180 graph steps, past LangGraph's default limit of 25 and our minimum of 100
+    workflow = offline_workflow(enable_memory=False, tool_steps=60)
+    budget = TaskBudget(max_model_calls=None, max_input_tokens=None, max_output_tokens=None,
+                        max_seconds=None, max_tool_calls=None)
+    result = workflow.run_continuous_task(GOAL, thread_id="unlimited", budget=budget)
+    assert result["budget"]["stopped"] is None
+    assert result["budget"]["tool_calls"] == 60
+    assert result["messages"][-1].content == workflow.models[result["route"]].reply
@@ -0,0 +1,45 @@
+from langchain_core.messages import HumanMessage
+
+from fakes import tool_exchange
+from tinker.tool_output_store import OFFLOADED_KEY, ToolOutputOffloader, ToolOutputStore
+
+
+def _turn(number: int, exchanges: int = 2):
+    messages = [HumanMessage(content=f"Task {number}", id=f"human-{number}")]
+    for index in range(exchanges):
+        messages.extend(tool_exchange(number * 100 + index))
+    return messages
+
+
+def _apply(messages, stubs):
+    replaced = {stub.id: stub for stub in stubs}
+    return [replaced.get(message.id, message) for message in messages]
+
+
+def test_offloader_stubs_outputs_older_than_kept_turns(tmp_path):
+    offloader = ToolOutputOffloader(ToolOutputStore(str(tmp_path)), keep_turns=2)
+    progress = {}
+    messages = _turn(1) + _turn(2)
+    assert offloader.compact(messages, progress) == []
+
+    messages += _turn(3)
+    stubs = offloader.compact(messages, progress)
+    assert [stub.id for stub in stubs] == ["tool-100", "tool-101"]
+    assert all(OFFLOADED_KEY in stub.additional_kwargs for stub in stubs)
+    messages = _apply(messages, stubs)
+
+    # More steps in the same turn move nothing; the next turn moves turn 2
+    messages += tool_exchange(302)
+    assert offloader.compact(messages, progress) == []
+    messages += _turn(4)
+    assert [stub.id for stub in offloader.compact(messages, progress)] == ["tool-200", "tool-201"]
+    assert progress["scanned"] == len(messages)
+
+
+def test_offloader_rescans_rewritten_history(tmp_path):
+    offloader = ToolOutputOffloader(ToolOutputStore(str(tmp_path)), keep_turns=1)
+    progress = {}
+    messages = _turn(1) + _turn(2)
+    assert [stub.id for stub in offloader.compact(messages, progress)] == ["tool-100", "tool-101"]
+    rewritten = _turn(5) + _turn(6)
+    assert [stub.id for stub in offloader.compact(rewritten, progress)] == ["tool-500", "tool-501"]
@@ -0,0 +1,73 @@
+import json
+import os
+import time
+
+from langchain_core.messages import ToolMessage
+
+from tinker import docker_manager, tool_result_compactor
+from tinker.anthropic_tools_manager import AnthropicToolsManager
+from tinker.command_output import CommandResult, OutputRingBuffer
+from tinker.response_cache import request_key
+from tinker.tool_result_compactor import PARTIAL_OUTPUT_MAX_AGE, ToolResultCompactor
+
+OUTPUT = b"".join(f"line {index}: build step output\n".encode() for index in range(2000))
+
+
+def _run(compactor: ToolResultCompactor) -> dict:
+    """Compact the result of a command that printed OUTPUT"""
+    capture = compactor.capture()
+    stdout, stderr = OutputRingBuffer(), OutputRingBuffer()
+    for start in range(0, len(OUTPUT), 4096):
+        chunk = OUTPUT[start:start + 4096]
+        stdout.write(chunk)
+        capture.write("stdout", chunk)
+    result = CommandResult(["make"], 0, stdout, stderr)
+    tool_result = {"success": True, "command": "make", "return_code": 0,
+                   "stdout": result.stdout, "stderr": result.stderr, "reason": "build"}
+    return compactor.compact(tool_result, result, capture)
+
+
+def test_spilled_output_path_depends_only_on_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(tool_result_compactor, "TOOL_OUTPUT_DIR", str(tmp_path))
+    compactor = ToolResultCompactor(max_tokens=200)
+    first, second = _run(compactor), _run(compactor)
+    assert first == second
+    filename = first["stdout_file"].rsplit("/", 1)[1]
+    assert filename in first["stdout"]
+    with open(tmp_path / filename, "rb") as f:
+        assert f.read() == OUTPUT
+    assert os.listdir(tmp_path) == [filename]
+
+    # Replay keys of requests carrying these results match
+    keys = {
+        request_key({"model": "m"}, [ToolMessage(content=json.dumps(result), tool_call_id="toolu_1")])
+        for result in (first, second)
+    }
+    assert len(keys) == 1
+
+
+def test_command_that_raises_leaves_no_partial_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(tool_result_compactor, "TOOL_OUTPUT_DIR", str(tmp_path))
+
+    def failing_run(cmd, timeout=None, on_output=None):
+        on_output("stdout", OUTPUT)
+        raise RuntimeError("container went away")
+
+    monkeypatch.setattr(docker_manager, "run_in_container", failing_run)
+    manager = AnthropicToolsManager(thread_id="t")
+    manager.compactor = ToolResultCompactor(max_tokens=200)
+    result = manager.execute_tool("execute_shell_command", {"command": "make", "reason": "build"})
+    assert result["error"] == "container went away"
+    assert os.listdir(tmp_path) == []
+
+
+def test_pruning_removes_only_stale_partial_outputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(tool_result_compactor, "TOOL_OUTPUT_DIR", str(tmp_path))
+    stale, running = tmp_path / ".a.stdout.partial", tmp_path / ".b.stdout.partial"
+    stale.write_bytes(b"left behind")
+    running.write_bytes(b"still streaming")
+    old = time.time() - PARTIAL_OUTPUT_MAX_AGE - 1
+    os.utime(stale, (old, old))
+    _run(ToolResultCompactor(max_tokens=200))
+    assert not stale.exists()
+    assert running.exists()